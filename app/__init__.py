@@ -119,6 +119,26 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     
+    # Worker d'ingestion des fichiers uploadés
+    from app.services.ingestion import init_ingestion_worker
+    init_ingestion_worker(app)
+    
+    # Ingestion en flux des passerelles (/api/v1/ingest)
+    from app.services.stream_ingest import init_stream_ingest
+    init_stream_ingest(app)
+    
+    # Agrégats du dashboard recalculés en arrière-plan
+    from app.services.refresher import init_refresher
+    init_refresher(app)
+    
+    # Invalidation du cache pour les écritures hors application (Logstash, générateur)
+    from app.services.index_watch import init_index_watch
+    init_index_watch(app)
+    
+    # Cycle de vie des index de logs (lecture seule, force-merge, rétention)
+    from app.services.lifecycle import init_lifecycle_job
+    init_lifecycle_job(app)
+    
     # Initialize Kibana visualizations in background
     from app.services.kibana_init import init_kibana_async
     init_kibana_async()
@@ -5,6 +5,8 @@ from flask import Blueprint, render_template, jsonify, request, redirect, url_fo
 from flask_login import login_required, current_user
 from app.models.user import User
 from app.services.auth_decorators import admin_required
+from app.services.index_planner import ANY_DAY_TAG
+from app.services.redis_cache import cached_route
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -93,6 +95,7 @@ def api_get_users():
 
 @admin_bp.route('/api/stats', methods=['GET'])
 @admin_required
+@cached_route(ttl=30, tags=['logs', 'files', ANY_DAY_TAG], single_flight=True)
 def api_admin_stats():
     """Get admin statistics"""
     from app.services.database import get_mongodb, get_elasticsearch
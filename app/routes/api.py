@@ -1,14 +1,124 @@
-from flask import Blueprint, request, jsonify
-from flask_login import login_required
+from flask import Blueprint, request, jsonify, Response
+from flask_login import login_required, current_user
 from app.services.database import get_elasticsearch, get_mongodb
-from app.services.redis_cache import cached_route, get_cache_stats
+from app.services.redis_cache import cached_route, get_cache_stats, request_tags
+from app.services.stats_engine import compute_log_stats
+from app.services.refresher import register_hot_query, read_precomputed
+from app.services.stream_ingest import (
+    get_stream_ingestor, parse_ndjson, token_authorized, STREAM_RETRY_AFTER
+)
+from app.services.index_planner import ANY_DAY_TAG, plan_indices, search_target
+from app.services.columnar import wants_columnar, response_variant, to_columnar, COLUMNAR_FIELDS
+from app.services.timeseries import (
+    parse_series_range, parse_max_points, fetch_bucketed_series, fetch_raw_series,
+    InvalidSeriesRequest
+)
+from app.services.log_search import (
+    build_search_query, cursor_search, iter_export_pages, offset_window_exceeded,
+    parse_projection, apply_projection, projected_fields, hit_document, doc_handle, fetch_documents,
+    InvalidCursorError, InvalidProjectionError, InvalidHandleError,
+    MAX_RESULT_WINDOW, LOG_LIST_FIELDS, MGET_MAX_DOCS
+)
 from datetime import datetime
+import csv
+import io
+import itertools
+import json
+import os
 
 api_bp = Blueprint('api', __name__)
 
+# Budget maximal d'un export (par requête)
+EXPORT_MAX_ROWS = int(os.getenv('EXPORT_MAX_ROWS', 1000000))
+EXPORT_MAX_BYTES = int(os.getenv('EXPORT_MAX_BYTES', 512 * 1024 * 1024))
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+EXPORT_CSV_FIELDS = [
+    '@timestamp', 'sensor_id', 'sensor_type', 'zone', 'value',
+    'unit', 'status', 'alert_level', 'building_id'
+]
+
+
+def compute_global_stats():
+    """Statistiques globales (logs Elasticsearch et fichiers MongoDB)"""
+    es = get_elasticsearch()
+    mongo = get_mongodb()
+    log_stats = compute_log_stats(es)
+    return {
+        'total_logs': log_stats['total_logs'],
+        'total_files': mongo.uploaded_files.count_documents({}),
+        'sensors_count': log_stats['sensors_count'],
+        'avg_temperature': log_stats['avg_temperature'],
+        'today_alerts': log_stats['today_alerts'],
+        'alerts': log_stats['alerts']
+    }
+
+
+def compute_dashboard_stats():
+    """Indicateurs du dashboard"""
+    log_stats = compute_log_stats(get_elasticsearch())
+    return {
+        'total_logs': log_stats['total_logs'],
+        'avg_temperature': log_stats['avg_temperature'],
+        'alerts_today': log_stats['alerts_last_24h'],
+        'active_sensors': log_stats['sensors_count']
+    }
+
+
+RECENT_ALERT_FIELDS = ['@timestamp', 'timestamp', 'sensor_type', 'zone', 'value', 'unit', 'status']
+RECENT_ALERTS_COUNT = 10
+
+
+def compute_recent_alerts():
+    """Dix dernières alertes"""
+    es = get_elasticsearch()
+    body = {
+        "query": {
+            "bool": {
+                "must_not": {"term": {"status": "normal"}}
+            }
+        },
+        "sort": [{"@timestamp": {"order": "desc"}}],
+        "size": RECENT_ALERTS_COUNT,
+        "_source": RECENT_ALERT_FIELDS
+    }
+    # Index de la dernière semaine d'abord, tous les index seulement si insuffisant
+    result = es.search(body=body, **search_target('now-7d'))
+    if len(result['hits']['hits']) < RECENT_ALERTS_COUNT:
+        result = es.search(body=body, **search_target())
+    alerts = []
+    for hit in result['hits']['hits']:
+        source = hit['_source']
+        alerts.append({
+            'date': source.get('@timestamp', source.get('timestamp', '')),
+            'type': source.get('sensor_type', ''),
+            'zone': source.get('zone', ''),
+            'message': f"{source.get('sensor_type', '')} - {source.get('value', '')} {source.get('unit', '')}",
+            'level': source.get('status', 'normal')
+        })
+    return {'alerts': alerts}
+
+
+# Agrégats recalculés en arrière-plan (voir app/services/refresher.py)
+register_hot_query('stats', compute_global_stats, interval=60, tags=['logs', 'files', ANY_DAY_TAG])
+register_hot_query('dashboard_stats', compute_dashboard_stats, interval=30, tags=['logs', ANY_DAY_TAG])
+register_hot_query('recent_alerts', compute_recent_alerts, interval=10, tags=['logs', ANY_DAY_TAG])
+
+def _logs_payload(result, columnar, projection):
+    """Logs d'une page de résultats, en liste de documents ou en colonnes"""
+    logs = []
+    for hit in result['hits']['hits']:
+        log = hit_document(hit)
+        # Référence directe pour /logs/<log_id> et /logs/_mget
+        log['_handle'] = doc_handle(hit)
+        logs.append(log)
+    if columnar:
+        return to_columnar(logs, ['_handle'] + projected_fields(projection, COLUMNAR_FIELDS))
+    return {'logs': logs}
+
 @api_bp.route('/logs', methods=['GET'])
 @login_required
-@cached_route(ttl=300)
+@cached_route(ttl=21600, unless=lambda: 'cursor' in request.args,
+              tags=request_tags('sensor_type', 'zone'), variant=response_variant)
 def get_logs():
     """Récupérer la liste paginée des logs
     ---
@@ -37,6 +147,32 @@ def get_logs():
         name: alert_level
         type: string
         description: Niveau d'alerte
+      - in: query
+        name: date_from
+        type: string
+        description: Date de début (ISO 8601 ou date math, ex. now-7d)
+      - in: query
+        name: date_to
+        type: string
+        description: Date de fin
+      - in: query
+        name: cursor
+        type: string
+        description: Pagination par curseur (vide pour la première page, puis la valeur de next_cursor)
+      - in: query
+        name: format
+        type: string
+        enum: [json, columnar]
+        description: Format colonnes (aussi via Accept application/vnd.iot.columnar+json)
+      - in: query
+        name: fields
+        type: string
+        description: Champs renvoyés ("a,b"), champs exclus ("-a,-b") ou "*" pour le document complet
+      - in: query
+        name: docvalues
+        type: boolean
+        default: false
+        description: Lire les champs demandés dans les doc values plutôt que dans _source
     responses:
       200:
         description: Résultat paginé des logs
@@ -55,6 +191,10 @@ def get_logs():
               type: integer
             pages:
               type: integer
+            next_cursor:
+              type: string
+      400:
+        description: Curseur invalide ou page au-delà de la fenêtre d'offset
       500:
         description: Erreur serveur
     """
@@ -63,11 +203,19 @@ def get_logs():
 
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
-        from_index = (page - 1) * per_page
+        cursor = request.args.get('cursor')
 
         sensor_type = request.args.get('sensor_type')
         zone = request.args.get('zone')
         alert_level = request.args.get('alert_level')
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        # Seuls les champs renvoyés sont lus (fields=, sinon projection par défaut)
+        columnar = wants_columnar()
+        projection = parse_projection(
+            request.args.get('fields'), default=COLUMNAR_FIELDS if columnar else LOG_LIST_FIELDS
+        )
+        docvalues = request.args.get('docvalues', 'false').lower() == 'true'
 
         query = {"bool": {"must": []}}
         if sensor_type:
@@ -76,32 +224,206 @@ def get_logs():
             query["bool"]["must"].append({"term": {"zone": zone}})
         if alert_level:
             query["bool"]["must"].append({"term": {"alert_level": alert_level}})
+        if date_from or date_to:
+            date_range = {}
+            if date_from:
+                date_range["gte"] = date_from
+            if date_to:
+                date_range["lte"] = date_to
+            query["bool"]["must"].append({"range": {"@timestamp": date_range}})
         if not query["bool"]["must"]:
             query = {"match_all": {}}
+        # Seuls les index journaliers de la période sont interrogés
+        target = search_target(date_from, date_to)
 
-        result = es.search(
-            index='iot-logs-*',
-            body={
-                "query": query,
-                "from": from_index,
-                "size": per_page,
-                "sort": [{"@timestamp": {"order": "desc"}}]
-            }
-        )
+        # Pagination par curseur (point-in-time + search_after)
+        if cursor is not None:
+            result, next_cursor = cursor_search(
+                es, target['index'], query, per_page, cursor=cursor or None,
+                source=projection, docvalues=docvalues
+            )
+            response = _logs_payload(result, columnar, projection)
+            response.update(per_page=per_page, next_cursor=next_cursor)
+            if not cursor:
+                response['total'] = result['hits']['total']['value']
+            return jsonify(response), 200
+
+        if offset_window_exceeded(page, per_page):
+            return jsonify({
+                'error': f'Offset pagination is limited to {MAX_RESULT_WINDOW} results, use cursor pagination'
+            }), 400
+
+        body = {
+            "query": query,
+            "from": (page - 1) * per_page,
+            "size": per_page,
+            "sort": [{"@timestamp": {"order": "desc"}}]
+        }
+        apply_projection(body, projection, docvalues)
+        result = es.search(body=body, **target)
 
-        logs = [hit['_source'] for hit in result['hits']['hits']]
         total = result['hits']['total']['value']
+        response = _logs_payload(result, columnar, projection)
+        response.update(
+            total=total,
+            page=page,
+            per_page=per_page,
+            pages=(total + per_page - 1) // per_page
+        )
+        return jsonify(response), 200
+    except (InvalidCursorError, InvalidProjectionError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({
-            'logs': logs,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page
-        }), 200
+@api_bp.route('/logs/export', methods=['GET'])
+@login_required
+def export_logs():
+    """Exporter en flux les logs correspondant à une recherche
+    ---
+    tags:
+      - Logs
+    parameters:
+      - in: query
+        name: format
+        type: string
+        enum: [ndjson, csv]
+        default: ndjson
+        description: Format du flux
+      - in: query
+        name: q
+        type: string
+        description: Recherche textuelle
+      - in: query
+        name: sensor_type
+        type: string
+        description: Type de capteur
+      - in: query
+        name: zone
+        type: string
+        description: Zone du bâtiment
+      - in: query
+        name: alert_level
+        type: string
+        description: Statut du capteur
+      - in: query
+        name: date_from
+        type: string
+        description: Date de début
+      - in: query
+        name: date_to
+        type: string
+        description: Date de fin
+      - in: query
+        name: max_rows
+        type: integer
+        description: Nombre maximal de lignes (plafonné par EXPORT_MAX_ROWS)
+      - in: query
+        name: max_bytes
+        type: integer
+        description: Taille maximale du flux en octets (plafonnée par EXPORT_MAX_BYTES)
+      - in: query
+        name: slices
+        type: integer
+        default: 1
+        description: Nombre de tranches du point-in-time, parcourues en parallèle (ordre non garanti)
+      - in: query
+        name: fields
+        type: string
+        description: Champs exportés en NDJSON ("a,b") ou exclus ("-a,-b")
+    responses:
+      200:
+        description: Flux NDJSON ou CSV (un export NDJSON tronqué par le budget se termine par une ligne _truncated)
+      400:
+        description: Paramètres invalides
+      500:
+        description: Erreur serveur
+    """
+    try:
+        es = get_elasticsearch()
+
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in ('ndjson', 'csv'):
+            return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+        max_rows = min(int(request.args.get('max_rows', EXPORT_MAX_ROWS)), EXPORT_MAX_ROWS)
+        max_bytes = min(int(request.args.get('max_bytes', EXPORT_MAX_BYTES)), EXPORT_MAX_BYTES)
+        slices = max(1, min(int(request.args.get('slices', 1)), 16))
+
+        query = build_search_query(request.args)
+        source = EXPORT_CSV_FIELDS if export_format == 'csv' else parse_projection(request.args.get('fields'))
+        pages = iter_export_pages(
+            es, plan_indices(request.args.get('date_from'), request.args.get('date_to')), query,
+            batch_size=EXPORT_BATCH_SIZE, slices=slices, source=source
+        )
+        # Point-in-time et première page avant la réponse : une erreur de
+        # recherche est renvoyée en 500 et non au milieu d'un flux 200
+        first_page = next(pages, None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    def generate():
+        rows = 0
+        sent = 0
+        truncated = False
+        line_buffer = io.StringIO()
+        writer = csv.writer(line_buffer)
+
+        def csv_line(values):
+            line_buffer.seek(0)
+            line_buffer.truncate()
+            writer.writerow(values)
+            return line_buffer.getvalue()
+
+        try:
+            if export_format == 'csv':
+                header = csv_line(EXPORT_CSV_FIELDS).encode('utf-8')
+                sent += len(header)
+                yield header
+
+            for hits in itertools.chain([first_page] if first_page else [], pages):
+                chunk = []
+                for hit in hits:
+                    if rows >= max_rows:
+                        truncated = True
+                        break
+                    if export_format == 'csv':
+                        line = csv_line([hit['_source'].get(field, '') for field in EXPORT_CSV_FIELDS])
+                    else:
+                        line = json.dumps(hit['_source'], ensure_ascii=False, default=str) + '\n'
+                    encoded = line.encode('utf-8')
+                    if sent + len(encoded) > max_bytes:
+                        truncated = True
+                        break
+                    chunk.append(encoded)
+                    sent += len(encoded)
+                    rows += 1
+
+                if chunk:
+                    yield b''.join(chunk)
+                if truncated:
+                    break
+
+            if truncated and export_format == 'ndjson':
+                yield (json.dumps({'_truncated': True, 'rows': rows}) + '\n').encode('utf-8')
+        finally:
+            # Ferme le point-in-time même si le client interrompt le flux
+            pages.close()
+
+    extension = 'csv' if export_format == 'csv' else 'ndjson'
+    filename = f"iot-logs-export-{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return Response(
+        generate(),
+        mimetype='text/csv' if export_format == 'csv' else 'application/x-ndjson',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Export-Max-Rows': str(max_rows),
+            'X-Export-Max-Bytes': str(max_bytes)
+        }
+    )
+
 @api_bp.route('/logs/<log_id>', methods=['GET'])
 @login_required
 def get_log_detail(log_id):
@@ -114,7 +436,11 @@ def get_log_detail(log_id):
         name: log_id
         type: string
         required: true
-        description: Identifiant du log
+        description: Référence "index:id" (champ _handle des listes) ou identifiant seul
+      - in: query
+        name: fields
+        type: string
+        description: Champs renvoyés ("a,b") ou exclus ("-a,-b"), document complet par défaut
     responses:
       200:
         description: Détail du log
@@ -127,25 +453,75 @@ def get_log_detail(log_id):
     """
     try:
         es = get_elasticsearch()
+        projection = parse_projection(request.args.get('fields'))
 
-        result = es.search(
-            index='iot-logs-*',
-            body={
-                "query": {"ids": {"values": [log_id]}}
-            }
-        )
-
-        if result['hits']['total']['value'] == 0:
+        # "index:id" : lecture directe ; identifiant seul : recherche ids
+        documents = fetch_documents(es, [log_id], projection)
+        if log_id not in documents:
             return jsonify({'error': 'Log not found'}), 404
 
-        log = result['hits']['hits'][0]['_source']
-        return jsonify(log), 200
+        return jsonify(documents[log_id]), 200
+    except (InvalidProjectionError, InvalidHandleError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/logs/_mget', methods=['POST'])
+@login_required
+def get_logs_batch():
+    """Récupérer plusieurs logs en une requête
+    ---
+    tags:
+      - Logs
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              items:
+                type: string
+              description: Références "index:id" (champ _handle des listes) ou identifiants seuls
+            fields:
+              type: string
+              description: Champs renvoyés ("a,b") ou exclus ("-a,-b")
+    responses:
+      200:
+        description: Documents dans l'ordre demandé (found false si introuvable)
+      400:
+        description: Requête invalide
+      500:
+        description: Erreur serveur
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        handles = data.get('ids')
+        if not isinstance(handles, list) or not handles:
+            return jsonify({'error': 'ids must be a non-empty list'}), 400
+        if len(handles) > MGET_MAX_DOCS:
+            return jsonify({'error': f'At most {MGET_MAX_DOCS} ids per request'}), 400
+
+        es = get_elasticsearch()
+        projection = parse_projection(data.get('fields'))
+        documents = fetch_documents(es, list(dict.fromkeys(handles)), projection)
+
+        docs = []
+        for handle in handles:
+            doc = {'_handle': handle, 'found': handle in documents}
+            if doc['found']:
+                doc['_source'] = documents[handle]
+            docs.append(doc)
+        return jsonify({'docs': docs}), 200
+    except (InvalidProjectionError, InvalidHandleError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/stats', methods=['GET'])
 @login_required
-@cached_route(ttl=600)
 def get_stats():
     """Récupérer les statistiques globales
     ---
@@ -177,121 +553,22 @@ def get_stats():
                   type: integer
                 normal:
                   type: integer
+            computed_at:
+              type: string
+              description: Date du dernier calcul (valeur précalculée)
+            age_seconds:
+              type: number
       500:
         description: Erreur serveur
     """
     try:
-        es = get_elasticsearch()
-        mongo = get_mongodb()
-
-        stats = {
-            'total_logs': 0,
-            'total_files': 0,
-            'sensors_count': 0,
-            'avg_temperature': 0,
-            'today_alerts': 0,
-            'alerts': {
-                'critical': 0,
-                'high': 0,
-                'normal': 0
-            }
-        }
-
-        result = es.count(index='iot-logs-*')
-        stats['total_logs'] = result['count']
-
-        stats['total_files'] = mongo.uploaded_files.count_documents({})
-
-        try:
-            agg_result = es.search(
-                index='iot-logs-*',
-                body={
-                    "aggs": {
-                        "unique_sensors": {
-                            "cardinality": {"field": "sensor_id"}
-                        }
-                    },
-                    "size": 0
-                }
-            )
-            stats['sensors_count'] = agg_result['aggregations']['unique_sensors']['value']
-        except Exception:
-            stats['sensors_count'] = 0
-
-        try:
-            temp_result = es.search(
-                index='iot-logs-*',
-                body={
-                    "query": {
-                        "term": {"sensor_type": "temperature"}
-                    },
-                    "aggs": {
-                        "avg_temp": {
-                            "avg": {"field": "value"}
-                        }
-                    },
-                    "size": 0
-                }
-            )
-            if temp_result['aggregations']['avg_temp']['value']:
-                stats['avg_temperature'] = round(temp_result['aggregations']['avg_temp']['value'], 1)
-        except Exception:
-            stats['avg_temperature'] = 0
-
-        try:
-            today = datetime.now().strftime("%Y-%m-%d")
-            today_alert_result = es.count(
-                index='iot-logs-*',
-                body={
-                    "query": {
-                        "bool": {
-                            "must": [
-                                {"range": {"@timestamp": {"gte": f"{today}||/d"}}},
-                                {"bool": {"must_not": {"term": {"status": "normal"}}}}
-                            ]
-                        }
-                    }
-                }
-            )
-            stats['today_alerts'] = today_alert_result['count']
-        except Exception:
-            stats['today_alerts'] = 0
-
-        try:
-            alert_result = es.search(
-                index='iot-logs-*',
-                body={
-                    "aggs": {
-                        "alerts_by_status": {
-                            "terms": {"field": "status"}
-                        }
-                    },
-                    "size": 0
-                }
-            )
-
-            status_mapping = {
-                'normal': 'normal',
-                'warning': 'high',
-                'alert': 'high',
-                'critical': 'critical'
-            }
-
-            for bucket in alert_result['aggregations']['alerts_by_status']['buckets']:
-                status = bucket['key']
-                count = bucket['doc_count']
-                alert_category = status_mapping.get(status, 'normal')
-                stats['alerts'][alert_category] += count
-        except Exception:
-            pass
-
-        return jsonify(stats), 200
+        return jsonify(read_precomputed('stats')), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/files', methods=['GET'])
 @login_required
-@cached_route(ttl=300)
+@cached_route(ttl=3600, tags=['files'])
 def get_files():
     """Récupérer la liste des fichiers uploadés
     ---
@@ -324,7 +601,6 @@ def get_files():
 
 @api_bp.route('/dashboard/stats', methods=['GET'])
 @login_required
-@cached_route(ttl=600)
 def get_dashboard_stats():
     """Récupérer les statistiques pour le dashboard
     ---
@@ -345,55 +621,16 @@ def get_dashboard_stats():
               type: integer
             active_sensors:
               type: integer
+            computed_at:
+              type: string
+              description: Date du dernier calcul (valeur précalculée)
+            age_seconds:
+              type: number
       500:
         description: Erreur serveur
     """
     try:
-        es = get_elasticsearch()
-        stats = {
-            'total_logs': 0,
-            'avg_temperature': 0,
-            'alerts_today': 0,
-            'active_sensors': 0
-        }
-        result = es.count(index='iot-logs-*')
-        stats['total_logs'] = result['count']
-        temp_result = es.search(
-            index='iot-logs-*',
-            body={
-                "query": {"term": {"sensor_type": "temperature"}},
-                "aggs": {"avg_temp": {"avg": {"field": "value"}}},
-                "size": 0
-            }
-        )
-        if temp_result['aggregations']['avg_temp']['value']:
-            stats['avg_temperature'] = round(temp_result['aggregations']['avg_temp']['value'], 1)
-        alerts_result = es.search(
-            index='iot-logs-*',
-            body={
-                "query": {
-                    "bool": {
-                        "must_not": {"term": {"status": "normal"}},
-                        "filter": {"range": {"@timestamp": {"gte": "now-24h"}}}
-                    }
-                },
-                "size": 0
-            }
-        )
-        stats['alerts_today'] = alerts_result['hits']['total']['value']
-        sensors_result = es.search(
-            index='iot-logs-*',
-            body={
-                "aggs": {
-                    "unique_sensors": {
-                        "cardinality": {"field": "sensor_id.keyword"}
-                    }
-                },
-                "size": 0
-            }
-        )
-        stats['active_sensors'] = sensors_result['aggregations']['unique_sensors']['value']
-        return jsonify(stats), 200
+        return jsonify(read_precomputed('dashboard_stats')), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -417,33 +654,128 @@ def get_recent_alerts():
         description: Erreur serveur
     """
     try:
+        return jsonify(read_precomputed('recent_alerts')), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _series_response(filters, **meta):
+    """Série temporelle des logs correspondant aux filtres"""
+    try:
+        start, end = parse_series_range(request.args)
+        max_points = parse_max_points(request.args.get('max_points'))
         es = get_elasticsearch()
-        result = es.search(
-            index='iot-logs-*',
-            body={
-                "query": {
-                    "bool": {
-                        "must_not": {"term": {"status": "normal"}}
-                    }
-                },
-                "sort": [{"@timestamp": {"order": "desc"}}],
-                "size": 10
-            }
-        )
-        alerts = []
-        for hit in result['hits']['hits']:
-            source = hit['_source']
-            alerts.append({
-                'date': source.get('@timestamp', source.get('timestamp', '')),
-                'type': source.get('sensor_type', ''),
-                'zone': source.get('zone', ''),
-                'message': f"{source.get('sensor_type', '')} - {source.get('value', '')} {source.get('unit', '')}",
-                'level': source.get('status', 'normal')
-            })
-        return jsonify({'alerts': alerts}), 200
+        if request.args.get('mode') == 'raw':
+            series = fetch_raw_series(es, filters, start, end, max_points)
+        else:
+            series = fetch_bucketed_series(es, filters, start, end, max_points)
+        series.update(meta, **{'from': start.isoformat(), 'to': end.isoformat()})
+        return jsonify(series), 200
+    except InvalidSeriesRequest as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/sensors/<sensor_id>/series', methods=['GET'])
+@login_required
+@cached_route(ttl=60, tags=['logs', ANY_DAY_TAG])
+def get_sensor_series(sensor_id):
+    """Série temporelle des valeurs d'un capteur
+    ---
+    tags:
+      - Stats
+    parameters:
+      - in: path
+        name: sensor_id
+        type: string
+        required: true
+        description: Identifiant du capteur
+      - in: query
+        name: range
+        type: string
+        description: Période relative (ex. 24h, 7d, 4w), 24h par défaut
+      - in: query
+        name: from
+        type: string
+        description: Début de la période (ISO 8601), prioritaire sur range
+      - in: query
+        name: to
+        type: string
+        description: Fin de la période (ISO 8601), maintenant par défaut
+      - in: query
+        name: max_points
+        type: integer
+        default: 500
+        description: Nombre maximal de points renvoyés (2000 au plus)
+      - in: query
+        name: mode
+        type: string
+        enum: [buckets, raw]
+        default: buckets
+        description: Agrégats min/max/moyenne par intervalle ou points bruts sous-échantillonnés (LTTB)
+    responses:
+      200:
+        description: Série en colonnes (timestamps en ms epoch, min, max, avg, count ou values)
+      400:
+        description: Paramètres invalides
+      500:
+        description: Erreur serveur
+    """
+    return _series_response({'sensor_id': sensor_id}, sensor_id=sensor_id)
+
+@api_bp.route('/zones/<zone>/series', methods=['GET'])
+@login_required
+@cached_route(ttl=60, tags=['logs', ANY_DAY_TAG])
+def get_zone_series(zone):
+    """Série temporelle des valeurs d'une zone
+    ---
+    tags:
+      - Stats
+    parameters:
+      - in: path
+        name: zone
+        type: string
+        required: true
+        description: Zone du bâtiment
+      - in: query
+        name: sensor_type
+        type: string
+        description: Type de capteur (recommandé, les unités diffèrent selon le type)
+      - in: query
+        name: range
+        type: string
+        description: Période relative (ex. 24h, 7d, 4w), 24h par défaut
+      - in: query
+        name: from
+        type: string
+        description: Début de la période (ISO 8601), prioritaire sur range
+      - in: query
+        name: to
+        type: string
+        description: Fin de la période (ISO 8601), maintenant par défaut
+      - in: query
+        name: max_points
+        type: integer
+        default: 500
+        description: Nombre maximal de points renvoyés (2000 au plus)
+      - in: query
+        name: mode
+        type: string
+        enum: [buckets, raw]
+        default: buckets
+        description: Agrégats min/max/moyenne par intervalle ou points bruts sous-échantillonnés (LTTB)
+    responses:
+      200:
+        description: Série en colonnes (timestamps en ms epoch, min, max, avg, count ou values)
+      400:
+        description: Paramètres invalides
+      500:
+        description: Erreur serveur
+    """
+    filters = {'zone': zone}
+    if request.args.get('sensor_type'):
+        filters['sensor_type'] = request.args['sensor_type']
+    return _series_response(filters, zone=zone, sensor_type=request.args.get('sensor_type'))
+
 @api_bp.route('/cache/stats', methods=['GET'])
 @login_required
 def get_cache_info():
@@ -514,3 +846,87 @@ def clear_cache_route():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@api_bp.route('/ingest', methods=['POST'])
+def ingest_stream():
+    """Ingérer des mesures en flux (NDJSON)
+    ---
+    tags:
+      - Ingestion
+    consumes:
+      - application/x-ndjson
+    parameters:
+      - in: header
+        name: X-Ingest-Token
+        type: string
+        description: Jeton de passerelle (STREAM_INGEST_TOKEN), sinon session requise
+      - in: body
+        name: body
+        required: true
+        description: Un document JSON par ligne (mêmes champs que les fichiers uploadés)
+        schema:
+          type: string
+    responses:
+      202:
+        description: Documents acceptés dans la file d'indexation
+        schema:
+          type: object
+          properties:
+            accepted:
+              type: integer
+            invalid:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: object
+      400:
+        description: Aucun document valide
+      401:
+        description: Jeton ou session requis
+      413:
+        description: Lot plus grand que la file
+      429:
+        description: File pleine, réessayer après Retry-After secondes
+      503:
+        description: Ingestion en flux désactivée
+    """
+    if not (token_authorized(request.headers.get('X-Ingest-Token')) or current_user.is_authenticated):
+        return jsonify({'error': 'Unauthorized', 'message': 'Ingest token or login required'}), 401
+
+    ingestor = get_stream_ingestor()
+    if ingestor is None:
+        return jsonify({'error': 'Stream ingestion is disabled'}), 503
+
+    body = request.get_data(cache=False).decode('utf-8', errors='replace')
+    documents, invalid, errors = parse_ndjson(body)
+    if not documents:
+        return jsonify({'error': 'No valid document', 'invalid': invalid, 'errors': errors}), 400
+    if len(documents) > ingestor.capacity:
+        return jsonify({'error': f'At most {ingestor.capacity} documents per request'}), 413
+
+    if not ingestor.offer(documents):
+        # Contre-pression : rien n'est accepté, la passerelle renvoie le lot plus tard
+        response = jsonify({'error': 'Ingest queue full', 'queue': ingestor.stats()})
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response, 429
+
+    return jsonify({'accepted': len(documents), 'invalid': invalid, 'errors': errors}), 202
+
+@api_bp.route('/ingest/stats', methods=['GET'])
+@login_required
+def get_ingest_stats():
+    """Compteurs de l'ingestion en flux
+    ---
+    tags:
+      - Ingestion
+    responses:
+      200:
+        description: Documents acceptés, refusés (429), indexés, en échec et profondeur de file
+      503:
+        description: Ingestion en flux désactivée
+    """
+    ingestor = get_stream_ingestor()
+    if ingestor is None:
+        return jsonify({'error': 'Stream ingestion is disabled'}), 503
+    return jsonify(ingestor.stats()), 200
@@ -1,7 +1,15 @@
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
 from app.services.database import get_elasticsearch, get_mongodb
-from app.services.redis_cache import cached_route
+from app.services.redis_cache import cached_route, request_tags
+from app.services.refresher import register_hot_query, read_precomputed
+from app.services.index_planner import ANY_DAY_TAG, search_target
+from app.services.columnar import wants_columnar, response_variant, to_columnar, COLUMNAR_FIELDS
+from app.services.log_search import (
+    build_search_query, build_facets_query, parse_facets, cursor_search, offset_window_exceeded,
+    parse_projection, apply_projection, projected_fields, hit_document, doc_handle,
+    InvalidCursorError, InvalidProjectionError, MAX_RESULT_WINDOW, LOG_LIST_FIELDS
+)
 from datetime import datetime
 
 search_bp = Blueprint('search', __name__)
@@ -14,7 +22,8 @@ def search_page():
 
 @search_bp.route('/query', methods=['GET', 'POST'])
 @login_required
-@cached_route(ttl=300)  # Cache search results for 5 minutes
+@cached_route(ttl=21600, unless=lambda: 'cursor' in request.args,
+              tags=request_tags('sensor_type', 'zone'), variant=response_variant)  # Invalidé par l'ingestion de nouvelles données
 def search_logs():
 
     """Recherche dans les logs"""
@@ -36,69 +45,66 @@ def search_logs():
         alert_level = data.get('alert_level')
         page = int(data.get('page', 1))
         per_page = int(data.get('per_page', 50))
+        cursor = data.get('cursor')
+        # Seuls les champs renvoyés sont lus (fields=, sinon projection par défaut)
+        columnar = wants_columnar(data)
+        projection = parse_projection(
+            data.get('fields'), default=COLUMNAR_FIELDS if columnar else LOG_LIST_FIELDS
+        )
+        docvalues = str(data.get('docvalues', 'false')).lower() == 'true'
         
         # Construire la requête Elasticsearch
-        must_conditions = []
-        
-        # Recherche textuelle
-        if query_text:
-            must_conditions.append({
-                "multi_match": {
-                    "query": query_text,
-                    "fields": ["sensor_id", "zone", "sensor_type", "alert_message"]
-                }
-            })
-        
-        # Filtres
-        if sensor_type:
-            must_conditions.append({"term": {"sensor_type": sensor_type}})
-        
-        if zone:
-            must_conditions.append({"term": {"zone": zone}})
-        
-        if alert_level:
-            must_conditions.append({"term": {"status": alert_level}})
-        
-        # Filtre de date
-        if date_from or date_to:
-            date_range = {}
-            if date_from:
-                date_range["gte"] = date_from
-            if date_to:
-                date_range["lte"] = date_to
+        query = build_search_query(data)
+        # Seuls les index journaliers de la période sont interrogés
+        target = search_target(date_from, date_to)
+        
+        if cursor is not None:
+            # Pagination par curseur : coût constant quelle que soit la profondeur
+            result, next_cursor = cursor_search(
+                es, target['index'], query, per_page, cursor=cursor or None,
+                source=projection, docvalues=docvalues
+            )
+        else:
+            if offset_window_exceeded(page, per_page):
+                return jsonify({
+                    'error': f'Offset pagination is limited to {MAX_RESULT_WINDOW} results, use cursor pagination'
+                }), 400
             
-            must_conditions.append({
-                "range": {"@timestamp": date_range}
-            })
-        
-        # Requête finale
-        query = {
-            "bool": {
-                "must": must_conditions if must_conditions else [{"match_all": {}}]
-            }
-        }
-        
-        # Calculer l'offset
-        from_index = (page - 1) * per_page
-        
-        # Exécuter la recherche
-        result = es.search(
-            index='iot-logs-*',
-            body={
+            # Calculer l'offset
+            from_index = (page - 1) * per_page
+            
+            # Exécuter la recherche
+            body = {
                 "query": query,
                 "from": from_index,
                 "size": per_page,
                 "sort": [{"@timestamp": {"order": "desc"}}]
             }
-        )
+            apply_projection(body, projection, docvalues)
+            result = es.search(body=body, **target)
         
         # Extraire les résultats
         logs = []
         for hit in result['hits']['hits']:
-            log = hit['_source']
+            log = hit_document(hit)
             log['_id'] = hit['_id']
-            log['_score'] = hit['_score']
+            log['_handle'] = doc_handle(hit)
+            if not columnar:
+                log['_score'] = hit['_score']
             logs.append(log)
+        if columnar:
+            payload = to_columnar(logs, ['_id', '_handle'] + projected_fields(projection, COLUMNAR_FIELDS))
+        else:
+            payload = {'logs': logs}
+        
+        if cursor:
+            # Pages suivantes d'un curseur : ni total ni historique
+            return jsonify(dict(
+                payload,
+                per_page=per_page,
+                next_cursor=next_cursor,
+                took_ms=result['took']
+            )), 200
         
         total = result['hits']['total']['value']
         
@@ -118,80 +124,60 @@ def search_logs():
         }
         mongo.search_history.insert_one(search_history)
         
-        return jsonify({
-            'logs': logs,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'pages': (total + per_page - 1) // per_page,
-            'took_ms': result['took']
-        }), 200
-        
+        if cursor is not None:
+            return jsonify(dict(
+                payload,
+                total=total,
+                per_page=per_page,
+                next_cursor=next_cursor,
+                took_ms=result['took']
+            )), 200
+        
+        return jsonify(dict(
+            payload,
+            total=total,
+            page=page,
+            per_page=per_page,
+            pages=(total + per_page - 1) // per_page,
+            took_ms=result['took']
+        )), 200
+        
+    except (InvalidCursorError, InvalidProjectionError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def compute_search_filters():
+    """Valeurs possibles des filtres de recherche (sans sélection)"""
+    es = get_elasticsearch()
+    result = es.search(body=build_facets_query({}), **search_target())
+    return parse_facets(result)
+
+
+# Agrégat recalculé en arrière-plan (voir app/services/refresher.py)
+register_hot_query('search_filters', compute_search_filters, interval=300, tags=['logs', ANY_DAY_TAG])
+
+
 @search_bp.route('/filters', methods=['GET'])
+@cached_route(ttl=3600, unless=lambda: not request.args,
+              tags=request_tags('sensor_type', 'zone'), single_flight=True)  # Comme search_logs : jours ou index:*
 def get_search_filters():
-    """Obtenir les valeurs possibles pour les filtres"""
+    """
+    Obtenir les valeurs possibles pour les filtres
+    
+    Paramètres optionnels : counts=true pour les effectifs de chaque valeur,
+    sensor_type / zone / alert_level / q / date_from / date_to pour restreindre
+    les facettes à la sélection courante
+    """
     try:
-        es = get_elasticsearch()
+        if not request.args:
+            return jsonify(read_precomputed('search_filters')), 200
         
-        # Récupérer les valeurs uniques pour les filtres
-        filters = {
-            'sensor_types': [],
-            'zones': [],
-            'alert_levels': []
-        }
-        
-        # Sensor types
-        result = es.search(
-            index='iot-logs-*',
-            body={
-                "aggs": {
-                    "sensor_types": {
-                        "terms": {"field": "sensor_type.keyword", "size": 100}
-                    }
-                },
-                "size": 0
-            }
-        )
-        filters['sensor_types'] = [
-            bucket['key'] for bucket in result['aggregations']['sensor_types']['buckets']
-        ]
-        
-        # Zones
-        result = es.search(
-            index='iot-logs-*',
-            body={
-                "aggs": {
-                    "zones": {
-                        "terms": {"field": "zone.keyword", "size": 100}
-                    }
-                },
-                "size": 0
-            }
-        )
-        filters['zones'] = [
-            bucket['key'] for bucket in result['aggregations']['zones']['buckets']
-        ]
-        
-        # Alert levels
-        result = es.search(
-            index='iot-logs-*',
-            body={
-                "aggs": {
-                    "alert_levels": {
-                        "terms": {"field": "alert_level.keyword", "size": 100}
-                    }
-                },
-                "size": 0
-            }
-        )
-        filters['alert_levels'] = [
-            bucket['key'] for bucket in result['aggregations']['alert_levels']['buckets']
-        ]
-        
-        return jsonify(filters), 200
+        es = get_elasticsearch()
+        target = search_target(request.args.get('date_from'), request.args.get('date_to'))
+        result = es.search(body=build_facets_query(request.args), **target)
+        counts = request.args.get('counts', 'false').lower() == 'true'
+        return jsonify(parse_facets(result, counts=counts)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
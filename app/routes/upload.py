@@ -1,14 +1,33 @@
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from app.services.columnar_ingest import COLUMNAR_EXTENSIONS, columnar_available
 from app.services.database import get_mongodb
+from app.services.ingestion import get_ingestion_worker
+from app.services.redis_cache import bump_tags
+from pymongo import ReturnDocument
+import hashlib
 import os
-from datetime import datetime
+import shutil
+import uuid
+from datetime import datetime, timedelta
 
 upload_bp = Blueprint('upload', __name__)
 
 ALLOWED_EXTENSIONS = {'csv', 'json', 'log'}
+# Parquet / Arrow IPC : ingérés par le worker, si pyarrow est installé
+if columnar_available():
+    ALLOWED_EXTENSIONS |= COLUMNAR_EXTENSIONS
 UPLOAD_FOLDER = 'data/uploads'
+STAGING_FOLDER = os.path.join(UPLOAD_FOLDER, '.staging')
+
+# Upload par morceaux
+DEFAULT_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+MAX_CHUNK_SIZE = int(os.getenv('UPLOAD_MAX_CHUNK_SIZE', 64 * 1024 * 1024))
+MAX_TOTAL_SIZE = int(os.getenv('UPLOAD_MAX_TOTAL_SIZE', 10 * 1024 ** 3))
+# Session sans morceau reçu depuis ce délai : expirée, morceaux supprimés
+UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 86400))
+STREAM_BLOCK_SIZE = 1024 * 1024
 
 def allowed_file(filename):
     """Vérifier si l'extension du fichier est autorisée"""
@@ -65,7 +84,15 @@ def upload_file():
             'uploaded_by': current_user.username
         }
         
+        # Ingestion directe dans Elasticsearch par le worker d'arrière-plan
+        worker = get_ingestion_worker()
+        if worker is not None:
+            file_metadata['status'] = 'queued'
+        
         result = mongo.uploaded_files.insert_one(file_metadata)
+        if worker is not None:
+            worker.submit(result.inserted_id, filepath)
+        bump_tags('files')
         file_metadata['_id'] = str(result.inserted_id)
         
         # Convertir la date pour JSON
@@ -99,3 +126,320 @@ def get_upload_status(file_id):
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def _get_upload_session(upload_id):
+    """Récupérer une session d'upload par morceaux de l'utilisateur courant"""
+    mongo = get_mongodb()
+    return mongo.upload_sessions.find_one({
+        'upload_id': upload_id,
+        'uploaded_by': current_user.username
+    })
+
+def _chunk_path(session, index):
+    """Fichier d'un morceau vérifié"""
+    return os.path.join(session['staging_dir'], f"{index}.chunk")
+
+def _missing_chunks(session):
+    """Indices des morceaux pas encore reçus"""
+    received = session.get('chunks', {})
+    return [i for i in range(session['total_chunks']) if str(i) not in received]
+
+def _session_summary(session):
+    """Vue JSON d'une session d'upload"""
+    return {
+        'upload_id': session['upload_id'],
+        'filename': session['original_filename'],
+        'status': session['status'],
+        'total_size': session['total_size'],
+        'chunk_size': session['chunk_size'],
+        'total_chunks': session['total_chunks'],
+        'received_chunks': sorted(int(i) for i in session.get('chunks', {})),
+        'missing_chunks': _missing_chunks(session)
+    }
+
+def expire_upload_sessions(mongo, now=None):
+    """
+    Expirer les uploads par morceaux abandonnés
+
+    Les sessions sans morceau reçu depuis UPLOAD_SESSION_TTL passent en
+    "expired" et leurs morceaux sont supprimés, ainsi que les fichiers de
+    staging qui ne correspondent plus à aucune session en cours.
+
+    Returns:
+        int: nombre de sessions expirées
+    """
+    cutoff = (now or datetime.now()) - timedelta(seconds=UPLOAD_SESSION_TTL)
+    expired = 0
+    while True:
+        session = mongo.upload_sessions.find_one_and_update(
+            {'status': {'$in': ['uploading', 'assembling']}, 'updated_at': {'$lt': cutoff}},
+            {'$set': {'status': 'expired', 'expired_at': datetime.now()}}
+        )
+        if session is None:
+            break
+        shutil.rmtree(session.get('staging_dir', ''), ignore_errors=True)
+        expired += 1
+
+    if os.path.isdir(STAGING_FOLDER):
+        for entry in os.scandir(STAGING_FOLDER):
+            if datetime.fromtimestamp(entry.stat().st_mtime) >= cutoff:
+                continue
+            active = mongo.upload_sessions.find_one({
+                'upload_id': entry.name.split('.', 1)[0],
+                'status': {'$in': ['uploading', 'assembling']}
+            })
+            if active is None:
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+    return expired
+
+@upload_bp.route('/chunked', methods=['POST'])
+@login_required
+def initiate_chunked_upload():
+    """Démarrer un upload par morceaux"""
+    try:
+        data = request.get_json(silent=True) or {}
+        original_filename = data.get('filename', '')
+        
+        if not original_filename:
+            return jsonify({'error': 'filename is required'}), 400
+        
+        if not allowed_file(original_filename):
+            return jsonify({'error': f'File type not allowed. Allowed: {ALLOWED_EXTENSIONS}'}), 400
+        
+        total_size = int(data.get('total_size', 0))
+        chunk_size = int(data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        if total_size <= 0:
+            return jsonify({'error': 'total_size must be positive'}), 400
+        if total_size > MAX_TOTAL_SIZE:
+            return jsonify({'error': f'total_size must not exceed {MAX_TOTAL_SIZE}'}), 413
+        if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+            return jsonify({'error': f'chunk_size must be between 1 and {MAX_CHUNK_SIZE}'}), 400
+        
+        mongo = get_mongodb()
+        expire_upload_sessions(mongo)
+        
+        # Un fichier par morceau, déplacé en place une fois vérifié
+        upload_id = uuid.uuid4().hex
+        staging_dir = os.path.join(STAGING_FOLDER, upload_id)
+        os.makedirs(staging_dir)
+        
+        now = datetime.now()
+        session = {
+            'upload_id': upload_id,
+            'filename': secure_filename(original_filename),
+            'original_filename': original_filename,
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': (total_size + chunk_size - 1) // chunk_size,
+            'chunks': {},
+            'staging_dir': staging_dir,
+            'status': 'uploading',
+            'created_at': now,
+            'updated_at': now,
+            'uploaded_by': current_user.username
+        }
+        mongo.upload_sessions.insert_one(session)
+        
+        return jsonify(_session_summary(session)), 201
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/chunked/<upload_id>', methods=['GET'])
+@login_required
+def get_chunked_upload(upload_id):
+    """État d'un upload par morceaux (pour reprendre après interruption)"""
+    try:
+        session = _get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        return jsonify(_session_summary(session)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@upload_bp.route('/chunked/<upload_id>/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """
+    Recevoir un morceau
+
+    Le morceau est écrit dans un fichier temporaire, vérifié (taille et
+    sha256), puis enregistré dans la session seulement si elle accepte
+    encore des morceaux et déplacé en place : un envoi refusé ou tardif
+    ne modifie jamais un morceau déjà accepté.
+    """
+    temp_path = None
+    try:
+        session = _get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        if session['status'] != 'uploading':
+            return jsonify({'error': f"Upload is {session['status']}"}), 409
+        if index < 0 or index >= session['total_chunks']:
+            return jsonify({'error': 'Chunk index out of range'}), 400
+        
+        expected_checksum = request.headers.get('X-Chunk-Checksum', '').lower()
+        if not expected_checksum:
+            return jsonify({'error': 'X-Chunk-Checksum header (sha256) is required'}), 400
+        
+        offset = index * session['chunk_size']
+        expected_size = min(session['chunk_size'], session['total_size'] - offset)
+        
+        # Copie du flux de la requête vers le disque par blocs
+        temp_path = os.path.join(session['staging_dir'], f"{index}.{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        written = 0
+        with open(temp_path, 'wb') as part:
+            while written < expected_size:
+                block = request.stream.read(min(STREAM_BLOCK_SIZE, expected_size - written))
+                if not block:
+                    break
+                part.write(block)
+                digest.update(block)
+                written += len(block)
+        
+        if written != expected_size or request.stream.read(1):
+            return jsonify({'error': f'Chunk {index} must be exactly {expected_size} bytes'}), 400
+        
+        checksum = digest.hexdigest()
+        if checksum != expected_checksum:
+            return jsonify({'error': 'Checksum mismatch', 'checksum': checksum}), 422
+        
+        accepted = get_mongodb().upload_sessions.find_one_and_update(
+            {'upload_id': upload_id, 'status': 'uploading'},
+            {'$set': {
+                f'chunks.{index}': {'size': written, 'sha256': checksum},
+                'updated_at': datetime.now()
+            }}
+        )
+        if accepted is None:
+            return jsonify({'error': 'Upload is no longer accepting chunks'}), 409
+        # La finalisation revérifie chaque morceau contre son empreinte
+        os.replace(temp_path, _chunk_path(session, index))
+        temp_path = None
+        
+        return jsonify({'upload_id': upload_id, 'index': index, 'size': written, 'sha256': checksum}), 200
+        
+    except FileNotFoundError:
+        # Dossier de staging supprimé : upload finalisé ou expiré entre-temps
+        temp_path = None
+        return jsonify({'error': 'Upload is no longer accepting chunks'}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _assemble(session, assembled_path):
+    """
+    Concaténer les morceaux en revérifiant chacun contre son empreinte
+
+    Returns:
+        tuple: (sha256 du fichier complet, indices des morceaux absents ou altérés)
+    """
+    digest = hashlib.sha256()
+    corrupted = []
+    with open(assembled_path, 'wb') as assembled:
+        for index in range(session['total_chunks']):
+            expected = session['chunks'][str(index)]
+            chunk_digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(_chunk_path(session, index), 'rb') as chunk:
+                    for block in iter(lambda: chunk.read(STREAM_BLOCK_SIZE), b''):
+                        assembled.write(block)
+                        digest.update(block)
+                        chunk_digest.update(block)
+                        size += len(block)
+            except FileNotFoundError:
+                corrupted.append(index)
+                continue
+            if size != expected['size'] or chunk_digest.hexdigest() != expected['sha256']:
+                corrupted.append(index)
+    return digest.hexdigest(), corrupted
+
+@upload_bp.route('/chunked/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    """Assembler l'upload et l'enregistrer dans uploaded_files"""
+    try:
+        mongo = get_mongodb()
+        session = _get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        if session['status'] != 'uploading':
+            return jsonify({'error': f"Upload is {session['status']}"}), 409
+        
+        missing = _missing_chunks(session)
+        if missing:
+            return jsonify({'error': 'Missing chunks', 'missing_chunks': missing}), 409
+        
+        # Une seule finalisation par session ; plus aucun morceau accepté ensuite
+        session = mongo.upload_sessions.find_one_and_update(
+            {'upload_id': upload_id, 'status': 'uploading'},
+            {'$set': {'status': 'assembling', 'updated_at': datetime.now()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if session is None:
+            return jsonify({'error': 'Upload is already being finalized'}), 409
+        
+        # Empreinte du fichier complet toujours calculée, morceaux revérifiés
+        assembled_path = os.path.join(session['staging_dir'], 'assembled')
+        sha256, corrupted = _assemble(session, assembled_path)
+        
+        data = request.get_json(silent=True) or {}
+        if corrupted or (data.get('sha256') and data['sha256'].lower() != sha256):
+            os.remove(assembled_path)
+            update = {'$set': {'status': 'uploading', 'updated_at': datetime.now()}}
+            if corrupted:
+                # Morceaux à renvoyer
+                update['$unset'] = {f'chunks.{index}': '' for index in corrupted}
+            mongo.upload_sessions.update_one({'upload_id': upload_id}, update)
+            if corrupted:
+                return jsonify({'error': 'Corrupted chunks', 'missing_chunks': corrupted}), 409
+            return jsonify({'error': 'File checksum mismatch', 'sha256': sha256}), 422
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{timestamp}_{session['filename']}"
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        os.replace(assembled_path, filepath)
+        shutil.rmtree(session['staging_dir'], ignore_errors=True)
+        
+        worker = get_ingestion_worker()
+        file_metadata = {
+            'filename': filename,
+            'original_filename': session['original_filename'],
+            'upload_date': datetime.now(),
+            'size': os.path.getsize(filepath),
+            'sha256': sha256,
+            'status': 'queued' if worker is not None else 'uploaded',
+            'filepath': filepath,
+            'records_count': 0,
+            'uploaded_by': current_user.username,
+            'upload_id': upload_id
+        }
+        
+        result = mongo.uploaded_files.insert_one(file_metadata)
+        if worker is not None:
+            worker.submit(result.inserted_id, filepath)
+        bump_tags('files')
+        mongo.upload_sessions.update_one(
+            {'upload_id': upload_id},
+            {'$set': {'status': 'completed', 'file_id': result.inserted_id, 'completed_at': datetime.now()}}
+        )
+        
+        file_metadata['_id'] = str(result.inserted_id)
+        file_metadata['upload_date'] = file_metadata['upload_date'].isoformat()
+        
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'file': file_metadata
+        }), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,67 @@
+"""
+Format de réponse en colonnes
+Une liste de documents est renvoyée sous forme d'un tableau par champ ;
+les colonnes de chaînes peu variées (zone, type de capteur, unité...) sont
+encodées par dictionnaire (valeurs distinctes + codes entiers)
+"""
+from flask import request
+
+COLUMNAR_MEDIA_TYPE = 'application/vnd.iot.columnar+json'
+
+# Champs renvoyés par défaut (seuls ces champs sont lus dans _source)
+COLUMNAR_FIELDS = [
+    '@timestamp', 'sensor_id', 'sensor_type', 'zone', 'value',
+    'unit', 'status', 'alert_level', 'building_id'
+]
+
+
+def wants_columnar(params=None):
+    """Format colonnes demandé par format=columnar ou par l'en-tête Accept"""
+    params = request.args if params is None else params
+    requested = params.get('format')
+    if requested:
+        return requested == 'columnar'
+    # Uniquement sur demande explicite (pas via */*)
+    return any(
+        value == COLUMNAR_MEDIA_TYPE and quality > 0
+        for value, quality in request.accept_mimetypes
+    )
+
+
+def response_variant():
+    """Variante de réponse, à inclure dans la clé de cache"""
+    return 'columnar' if wants_columnar() else None
+
+
+def _encode_column(values):
+    """Encoder par dictionnaire une colonne de chaînes répétitives"""
+    if not values or not all(isinstance(v, str) or v is None for v in values):
+        return values
+    dictionary = {}
+    codes = []
+    for value in values:
+        if value is None:
+            codes.append(-1)
+            continue
+        code = dictionary.get(value)
+        if code is None:
+            code = dictionary[value] = len(dictionary)
+        codes.append(code)
+    # Inutile si presque toutes les valeurs sont distinctes
+    if len(dictionary) * 2 > len(values):
+        return values
+    return {'dictionary': list(dictionary), 'codes': codes}
+
+
+def to_columnar(documents, fields):
+    """
+    Convertir une liste de documents en colonnes
+
+    Returns:
+        dict: {'fields': [...], 'rows': n, 'columns': {champ: valeurs ou {'dictionary', 'codes'}}}
+        (code -1 = valeur absente)
+    """
+    columns = {}
+    for field in fields:
+        columns[field] = _encode_column([document.get(field) for document in documents])
+    return {'format': 'columnar', 'fields': list(fields), 'rows': len(documents), 'columns': columns}
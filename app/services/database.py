@@ -2,17 +2,94 @@ from elasticsearch import Elasticsearch
 from pymongo import MongoClient
 import redis
 import os
+import threading
+import time
 from datetime import datetime
 
 # Connexions globales
 es_client = None
 mongo_client = None
 redis_client = None
+redis_pool = None
+redis_binary_client = None
 mongo_db = None
+_redis_pool_lock = threading.Lock()
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Pool Redis borné qui mesure les checkouts et les temps d'attente"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._checkout_errors = 0
+        self._waited_checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._in_use = 0
+        self._peak_in_use = 0
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            with self._stats_lock:
+                self._checkout_errors += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            # Au-delà d'une milliseconde, le checkout a attendu une connexion libre
+            if waited > 0.001:
+                self._waited_checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        with self._stats_lock:
+            self._in_use = max(0, self._in_use - 1)
+
+    def stats(self):
+        """Métriques de checkout du pool"""
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                'max_connections': self.max_connections,
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': checkouts,
+                'waited_checkouts': self._waited_checkouts,
+                'checkout_errors': self._checkout_errors,
+                'avg_wait_ms': round(self._wait_total / checkouts * 1000, 3) if checkouts else 0,
+                'max_wait_ms': round(self._wait_max * 1000, 3),
+                'saturated': self._in_use >= self.max_connections
+            }
+
+
+def create_redis_pool(host=None, port=None, decode_responses=True):
+    """Créer le pool de connexions Redis partagé à partir de l'environnement"""
+    return InstrumentedConnectionPool(
+        host=host or os.getenv('REDIS_HOST', 'localhost'),
+        port=int(port or os.getenv('REDIS_PORT', 6379)),
+        db=int(os.getenv('REDIS_DB', 0)),
+        password=os.getenv('REDIS_PASSWORD') or None,
+        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+        timeout=float(os.getenv('REDIS_POOL_TIMEOUT', 2)),
+        socket_timeout=float(os.getenv('REDIS_SOCKET_TIMEOUT', 2)),
+        socket_connect_timeout=float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 2)),
+        health_check_interval=int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+        decode_responses=decode_responses
+    )
 
 def init_databases(app):
     """Initialiser les connexions aux bases de données"""
-    global es_client, mongo_client, redis_client, mongo_db
+    global es_client, mongo_client, redis_client, redis_pool, redis_binary_client, mongo_db
     
     # Elasticsearch
     es_host = os.getenv('ELASTICSEARCH_HOST', 'localhost')
@@ -77,30 +154,25 @@ def init_databases(app):
     except Exception as e:
         app.logger.error(f"❌ Erreur MongoDB: {e}")
     
-    # Redis
+    # Redis (un seul pool borné partagé par tout le processus)
+    redis_binary_client = None
     redis_host = os.getenv('REDIS_HOST', 'localhost')
     redis_port = int(os.getenv('REDIS_PORT', 6379))
     
     try:
-        redis_client = redis.Redis(
-            host=redis_host,
-            port=redis_port,
-            db=int(os.getenv('REDIS_DB', 0)),
-            decode_responses=True
-        )
+        redis_pool = create_redis_pool(redis_host, redis_port)
+        redis_client = redis.Redis(connection_pool=redis_pool)
         redis_client.ping()
-        app.logger.info("✅ Connexion Redis établie")
+        app.logger.info(f"✅ Connexion Redis établie (pool max {redis_pool.max_connections})")
     except Exception as e:
         app.logger.error(f"❌ Erreur Redis: {e}")
         # Fallback sur localhost si host docker n'est pas joignable
         if redis_host != 'localhost':
             try:
-                redis_client = redis.Redis(
-                    host='localhost',
-                    port=6379,
-                    db=int(os.getenv('REDIS_DB', 0)),
-                    decode_responses=True
-                )
+                if redis_pool is not None:
+                    redis_pool.disconnect()
+                redis_pool = create_redis_pool('localhost', 6379)
+                redis_client = redis.Redis(connection_pool=redis_pool)
                 redis_client.ping()
                 app.logger.info("🔁 Fallback: Redis connecté sur localhost:6379")
             except Exception as e2:
@@ -115,5 +187,48 @@ def get_mongodb():
     return mongo_db
 
 def get_redis():
-    """Obtenir le client Redis"""
+    """Obtenir le client Redis partagé (créé à la demande hors application)"""
+    global redis_client, redis_pool
+    if redis_client is None:
+        with _redis_pool_lock:
+            if redis_client is None:
+                redis_pool = create_redis_pool()
+                redis_client = redis.Redis(connection_pool=redis_pool)
     return redis_client
+
+def get_redis_binary():
+    """
+    Client Redis sans décodage des réponses (corps du cache de routes)
+
+    Le décodage est un réglage de connexion : pool dédié, mêmes serveur et
+    réglages que le pool partagé, créé à la première utilisation.
+    """
+    global redis_binary_client
+    # Serveur effectif du pool partagé (éventuellement celui du fallback)
+    shared_kwargs = get_redis().connection_pool.connection_kwargs
+    if redis_binary_client is None:
+        with _redis_pool_lock:
+            if redis_binary_client is None:
+                redis_binary_client = redis.Redis(connection_pool=create_redis_pool(
+                    shared_kwargs['host'], shared_kwargs['port'], decode_responses=False
+                ))
+    return redis_binary_client
+
+def create_redis_subscriber():
+    """
+    Client Redis dédié aux abonnements pub/sub
+
+    Même serveur que le pool partagé, mais sans socket_timeout : une
+    connexion en attente de messages sur un canal calme ne doit pas expirer.
+    """
+    connection_kwargs = dict(get_redis().connection_pool.connection_kwargs, socket_timeout=None)
+    return redis.Redis(connection_pool=redis.ConnectionPool(max_connections=1, **connection_kwargs))
+
+def get_redis_pool_stats():
+    """Obtenir les métriques du pool de connexions Redis"""
+    if redis_pool is None:
+        return {}
+    stats = redis_pool.stats()
+    if redis_binary_client is not None:
+        stats['binary'] = redis_binary_client.connection_pool.stats()
+    return stats
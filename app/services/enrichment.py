@@ -0,0 +1,390 @@
+"""
+Règles d'enrichissement des mesures capteurs
+Table unique (versionnée) des seuils par type de capteur, des unités et de
+la géolocalisation des zones, appliquée document par document ou par lots
+entiers en opérations colonnes (pandas/NumPy) ; utilisée par l'ingestion
+des uploads, l'ingestion en flux et le générateur de données
+"""
+import operator
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # requirements-minimal.txt : enrichissement document par document
+    np = pd = None
+
+# À incrémenter à chaque modification des règles (champ pipeline_version) ;
+# logstash.conf est ensuite régénéré : python scripts/build_logstash_conf.py
+RULES_VERSION = '1.1'
+
+# Par type : unité, puis règles (opérateur, seuil, libellé[, message]) évaluées
+# dans l'ordre, la première vérifiée l'emporte ; sans règle vérifiée, 'normal'
+SENSOR_RULES = {
+    'temperature': {
+        'unit': '°C',
+        'alert_level': [
+            ('>', 30, 'high', 'Température élevée détectée'),
+            ('<', 15, 'low', 'Température basse détectée')
+        ],
+        'status': [('>', 30, 'alert'), ('<', 15, 'alert')]
+    },
+    'co2': {
+        'unit': 'ppm',
+        'alert_level': [('>', 1000, 'critical', 'Niveau CO2 critique')],
+        'status': [('>', 1000, 'critical'), ('>', 800, 'warning')]
+    },
+    'humidity': {
+        'unit': '%',
+        'status': [('>', 70, 'warning'), ('<', 30, 'warning')]
+    },
+    'luminosity': {'unit': 'lux'},
+    'energy': {'unit': 'kWh'},
+    'occupancy': {'unit': '%'}
+}
+DEFAULT_LEVEL = 'normal'
+
+# Géolocalisation simulée par zone (reportée dans logstash.conf, voir RULES_VERSION)
+ZONE_LOCATIONS = {
+    'zone_a': {'lat': 48.8566, 'lon': 2.3522},
+    'zone_b': {'lat': 48.8576, 'lon': 2.3532}
+}
+
+STRING_FIELDS = ('sensor_id', 'sensor_type', 'zone', 'unit', 'status')
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%S.%f%z']
+# Epoch numérique : millisecondes au-delà (1e11 s ≈ an 5138)
+EPOCH_MS_THRESHOLD = 1e11
+
+OPERATORS = {'>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le}
+
+
+def unit_for(sensor_type):
+    """Unité de mesure d'un type de capteur"""
+    return SENSOR_RULES.get(sensor_type, {}).get('unit', '')
+
+
+def classify(sensor_type, value, field):
+    """
+    Évaluer les règles d'un champ (alert_level ou status) pour une mesure
+
+    Returns:
+        tuple: (libellé, message) ; (None, None) si le champ n'a pas de
+        règle pour ce type (alert_level) ou si la valeur est absente
+    """
+    rules = SENSOR_RULES.get(sensor_type, {}).get(field)
+    if value is None or (rules is None and field == 'alert_level'):
+        return None, None
+    for op, threshold, label, *message in rules or ():
+        if OPERATORS[op](value, threshold):
+            return label, message[0] if message else None
+    return DEFAULT_LEVEL, None
+
+
+def parse_timestamp(value):
+    """
+    Convertir un horodatage en datetime UTC
+
+    Accepte les chaînes ISO8601 ou 'YYYY-MM-DD HH:MM:SS', les datetime et
+    les epochs numériques (secondes, ou millisecondes au-delà de
+    EPOCH_MS_THRESHOLD). Tout autre type renvoie None (_dateparsefailure).
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if abs(value) >= EPOCH_MS_THRESHOLD else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif not isinstance(value, str) or not value.strip():
+        return None
+    else:
+        value = value.strip()
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            parsed = None
+            for fmt in TIMESTAMP_FORMATS:
+                try:
+                    parsed = datetime.strptime(value, fmt)
+                    break
+                except ValueError:
+                    continue
+            if parsed is None:
+                return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def enrich_record(record):
+    """Appliquer au document l'enrichissement du pipeline Logstash"""
+    for field in STRING_FIELDS:
+        if isinstance(record.get(field), str):
+            record[field] = record[field].strip()
+
+    try:
+        record['value'] = float(record['value'])
+    except (KeyError, TypeError, ValueError):
+        record.pop('value', None)
+
+    timestamp = parse_timestamp(record.get('timestamp') or record.get('@timestamp'))
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc)
+        record.setdefault('tags', []).append('_dateparsefailure')
+    record['@timestamp'] = timestamp.isoformat()
+
+    sensor_type = record.get('sensor_type')
+    value = record.get('value')
+    alert_level, alert_message = classify(sensor_type, value, 'alert_level')
+    if alert_level:
+        record['alert_level'] = alert_level
+        if alert_message:
+            record['alert_message'] = alert_message
+    # Statut et unité complétés s'ils ne sont pas fournis par le capteur
+    if not record.get('status'):
+        status, _ = classify(sensor_type, value, 'status')
+        if status:
+            record['status'] = status
+    if not record.get('unit') and unit_for(sensor_type):
+        record['unit'] = unit_for(sensor_type)
+
+    location = ZONE_LOCATIONS.get(record.get('zone'))
+    if location:
+        record['location'] = dict(location)
+
+    record['ingestion_timestamp'] = datetime.now(timezone.utc).isoformat()
+    record['pipeline_version'] = RULES_VERSION
+    return record
+
+
+def classify_column(sensor_types, values, field):
+    """
+    Évaluer les règles d'un champ sur des colonnes entières
+
+    Returns:
+        tuple: (libellés, messages) en tableaux objets (None sans règle applicable)
+    """
+    present = ~np.isnan(values)
+    # Comparaisons sur les codes entiers des types plutôt que sur les chaînes
+    codes, uniques = pd.factorize(sensor_types)
+    type_codes = {sensor_type: code for code, sensor_type in enumerate(uniques)}
+    conditions, labels, messages = [], [], []
+    for sensor_type, rules in SENSOR_RULES.items():
+        field_rules = rules.get(field)
+        if field_rules is None and field == 'alert_level':
+            continue
+        is_type = present & (codes == type_codes.get(sensor_type, -2))
+        for op, threshold, label, *message in field_rules or ():
+            conditions.append(is_type & OPERATORS[op](values, threshold))
+            labels.append(label)
+            messages.append(message[0] if message else None)
+        conditions.append(is_type)
+        labels.append(DEFAULT_LEVEL)
+        messages.append(None)
+    if field == 'status':
+        # Types inconnus : statut par défaut dès qu'une valeur est présente
+        conditions.append(present)
+        labels.append(DEFAULT_LEVEL)
+        messages.append(None)
+    if not conditions:
+        empty = np.full(len(values), None, dtype=object)
+        return empty, empty.copy()
+    return (
+        np.select(conditions, np.array(labels, dtype=object), default=None),
+        np.select(conditions, np.array(messages, dtype=object), default=None)
+    )
+
+
+def _missing(column):
+    """Cellules absentes ou vides d'une colonne"""
+    return (column.isna() | (column == '')).to_numpy(dtype=bool)
+
+
+def _column(frame, field):
+    """Colonne d'un lot (objets, None si absente du lot)"""
+    if field in frame:
+        return frame[field].astype(object).where(frame[field].notna(), None)
+    return pd.Series(None, index=frame.index, dtype=object)
+
+
+def _is_dated(frame, field):
+    """Colonne de dates (datetime64) présente dans le lot"""
+    return field in frame and pd.api.types.is_datetime64_any_dtype(frame[field])
+
+
+def _format_timestamps(timestamps):
+    """Même représentation que datetime.isoformat() (UTC), une fois par instant distinct"""
+    codes, instants = pd.factorize(timestamps.dt.tz_localize(None).to_numpy(dtype='datetime64[us]'))
+    whole = (instants.astype('int64') % 1000000) == 0
+    text = np.where(
+        whole,
+        np.datetime_as_string(instants, unit='s'),
+        np.datetime_as_string(instants, unit='us')
+    )
+    return np.char.add(text, '+00:00').astype(object)[codes]
+
+
+def _strip(column):
+    """Retirer les espaces d'une colonne de chaînes (une fois par valeur distincte)"""
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    stripped = np.array([value.strip() if isinstance(value, str) else value for value in uniques], dtype=object)
+    values = np.empty(len(column), dtype=object)
+    present = codes >= 0
+    values[present] = stripped[codes[present]]
+    values[~present] = None
+    return values
+
+
+def enrich_frame(frame, now=None):
+    """
+    Enrichir un lot de mesures (DataFrame) en opérations colonnes
+
+    Mêmes règles et même résultat qu'enrich_record appliqué à chaque ligne
+    (les champs absents valent None).
+    """
+    now = now or datetime.now(timezone.utc)
+    frame = frame.copy()
+    rows = len(frame)
+
+    for field in STRING_FIELDS:
+        if field in frame and not pd.api.types.is_numeric_dtype(frame[field]):
+            frame[field] = _strip(frame[field])
+
+    if 'value' in frame:
+        values = pd.to_numeric(frame['value'], errors='coerce').astype('float64').to_numpy(copy=True)
+        # Chaînes reconverties à l'identique de float() (to_numeric peut différer au dernier chiffre)
+        texts = np.flatnonzero(~np.isnan(values) & frame['value'].map(type).eq(str).to_numpy())
+        if len(texts):
+            values[texts] = frame['value'].iloc[texts].astype('float64').to_numpy()
+        frame['value'] = values
+    else:
+        values = np.full(rows, np.nan)
+
+    if _is_dated(frame, 'timestamp') and frame['timestamp'].notna().all():
+        # Colonne déjà datée (Parquet/Arrow) : pas d'analyse de texte
+        timestamps = pd.to_datetime(frame['timestamp'], utc=True)
+    else:
+        # timestamp prioritaire sur @timestamp (comme enrich_record)
+        raw_timestamps = pd.Series(None, index=frame.index, dtype=object)
+        for field in ('@timestamp', 'timestamp'):
+            if field in frame:
+                raw_timestamps = raw_timestamps.where(_missing(frame[field]), frame[field])
+        raw_timestamps = pd.Series(_strip(raw_timestamps), index=frame.index)
+        texts = raw_timestamps.map(type).eq(str).to_numpy()
+        timestamps = pd.to_datetime(
+            raw_timestamps.where(texts), utc=True, errors='coerce', format='ISO8601'
+        ).dt.as_unit('us')
+        # Epochs numériques et dates : mêmes conversions que parse_timestamp
+        others = np.flatnonzero(~texts & raw_timestamps.notna().to_numpy())
+        if len(others):
+            parsed = [parse_timestamp(value) for value in raw_timestamps.iloc[others]]
+            timestamps.iloc[others] = pd.to_datetime(pd.Series(parsed, dtype=object), utc=True).dt.as_unit('us')
+    # Résolution unique (us) quelle que soit celle inférée à l'analyse
+    timestamps = timestamps.dt.as_unit('us')
+    failed = timestamps.isna().to_numpy()
+    if failed.any():
+        timestamps[failed] = pd.Timestamp(now).as_unit('us')
+        tags = _column(frame, 'tags').to_numpy(copy=True)
+        for position in np.flatnonzero(failed):
+            existing = tags[position]
+            tags[position] = (existing if isinstance(existing, list) else []) + ['_dateparsefailure']
+        frame['tags'] = tags
+    frame['@timestamp'] = _format_timestamps(timestamps)
+
+    sensor_types = _column(frame, 'sensor_type').to_numpy()
+    alert_levels, alert_messages = classify_column(sensor_types, values, 'alert_level')
+    classified = pd.notna(alert_levels)
+    if classified.any():
+        alert_level = _column(frame, 'alert_level')
+        alert_level[classified] = alert_levels[classified]
+        frame['alert_level'] = alert_level
+        with_message = pd.notna(alert_messages)
+        alert_message = _column(frame, 'alert_message')
+        alert_message[with_message] = alert_messages[with_message]
+        frame['alert_message'] = alert_message
+
+    # Statut et unité complétés s'ils ne sont pas fournis par le capteur
+    statuses, _ = classify_column(sensor_types, values, 'status')
+    status = _column(frame, 'status')
+    fill = _missing(status) & pd.notna(statuses)
+    status[fill] = statuses[fill]
+    frame['status'] = status
+
+    units = pd.Series(sensor_types, index=frame.index).map(
+        {sensor_type: rules['unit'] for sensor_type, rules in SENSOR_RULES.items()}
+    ).to_numpy(dtype=object)
+    unit = _column(frame, 'unit')
+    fill = _missing(unit) & pd.notna(units)
+    unit[fill] = units[fill]
+    frame['unit'] = unit
+
+    if 'zone' in frame:
+        frame['location'] = _column(frame, 'zone').map(ZONE_LOCATIONS)
+
+    frame['ingestion_timestamp'] = datetime.now(timezone.utc).isoformat()
+    frame['pipeline_version'] = RULES_VERSION
+    return frame
+
+
+def frame_documents(frame):
+    """Documents d'un DataFrame enrichi, sans les champs absents (None ou NaN)"""
+    names = list(frame.columns)
+    columns = [frame[name].tolist() for name in names]
+    documents = [dict(zip(names, row)) for row in zip(*columns)]
+    # Suppression ciblée : seules les cellules absentes sont visitées
+    for name in names:
+        for position in np.flatnonzero(frame[name].isna().to_numpy()):
+            del documents[position][name]
+    if 'location' in frame:
+        for document in documents:
+            if 'location' in document:
+                document['location'] = dict(document['location'])
+    return documents
+
+
+def frame_json(frame):
+    """
+    Documents JSON d'un DataFrame enrichi (une chaîne par ligne)
+
+    Comme frame_documents, les champs absents (None ou NaN) sont omis : les
+    lignes sont regroupées par ensemble de champs présents et chaque groupe
+    est sérialisé en un appel.
+    """
+    if frame.empty:
+        return []
+    # Dates en chaînes ISO UTC (comme @timestamp), formatées en colonnes
+    dated = {}
+    for field in frame.columns:
+        if _is_dated(frame, field):
+            column = frame[field]
+            column = column.dt.tz_convert('UTC') if column.dt.tz is not None else column.dt.tz_localize('UTC')
+            present = column.notna().to_numpy()
+            formatted = np.full(len(column), None, dtype=object)
+            if present.any():
+                formatted[present] = _format_timestamps(column[present])
+            dated[field] = formatted
+    if dated:
+        frame = frame.assign(**dated)
+    missing = frame.isna().to_numpy()
+    patterns, groups = np.unique(missing, axis=0, return_inverse=True)
+    lines = [None] * len(frame)
+    for number, pattern in enumerate(patterns):
+        rows = np.flatnonzero(groups.reshape(-1) == number)
+        subset = frame.iloc[rows, np.flatnonzero(~pattern)]
+        text = subset.to_json(orient='records', lines=True, force_ascii=False, date_format='iso', date_unit='ms')
+        # Sauts de ligne échappés dans les valeurs : seul '\n' sépare les documents
+        for position, line in zip(rows, text.rstrip('\n').split('\n')):
+            lines[position] = line
+    return lines
+
+
+def enrich_records(records):
+    """
+    Enrichir une liste de documents en un seul passage colonnes
+
+    Sans pandas, ou pour de très petits lots, enrichissement document par document.
+    """
+    if pd is None or len(records) < 64:
+        return [enrich_record(record) for record in records]
+    return frame_documents(enrich_frame(pd.DataFrame.from_records(records)))
@@ -0,0 +1,186 @@
+"""
+Planification des index interrogés
+Les logs sont répartis en index journaliers (iot-logs-YYYY.MM.dd, date UTC
+de @timestamp) : une requête bornée dans le temps ne cible que les index
+des jours concernés au lieu de tous les index iot-logs-*
+"""
+import calendar
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+
+LOG_INDEX_PREFIX = 'iot-logs-'
+LOG_INDEX_PATTERN = f"{LOG_INDEX_PREFIX}*"
+# Tags de cache des écritures : "index:YYYY.MM.dd" par jour, "index:*" pour tout jour
+DAY_TAG_PREFIX = 'index:'
+ANY_DAY_TAG = f"{DAY_TAG_PREFIX}*"
+
+# Au-delà, les jours sont regroupés par mois puis par année (motifs)
+PLAN_MAX_DAYS = int(os.getenv('INDEX_PLAN_MAX_DAYS', 31))
+PLAN_MAX_MONTHS = int(os.getenv('INDEX_PLAN_MAX_MONTHS', 36))
+
+DATE_MATH_PATTERN = re.compile(r'^(?:now|(?P<anchor>[^|]+)\|\|)(?P<offsets>(?:[+-]\d+[smhdwMy])*)(?:/(?P<round>[smhdwMy]))?$')
+DATE_MATH_OFFSET = re.compile(r'([+-])(\d+)([smhdwMy])')
+DATE_MATH_UNITS = {
+    's': timedelta(seconds=1),
+    'm': timedelta(minutes=1),
+    'h': timedelta(hours=1),
+    'd': timedelta(days=1),
+    'w': timedelta(weeks=1)
+}
+
+
+def _add_months(moment, months):
+    """Décaler d'un nombre de mois calendaires (jour ramené à la fin du mois si besoin)"""
+    month = moment.month - 1 + months
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+def _shift(moment, amount, unit):
+    if unit == 'M':
+        return _add_months(moment, amount)
+    if unit == 'y':
+        return _add_months(moment, 12 * amount)
+    return moment + DATE_MATH_UNITS[unit] * amount
+
+
+def _round(moment, unit, round_up):
+    """
+    Arrondir à l'unité comme Elasticsearch (semaines commençant le lundi)
+
+    Une borne haute (lte) est arrondie à la dernière milliseconde de l'unité.
+    """
+    if unit == 's':
+        floor = moment.replace(microsecond=0)
+    elif unit == 'm':
+        floor = moment.replace(second=0, microsecond=0)
+    elif unit == 'h':
+        floor = moment.replace(minute=0, second=0, microsecond=0)
+    else:
+        floor = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        if unit == 'w':
+            floor -= timedelta(days=floor.weekday())
+        elif unit == 'M':
+            floor = floor.replace(day=1)
+        elif unit == 'y':
+            floor = floor.replace(month=1, day=1)
+    if not round_up:
+        return floor
+    return _shift(floor, 1, unit) - timedelta(milliseconds=1)
+
+
+def _to_utc(parsed):
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _parse_date(value):
+    try:
+        return _to_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except ValueError:
+        return None
+
+
+def parse_bound(value, now=None, round_up=False):
+    """
+    Convertir une borne de période en datetime UTC
+
+    Accepte un datetime, une date ISO 8601 ou une expression de date math
+    Elasticsearch (now, now-7d, now-1M/M, 2026-03-01||+1d/d) ; l'arrondi
+    (/d, /w, /M...) descend au début de l'unité, ou monte à sa fin pour
+    une borne haute (round_up, comme lte).
+
+    Returns:
+        datetime ou None si la borne n'est pas interprétable
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return _to_utc(value)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    value = str(value).strip()
+    match = DATE_MATH_PATTERN.match(value)
+    if match is None:
+        return _parse_date(value)
+    if match.group('anchor') is None:
+        moment = now or datetime.now(timezone.utc)
+    else:
+        moment = _parse_date(match.group('anchor'))
+        if moment is None:
+            return None
+    for sign, amount, unit in DATE_MATH_OFFSET.findall(match.group('offsets')):
+        moment = _shift(moment, int(amount) if sign == '+' else -int(amount), unit)
+    if match.group('round'):
+        moment = _round(moment, match.group('round'), round_up)
+    return moment
+
+
+def _days(start, end):
+    current = start
+    while current <= end:
+        yield current
+        current += timedelta(days=1)
+
+
+def _period_days(date_from, date_to, now):
+    """Jours UTC couverts par une période (None si elle n'a pas de début interprétable)"""
+    start = parse_bound(date_from, now)
+    if start is None:
+        return None
+    end = parse_bound(date_to, now, round_up=True) if date_to else None
+    if end is None:
+        end = now + timedelta(days=1)
+    if start > end:
+        start = end
+    return list(_days(start.date(), end.date()))
+
+
+def day_tags(date_from=None, date_to=None, now=None):
+    """
+    Tags de cache des jours d'une période (voir ingestion.data_tags)
+
+    Returns:
+        list ou None si la période n'est pas bornée ou couvre plus de PLAN_MAX_DAYS jours
+    """
+    days = _period_days(date_from, date_to, now or datetime.now(timezone.utc))
+    if days is None or len(days) > PLAN_MAX_DAYS:
+        return None
+    return [f"{DAY_TAG_PREFIX}{day.strftime('%Y.%m.%d')}" for day in days]
+
+
+def plan_indices(date_from=None, date_to=None, now=None):
+    """
+    Index à interroger pour une période
+
+    Sans début interprétable, tous les index sont ciblés ; sans fin, la
+    période s'étend jusqu'à demain (décalage d'horloge des capteurs).
+
+    Returns:
+        str: noms d'index séparés par des virgules (à utiliser avec
+        ignore_unavailable, voir search_target)
+    """
+    days = _period_days(date_from, date_to, now or datetime.now(timezone.utc))
+    if days is None:
+        return LOG_INDEX_PATTERN
+    if len(days) <= PLAN_MAX_DAYS:
+        return ','.join(f"{LOG_INDEX_PREFIX}{day.strftime('%Y.%m.%d')}" for day in days)
+
+    months = list(dict.fromkeys(day.strftime('%Y.%m') for day in days))
+    if len(months) <= PLAN_MAX_MONTHS:
+        return ','.join(f"{LOG_INDEX_PREFIX}{month}.*" for month in months)
+
+    years = dict.fromkeys(day.strftime('%Y') for day in days)
+    return ','.join(f"{LOG_INDEX_PREFIX}{year}.*" for year in years)
+
+
+def search_target(date_from=None, date_to=None, now=None):
+    """Paramètres index d'une recherche bornée (les jours sans index sont ignorés)"""
+    return {
+        'index': plan_indices(date_from, date_to, now),
+        'ignore_unavailable': True,
+        'allow_no_indices': True
+    }
@@ -0,0 +1,112 @@
+"""
+Surveillance des écritures dans les index de logs
+Les données indexées hors de l'application (input TCP et dossier de dépôt
+Logstash, générateur --stream) ne passent pas par bump_tags : un thread
+compare périodiquement les compteurs d'écriture des index iot-logs-* et
+invalide les réponses en cache qui dépendent des jours modifiés
+"""
+import logging
+import os
+import threading
+import time
+
+from app.services.index_planner import ANY_DAY_TAG, DAY_TAG_PREFIX, LOG_INDEX_PATTERN
+from app.services.lifecycle import index_day
+
+logger = logging.getLogger(__name__)
+
+INDEX_WATCH_SECONDS = float(os.getenv('INDEX_WATCH_SECONDS', 15))
+WATCH_STATE_KEY = 'index-watch:totals'
+# Champ présent dès le premier passage (même sans index)
+WATCH_MARKER = '_watched'
+
+_watcher = None
+
+
+def index_write_totals(es):
+    """Opérations d'écriture (indexations et suppressions) par index de logs"""
+    stats = es.indices.stats(
+        index=LOG_INDEX_PATTERN, metric='indexing',
+        filter_path='indices.*.primaries.indexing.index_total,indices.*.primaries.indexing.delete_total'
+    )
+    return {
+        name: str(entry['primaries']['indexing'].get('index_total', 0)
+                  + entry['primaries']['indexing'].get('delete_total', 0))
+        for name, entry in stats.get('indices', {}).items()
+    }
+
+
+def changed_tags(previous, current):
+    """
+    Tags des jours dont les index ont changé (créés, écrits ou supprimés)
+
+    "index:*" accompagne tout changement ; un index hors du schéma
+    journalier ne touche que ce tag.
+    """
+    tags = set()
+    for name in set(previous) | set(current):
+        if previous.get(name) == current.get(name):
+            continue
+        tags.add(ANY_DAY_TAG)
+        day = index_day(name)
+        if day is not None:
+            tags.add(f"{DAY_TAG_PREFIX}{day.strftime('%Y.%m.%d')}")
+    return tags
+
+
+class IndexWatcher:
+    """Thread comparant les compteurs d'écriture, un seul processus par période"""
+
+    def __init__(self, interval=INDEX_WATCH_SECONDS):
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        """Démarrer le thread de surveillance"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='index-watch', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"⚠️  Index watch failed: {e}")
+            time.sleep(self.interval)
+
+    def run_once(self):
+        """Invalider les jours écrits depuis le dernier passage (None si un autre processus s'en charge)"""
+        from app.services.database import get_elasticsearch
+        from app.services.redis_cache import bump_tags, get_redis_client
+
+        es = get_elasticsearch()
+        if es is None:
+            return None
+        redis_client = get_redis_client()
+        lock = redis_client.lock('lock:index-watch', timeout=self.interval, blocking=False)
+        if not lock.acquire():
+            return None
+        # Verrou conservé jusqu'à expiration : un passage par période
+        current = index_write_totals(es)
+        previous = redis_client.hgetall(WATCH_STATE_KEY)
+        # Premier passage : les écritures antérieures sont inconnues
+        tags = changed_tags(previous, current) if previous.pop(WATCH_MARKER, None) else {ANY_DAY_TAG}
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.delete(WATCH_STATE_KEY)
+        pipe.hset(WATCH_STATE_KEY, mapping=dict(current, **{WATCH_MARKER: '1'}))
+        pipe.execute()
+        if tags:
+            bump_tags(*sorted(tags))
+        return tags
+
+
+def init_index_watch(app):
+    """Démarrer la surveillance des écritures si activée"""
+    global _watcher
+    if os.getenv('INDEX_WATCH_ENABLED', 'True') != 'True':
+        return None
+    _watcher = IndexWatcher()
+    _watcher.start()
+    app.logger.info(f"👀 Écritures des index de logs surveillées toutes les {_watcher.interval:g}s")
+    return _watcher
@@ -0,0 +1,329 @@
+"""
+Worker d'ingestion des fichiers uploadés
+Lit les fichiers CSV/JSON en flux (Parquet/Arrow par lots de colonnes),
+applique par lots l'enrichissement du pipeline Logstash et indexe les
+documents dans Elasticsearch via parallel_bulk
+"""
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from elasticsearch import helpers
+
+from app.services.columnar_ingest import batch_frame, is_columnar, iter_record_batches
+from app.services.database import get_elasticsearch, get_mongodb
+from app.services.enrichment import enrich_frame, enrich_record, enrich_records, frame_json
+from app.services.index_planner import DAY_TAG_PREFIX, LOG_INDEX_PATTERN, LOG_INDEX_PREFIX
+from app.services.redis_cache import bump_tags
+from app.services.rollups import ROLLUPS_ENABLED, PendingRollups, RollupAccumulator
+
+logger = logging.getLogger(__name__)
+
+INGEST_THREADS = int(os.getenv('INGEST_THREADS', 4))
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 1000))
+# Progression et invalidation du cache au plus une fois par période
+# (comme STREAM_INVALIDATE_SECONDS) ; invalidation complète en fin de fichier
+INGEST_PROGRESS_SECONDS = float(os.getenv('INGEST_PROGRESS_SECONDS', 5))
+# Un fichier "processing" sans progression depuis ce délai est repris au démarrage
+INGEST_STALE_SECONDS = int(os.getenv('INGEST_STALE_SECONDS', 300))
+
+CSV_COLUMNS = ['timestamp', 'sensor_id', 'sensor_type', 'zone', 'value', 'unit', 'status', 'building_id']
+# Documents enrichis ensemble, en opérations colonnes (voir enrichment.py)
+INGEST_ENRICH_BATCH = int(os.getenv('INGEST_ENRICH_BATCH', 10000))
+
+_worker = None
+
+
+def index_name_for(record):
+    """Index journalier du document (même convention que Logstash)"""
+    return f"iot-logs-{record['@timestamp'][:10].replace('-', '.')}"
+
+
+def frame_index_names(frame):
+    """Index journaliers des documents d'un lot enrichi (DataFrame)"""
+    return ('iot-logs-' + frame['@timestamp'].str[:10].str.replace('-', '.')).tolist()
+
+
+def data_tags(record):
+    """Tags de cache touchés par un document indexé"""
+    tags = {f"{DAY_TAG_PREFIX}{index_name_for(record)[len('iot-logs-'):]}"}
+    for field in ('sensor_type', 'zone'):
+        if record.get(field):
+            tags.add(f"{field}:{record[field]}")
+    return tags
+
+
+def frame_data_tags(frame):
+    """Tags de cache touchés par un lot enrichi (DataFrame)"""
+    tags = {f"{DAY_TAG_PREFIX}{day.replace('-', '.')}" for day in frame['@timestamp'].str[:10].unique()}
+    for field in ('sensor_type', 'zone'):
+        if field in frame:
+            tags.update(f"{field}:{value}" for value in frame[field].dropna().unique() if value)
+    return tags
+
+
+def _iter_text_lines(handle, progress):
+    """Décoder les lignes d'un fichier binaire en comptant les octets lus"""
+    for number, raw in enumerate(handle):
+        progress['bytes'] += len(raw)
+        line = raw.decode('utf-8', errors='replace')
+        if number == 0:
+            line = line.lstrip('\ufeff')
+        yield line
+
+
+def iter_file_records(filepath, progress):
+    """Lire les enregistrements d'un fichier uploadé, en flux"""
+    extension = filepath.rsplit('.', 1)[-1].lower()
+    with open(filepath, 'rb') as handle:
+        lines = _iter_text_lines(handle, progress)
+        if extension == 'csv':
+            reader = csv.reader(lines)
+            header = next(reader, None)
+            if header is None:
+                return
+            header = [column.strip() for column in header]
+            if 'sensor_type' not in header:
+                # Fichier sans en-tête : colonnes du pipeline Logstash
+                yield dict(zip(CSV_COLUMNS, header))
+                header = CSV_COLUMNS
+            for row in reader:
+                if row:
+                    yield dict(zip(header, row))
+        else:
+            for line in lines:
+                line = line.strip()
+                if not line or line in ('[', ']'):
+                    continue
+                try:
+                    record = json.loads(line.rstrip(','))
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+
+
+def iter_batches(records, size):
+    """Regrouper un flux d'enregistrements en listes de taille fixe"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _pending_filter():
+    """Fichiers en attente ou dont le traitement a été interrompu"""
+    stale_before = datetime.now() - timedelta(seconds=INGEST_STALE_SECONDS)
+    return {
+        '$or': [
+            {'status': 'queued'},
+            {'status': 'processing', 'progress_updated_at': {'$lt': stale_before}}
+        ]
+    }
+
+
+class IngestionWorker:
+    """Worker d'arrière-plan indexant les fichiers uploadés un par un"""
+
+    def __init__(self, threads=INGEST_THREADS, chunk_size=INGEST_CHUNK_SIZE):
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.jobs = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Démarrer le thread de traitement"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='ingestion-worker', daemon=True)
+            self._thread.start()
+
+    def submit(self, file_id, filepath):
+        """Mettre un fichier en file d'attente d'ingestion"""
+        self.jobs.put((file_id, filepath))
+
+    def recover_pending(self):
+        """Remettre en file les fichiers non terminés (redémarrage)"""
+        mongo = get_mongodb()
+        if mongo is None:
+            return 0
+        pending = mongo.uploaded_files.find(_pending_filter(), {'filepath': 1})
+        count = 0
+        for file_doc in pending:
+            if file_doc.get('filepath'):
+                self.submit(file_doc['_id'], file_doc['filepath'])
+                count += 1
+        return count
+
+    def _run(self):
+        while True:
+            file_id, filepath = self.jobs.get()
+            try:
+                self.ingest_file(file_id, filepath)
+            except Exception as e:
+                logger.error(f"❌ Ingestion failed for {filepath}: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def _claim(self, mongo, file_id):
+        """Réserver le fichier pour ce processus (plusieurs workers gunicorn)"""
+        return mongo.uploaded_files.find_one_and_update(
+            dict(_pending_filter(), _id=file_id),
+            {'$set': {
+                'status': 'processing',
+                'progress': 0,
+                'progress_updated_at': datetime.now(),
+                'worker_pid': os.getpid()
+            }}
+        )
+
+    def _actions(self, file_id, filepath, progress, touched, touched_lock, rollups=None):
+        # Consommé par le thread de découpage de parallel_bulk
+        if is_columnar(filepath):
+            yield from self._columnar_actions(file_id, filepath, progress, touched, touched_lock, rollups)
+            return
+        line_number = 0
+        for batch in iter_batches(iter_file_records(filepath, progress), INGEST_ENRICH_BATCH):
+            for document in enrich_records(batch):
+                # Identifiant déterministe : une reprise ne crée pas de doublons
+                doc_id = f"{file_id}-{line_number}"
+                if rollups is not None:
+                    rollups.track(doc_id, document)
+                tags = data_tags(document)
+                if not tags <= touched:
+                    with touched_lock:
+                        touched.update(tags)
+                yield {'_index': index_name_for(document), '_id': doc_id, '_source': document}
+                line_number += 1
+
+    def _columnar_actions(self, file_id, filepath, progress, touched, touched_lock, rollups=None):
+        # Lots Parquet/Arrow enrichis et sérialisés en colonnes : le source
+        # JSON de chaque document est transmis tel quel à _bulk
+        line_number = 0
+        for batch in iter_record_batches(filepath, progress):
+            frame = enrich_frame(batch_frame(batch))
+            doc_ids = [f"{file_id}-{line_number + offset}" for offset in range(len(frame))]
+            if rollups is not None:
+                rollups.track_frame(doc_ids, frame)
+            tags = frame_data_tags(frame)
+            if not tags <= touched:
+                with touched_lock:
+                    touched.update(tags)
+            for doc_id, index, source in zip(doc_ids, frame_index_names(frame), frame_json(frame)):
+                yield {'_index': index, '_id': doc_id, '_source': source}
+            line_number += len(frame)
+
+    def ingest_file(self, file_id, filepath):
+        """Indexer un fichier et suivre la progression dans uploaded_files"""
+        es = get_elasticsearch()
+        mongo = get_mongodb()
+        if es is None or mongo is None:
+            raise RuntimeError('Elasticsearch or MongoDB unavailable')
+        if self._claim(mongo, file_id) is None:
+            return
+
+        total_bytes = max(os.path.getsize(filepath), 1)
+        progress = {'bytes': 0}
+        touched = set()
+        touched_lock = threading.Lock()
+        # Rollups fusionnés une seule fois, fichier terminé : une reprise
+        # après interruption ne les compte pas deux fois ; seuls les
+        # documents acceptés par Elasticsearch sont comptés
+        rollups = PendingRollups(RollupAccumulator()) if ROLLUPS_ENABLED else None
+        indexed = 0
+        failed = 0
+        started = time.time()
+        last_report = time.monotonic()
+
+        def report(status):
+            mongo.uploaded_files.update_one({'_id': file_id}, {'$set': {
+                'status': status,
+                'records_count': indexed,
+                'failed_count': failed,
+                'progress': round(min(progress['bytes'] / total_bytes, 1.0) * 100, 1),
+                'progress_updated_at': datetime.now()
+            }})
+            # Les tags déjà touchés sont ré-invalidés à chaque rapport, les
+            # documents en vol étant indexés après ce rapport
+            with touched_lock:
+                tags = sorted(touched)
+            if status == 'processing':
+                # En cours : jours et filtres touchés, données visibles au
+                # prochain refresh_interval des index
+                bump_tags('files', *tags)
+                return
+            # Fichier terminé : rendre les données visibles puis tout invalider
+            indices = [
+                f"{LOG_INDEX_PREFIX}{tag[len(DAY_TAG_PREFIX):]}" for tag in tags if tag.startswith(DAY_TAG_PREFIX)
+            ]
+            if indices:
+                try:
+                    target = ','.join(indices) if len(indices) <= 50 else LOG_INDEX_PATTERN
+                    es.indices.refresh(index=target, ignore_unavailable=True)
+                except Exception:
+                    pass
+            bump_tags('logs', 'files', *tags)
+
+        try:
+            for ok, item in helpers.parallel_bulk(
+                es,
+                self._actions(file_id, filepath, progress, touched, touched_lock, rollups),
+                thread_count=self.threads,
+                chunk_size=self.chunk_size,
+                raise_on_error=False,
+                raise_on_exception=False
+            ):
+                if ok:
+                    indexed += 1
+                else:
+                    failed += 1
+                if rollups is not None:
+                    rollups.done(item['index'].get('_id'), ok)
+                if time.monotonic() - last_report >= INGEST_PROGRESS_SECONDS:
+                    report('processing')
+                    last_report = time.monotonic()
+        except Exception as e:
+            report('failed')
+            mongo.uploaded_files.update_one({'_id': file_id}, {'$set': {'error': str(e)}})
+            raise
+
+        if rollups is not None:
+            try:
+                rollups.accumulator.flush(es)
+            except Exception as e:
+                logger.error(f"❌ Rollup update failed for {filepath} (rebuild needed): {e}")
+        report('processed')
+        mongo.uploaded_files.update_one({'_id': file_id}, {'$set': {
+            'processed_date': datetime.now(),
+            'processing_seconds': round(time.time() - started, 2)
+        }})
+        logger.info(f"✅ Ingested {indexed} records from {filepath} ({failed} failed)")
+
+
+def init_ingestion_worker(app):
+    """Démarrer le worker d'ingestion si activé"""
+    global _worker
+    if os.getenv('INGESTION_WORKER_ENABLED', 'True') != 'True':
+        return None
+    _worker = IngestionWorker()
+    _worker.start()
+    try:
+        recovered = _worker.recover_pending()
+        if recovered:
+            app.logger.info(f"🔁 {recovered} fichier(s) remis en file d'ingestion")
+    except Exception as e:
+        app.logger.error(f"❌ Erreur reprise ingestion: {e}")
+    return _worker
+
+
+def get_ingestion_worker():
+    """Obtenir le worker d'ingestion (None si désactivé)"""
+    return _worker
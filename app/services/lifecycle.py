@@ -0,0 +1,381 @@
+"""
+Cycle de vie des index de logs
+Les index journaliers iot-logs-YYYY.MM.dd passent de "hot" (jour courant,
+en écriture) à "warm" (jours clos : lecture seule, un segment par shard,
+shards réduits) puis sont archivés (snapshot) et supprimés au-delà de la
+rétention. Les mêmes règles sont exprimées en politique ILM (appliquée
+par Elasticsearch) et en plan exécutable par le script ou le job planifié
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.services.index_planner import LOG_INDEX_PREFIX, LOG_INDEX_PATTERN
+
+logger = logging.getLogger(__name__)
+
+LIFECYCLE_POLICY_NAME = 'iot-logs-policy'
+LOG_TEMPLATE_NAME = 'iot-logs-template'
+# Un jour est clos après ce délai (horloges des capteurs, uploads tardifs)
+LIFECYCLE_WARM_AFTER_DAYS = int(os.getenv('LIFECYCLE_WARM_AFTER_DAYS', 1))
+LIFECYCLE_RETENTION_DAYS = int(os.getenv('LIFECYCLE_RETENTION_DAYS', 90))
+LIFECYCLE_SHRINK_SHARDS = int(os.getenv('LIFECYCLE_SHRINK_SHARDS', 1))
+# Taille au-delà de laquelle un index journalier est signalé (voir lifecycle_policy)
+LIFECYCLE_MAX_INDEX_SIZE = int(os.getenv('LIFECYCLE_MAX_INDEX_SIZE', 30 * 1024 ** 3))
+# Taille maximale d'un shard primaire après réduction (nombre de shards cible)
+LIFECYCLE_MAX_SHARD_SIZE = int(os.getenv('LIFECYCLE_MAX_SHARD_SIZE', 50 * 1024 ** 3))
+# Dépôt de snapshots : si défini, les index expirés sont archivés avant suppression
+LIFECYCLE_SNAPSHOT_REPOSITORY = os.getenv('LIFECYCLE_SNAPSHOT_REPOSITORY', '')
+LIFECYCLE_INTERVAL_SECONDS = int(os.getenv('LIFECYCLE_INTERVAL_SECONDS', 3600))
+# Forcemerge, shrink et snapshot sont longs : délai large et aucune relance
+LIFECYCLE_REQUEST_TIMEOUT = int(os.getenv('LIFECYCLE_REQUEST_TIMEOUT', 3600))
+
+# Index réduit hors du motif iot-logs-* : il n'est visible (par l'alias du
+# nom d'origine) qu'une fois la source retirée, jamais en double
+SHRUNK_PREFIX = 'shrunk-'
+
+_job = None
+
+
+def lifecycle_policy(warm_after_days=None, retention_days=None, snapshot_policy=None):
+    """
+    Politique ILM équivalente au plan du script
+
+    Les index étant nommés par jour, le passage à un nouvel index (rollover
+    par âge) est fait par le nom ; l'âge des phases est calculé depuis la
+    date du nom (index.lifecycle.parse_origination_date), y compris pour
+    les données historiques importées. Il n'y a pas de rollover par taille :
+    les écritures visent directement l'index du jour (ingestion, Logstash),
+    sans alias d'écriture ; la taille borne les shards à la réduction
+    (max_primary_shard_size) et un jour trop gros est signalé par le rapport.
+    """
+    warm_after_days = LIFECYCLE_WARM_AFTER_DAYS if warm_after_days is None else warm_after_days
+    retention_days = LIFECYCLE_RETENTION_DAYS if retention_days is None else retention_days
+    delete_actions = {"delete": {}}
+    if snapshot_policy:
+        delete_actions = {"wait_for_snapshot": {"policy": snapshot_policy}, "delete": {}}
+    return {
+        "phases": {
+            "hot": {
+                "min_age": "0ms",
+                "actions": {"set_priority": {"priority": 100}}
+            },
+            "warm": {
+                "min_age": f"{warm_after_days + 1}d",
+                "actions": {
+                    "set_priority": {"priority": 50},
+                    "readonly": {},
+                    "shrink": {"max_primary_shard_size": f"{LIFECYCLE_MAX_SHARD_SIZE}b"},
+                    "forcemerge": {"max_num_segments": 1}
+                }
+            },
+            "delete": {
+                "min_age": f"{retention_days + 1}d",
+                "actions": delete_actions
+            }
+        }
+    }
+
+
+def install_lifecycle_policy(es, snapshot_policy=None):
+    """
+    Créer la politique ILM et l'associer au template et aux index existants
+
+    Returns:
+        int: nombre d'index existants rattachés à la politique
+    """
+    es.ilm.put_lifecycle(name=LIFECYCLE_POLICY_NAME, policy=lifecycle_policy(snapshot_policy=snapshot_policy))
+    lifecycle_settings = {
+        "index.lifecycle.name": LIFECYCLE_POLICY_NAME,
+        "index.lifecycle.parse_origination_date": True
+    }
+
+    templates = es.indices.get_index_template(name=LOG_TEMPLATE_NAME)['index_templates']
+    if templates:
+        template = {
+            key: value for key, value in templates[0]['index_template'].items()
+            if key in ('index_patterns', 'template', 'composed_of', 'priority', 'version', '_meta')
+        }
+        settings = template.setdefault('template', {}).setdefault('settings', {})
+        settings.setdefault('index', {}).update({
+            "lifecycle": {"name": LIFECYCLE_POLICY_NAME, "parse_origination_date": True}
+        })
+        es.indices.put_index_template(name=LOG_TEMPLATE_NAME, body=template)
+
+    indices = list(es.indices.get(index=LOG_INDEX_PATTERN, ignore_unavailable=True, allow_no_indices=True))
+    if indices:
+        es.indices.put_settings(index=LOG_INDEX_PATTERN, settings=lifecycle_settings)
+    return len(indices)
+
+
+def index_day(name):
+    """Jour d'un index journalier, réduit ou non (None si le nom ne suit pas le schéma)"""
+    if name.startswith(SHRUNK_PREFIX):
+        name = name[len(SHRUNK_PREFIX):]
+    if not name.startswith(LOG_INDEX_PREFIX):
+        return None
+    try:
+        return datetime.strptime(name[len(LOG_INDEX_PREFIX):len(LOG_INDEX_PREFIX) + 10], '%Y.%m.%d').date()
+    except ValueError:
+        return None
+
+
+def collect_index_stats(es):
+    """
+    État des index de logs : taille, documents, segments, shards et blocage
+
+    Un index réduit est listé sous son nom réel (shrunk-iot-logs-...),
+    atteint par l'alias du jour ; la source n'existe plus à ce stade.
+
+    Returns:
+        dict: nom d'index -> statistiques
+    """
+    stats = es.indices.stats(index=LOG_INDEX_PATTERN, metric='docs,store,segments')['indices']
+    settings = es.indices.get_settings(
+        index=LOG_INDEX_PATTERN,
+        name='index.number_of_shards,index.number_of_replicas,index.blocks.write,index.lifecycle.name',
+        flat_settings=True
+    )
+    indices = {}
+    for name, index_stats in stats.items():
+        primaries = index_stats['primaries']
+        index_settings = settings.get(name, {}).get('settings', {})
+        indices[name] = {
+            'day': index_day(name),
+            'docs': primaries['docs']['count'],
+            'size_bytes': index_stats['total']['store']['size_in_bytes'],
+            'primary_size_bytes': primaries['store']['size_in_bytes'],
+            'segments': primaries['segments']['count'],
+            'shards': int(index_settings.get('index.number_of_shards', 1)),
+            'replicas': int(index_settings.get('index.number_of_replicas', 0)),
+            'read_only': index_settings.get('index.blocks.write') == 'true',
+            'ilm_policy': index_settings.get('index.lifecycle.name')
+        }
+    return indices
+
+
+def measure_query_cost(es, name):
+    """Durée (ms) d'une agrégation type dashboard sur un index, sans cache de requête"""
+    result = es.search(
+        index=name,
+        body={
+            "size": 0,
+            "aggs": {
+                "by_status": {"terms": {"field": "status"}},
+                "value_stats": {"stats": {"field": "value"}}
+            }
+        },
+        request_cache=False
+    )
+    return result['took']
+
+
+def plan_lifecycle(indices, today=None, warm_after_days=None, retention_days=None):
+    """
+    Actions à appliquer à chaque index selon son âge
+
+    Les index rattachés à une politique ILM sont laissés à Elasticsearch.
+
+    Returns:
+        list: (nom d'index, phase, [actions]) ; actions parmi readonly,
+        shrink, forcemerge, snapshot, delete
+    """
+    today = today or datetime.now(timezone.utc).date()
+    warm_after_days = LIFECYCLE_WARM_AFTER_DAYS if warm_after_days is None else warm_after_days
+    retention_days = LIFECYCLE_RETENTION_DAYS if retention_days is None else retention_days
+
+    plan = []
+    for name, stats in sorted(indices.items()):
+        day = stats['day']
+        if day is None:
+            plan.append((name, 'unmanaged', []))
+            continue
+        if stats.get('ilm_policy'):
+            # Géré par Elasticsearch (install_lifecycle_policy)
+            plan.append((name, 'ilm', []))
+            continue
+        age = (today - day).days
+        if age > retention_days:
+            actions = ['snapshot', 'delete'] if LIFECYCLE_SNAPSHOT_REPOSITORY else ['delete']
+            plan.append((name, 'expired', actions))
+        elif age > warm_after_days:
+            actions = []
+            if not stats['read_only']:
+                actions.append('readonly')
+            target_shards = shrink_shard_count(stats)
+            if target_shards < stats['shards'] and not name.startswith(SHRUNK_PREFIX):
+                actions.append('shrink')
+            # Un segment par shard une fois l'index clos
+            if stats['segments'] > target_shards:
+                actions.append('forcemerge')
+            plan.append((name, 'warm', actions))
+        else:
+            plan.append((name, 'hot', []))
+    return plan
+
+
+def shrink_shard_count(stats):
+    """
+    Nombre de shards après réduction
+
+    Le plus petit diviseur du nombre de shards source, d'au moins
+    LIFECYCLE_SHRINK_SHARDS, gardant chaque shard primaire sous
+    LIFECYCLE_MAX_SHARD_SIZE (le nombre actuel si aucun ne convient).
+    """
+    shards = stats['shards']
+    for count in range(max(LIFECYCLE_SHRINK_SHARDS, 1), shards):
+        if shards % count == 0 and stats['primary_size_bytes'] <= count * LIFECYCLE_MAX_SHARD_SIZE:
+            return count
+    return shards
+
+
+def _shrink(es, name, stats):
+    """
+    Réduire le nombre de shards d'un index clos
+
+    L'index réduit (shrunk-<nom>) remplace la source sous un alias du même
+    nom : les noms d'index calculés par index_planner restent valides. En
+    cas d'échec, la source est libérée de son nœud et une cible incomplète
+    est supprimée (la source reste seule interrogée).
+    """
+    target = f"{SHRUNK_PREFIX}{name}"
+    # Toutes les copies primaires sur un même nœud
+    node = es.cat.shards(index=name, format='json', h='node,prirep')[0]['node']
+    es.indices.put_settings(index=name, settings={
+        "index.blocks.write": True,
+        "index.routing.allocation.require._name": node
+    })
+    try:
+        es.cluster.health(index=name, wait_for_no_relocating_shards=True, timeout='10m')
+        es.indices.shrink(
+            index=name,
+            target=target,
+            settings={
+                "index.number_of_shards": shrink_shard_count(stats),
+                "index.number_of_replicas": stats['replicas'],
+                "index.routing.allocation.require._name": None,
+                "index.blocks.write": True
+            },
+            wait_for_active_shards='all'
+        )
+        es.cluster.health(index=target, wait_for_status='green' if stats['replicas'] else 'yellow', timeout='10m')
+        es.indices.update_aliases(actions=[
+            {"remove_index": {"index": name}},
+            {"add": {"index": target, "alias": name}}
+        ])
+    except Exception:
+        es.indices.put_settings(index=name, settings={"index.routing.allocation.require._name": None})
+        es.indices.delete(index=target, ignore_unavailable=True)
+        raise
+    return target
+
+
+def apply_action(es, name, action, stats):
+    """Appliquer une action du plan à un index"""
+    if action == 'readonly':
+        es.indices.put_settings(index=name, settings={"index.blocks.write": True})
+    elif action == 'shrink':
+        return _shrink(es, name, stats)
+    elif action == 'forcemerge':
+        es.indices.forcemerge(index=name, max_num_segments=1, wait_for_completion=True)
+    elif action == 'snapshot':
+        es.snapshot.create(
+            repository=LIFECYCLE_SNAPSHOT_REPOSITORY,
+            snapshot=f"{name}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}",
+            indices=name,
+            include_global_state=False,
+            wait_for_completion=True
+        )
+    elif action == 'delete':
+        es.indices.delete(index=name)
+    else:
+        raise ValueError(f"Unknown lifecycle action: {action}")
+    return name
+
+
+def run_lifecycle(es, dry_run=True, today=None, measure=False, warm_after_days=None, retention_days=None):
+    """
+    Calculer et (hors dry-run) appliquer le plan de cycle de vie
+
+    Un index dont une action échoue n'en reçoit pas d'autre (pas de
+    suppression sans snapshot réussi).
+
+    Returns:
+        list: rapport par index (statistiques, phase, actions, erreur éventuelle)
+    """
+    indices = collect_index_stats(es)
+    report = []
+    for name, phase, actions in plan_lifecycle(indices, today, warm_after_days, retention_days):
+        stats = indices[name]
+        entry = dict(stats, index=name, phase=phase, actions=actions, done=[], error=None)
+        entry['oversized'] = stats['primary_size_bytes'] > LIFECYCLE_MAX_INDEX_SIZE
+        if measure:
+            entry['query_ms'] = measure_query_cost(es, name)
+        if not dry_run:
+            current = name
+            for action in actions:
+                try:
+                    current = apply_action(es, current, action, stats)
+                except Exception as e:
+                    entry['error'] = f"{action}: {e}"
+                    logger.warning(f"⚠️  Lifecycle {action} failed on {current}: {e}")
+                    break
+                entry['done'].append(action)
+        report.append(entry)
+    return report
+
+
+class LifecycleJob:
+    """Thread appliquant périodiquement le plan, un seul processus à la fois"""
+
+    def __init__(self, interval=LIFECYCLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        """Démarrer le thread de cycle de vie"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='index-lifecycle', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"⚠️  Index lifecycle run failed: {e}")
+            time.sleep(self.interval)
+
+    def run_once(self):
+        """Appliquer le plan si aucun autre processus ne s'en charge"""
+        from app.services.database import get_elasticsearch
+        from app.services.redis_cache import get_redis_client
+
+        lock = get_redis_client().lock('lock:index-lifecycle', timeout=self.interval, blocking=False)
+        if not lock.acquire():
+            return None
+        es = get_elasticsearch()
+        if es is None:
+            return None
+        # Verrou conservé jusqu'à expiration : une exécution par période
+        report = run_lifecycle(
+            es.options(request_timeout=LIFECYCLE_REQUEST_TIMEOUT, max_retries=0, retry_on_timeout=False),
+            dry_run=False
+        )
+        done = sum(len(entry['done']) for entry in report)
+        if done:
+            logger.info(f"🗂️  Index lifecycle: {done} action(s) applied")
+        return report
+
+
+def init_lifecycle_job(app):
+    """Démarrer le job de cycle de vie des index si activé"""
+    global _job
+    if os.getenv('LIFECYCLE_ENABLED', 'False') != 'True':
+        return None
+    _job = LifecycleJob()
+    _job.start()
+    app.logger.info(f"🗂️  Cycle de vie des index toutes les {_job.interval}s")
+    return _job
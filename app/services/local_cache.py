@@ -0,0 +1,164 @@
+"""
+In-process L1 cache
+Size- and TTL-bounded LRU holding serialized route responses in front of
+Redis, kept coherent across processes through Redis pub/sub invalidations
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from app.services.database import create_redis_subscriber
+
+logger = logging.getLogger(__name__)
+
+L1_ENABLED = os.getenv('CACHE_L1_ENABLED', 'False') == 'True'
+L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000))
+L1_MAX_BYTES = int(os.getenv('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024))
+# Borne la durée d'un éventuel message d'invalidation manqué
+L1_MAX_TTL = int(os.getenv('CACHE_L1_TTL', 60))
+
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+
+class LocalCache:
+    """Thread-safe LRU cache bounded by entry count, total bytes and TTL"""
+
+    def __init__(self, max_entries=L1_MAX_ENTRIES, max_bytes=L1_MAX_BYTES, max_ttl=L1_MAX_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry['value']
+
+    def set(self, key, value, size, ttl, tags=()):
+        """Store a value of the given size in bytes, evicting least recently used entries"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'value': value,
+                'size': size,
+                'tags': frozenset(tags),
+                'expires_at': time.monotonic() + min(ttl, self.max_ttl)
+            }
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        """Drop every entry depending on one of the tags"""
+        tags = set(tags)
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry['tags'] & tags]:
+                self._remove(key)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Current size of the cache"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
+
+
+class TierCounters:
+    """Per-process hit/miss counters for the L1 and L2 cache tiers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0,
+            'stale_hits': 0, 'coalesced_waits': 0, 'recomputes': 0
+        }
+
+    def incr(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        l1_total = counts['l1_hits'] + counts['l1_misses']
+        l2_total = counts['l2_hits'] + counts['l2_misses']
+        counts['l1_hit_ratio'] = round(counts['l1_hits'] / l1_total, 4) if l1_total else 0
+        counts['l2_hit_ratio'] = round(counts['l2_hits'] / l2_total, 4) if l2_total else 0
+        counts['pid'] = os.getpid()
+        return counts
+
+
+local_cache = LocalCache()
+tier_counters = TierCounters()
+_subscriber_pid = None
+_subscriber_lock = threading.Lock()
+
+
+def _listen():
+    """Apply invalidation messages to the local cache, reconnecting on errors"""
+    while True:
+        pubsub = None
+        try:
+            # Own connection without a read timeout: the channel is often idle
+            pubsub = create_redis_subscriber().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while disconnected
+            local_cache.clear()
+            for message in pubsub.listen():
+                try:
+                    payload = json.loads(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                if payload.get('clear'):
+                    local_cache.clear()
+                elif payload.get('tags'):
+                    local_cache.invalidate_tags(payload['tags'])
+        except redis.RedisError as e:
+            logger.warning(f"⚠️  L1 cache invalidation listener error: {e}")
+            local_cache.clear()
+            if pubsub is not None:
+                pubsub.connection_pool.disconnect()
+            time.sleep(1)
+
+
+def ensure_subscriber():
+    """Start the invalidation listener of the current process (once per process)"""
+    global _subscriber_pid
+    if _subscriber_pid == os.getpid():
+        return
+    with _subscriber_lock:
+        if _subscriber_pid != os.getpid():
+            # Un processus forké doit repartir d'un cache vide
+            local_cache.clear()
+            threading.Thread(target=_listen, name='l1-cache-invalidation', daemon=True).start()
+            _subscriber_pid = os.getpid()
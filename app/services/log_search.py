@@ -0,0 +1,405 @@
+"""
+Recherche dans les logs
+Construction des requêtes de filtrage, pagination par offset pour les
+premières pages et pagination par curseur (point-in-time + search_after)
+pour les pages profondes et les exports
+"""
+import base64
+import json
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Au-delà de cette fenêtre, Elasticsearch refuse la pagination par offset
+MAX_RESULT_WINDOW = int(os.getenv('ES_MAX_RESULT_WINDOW', 10000))
+PIT_KEEP_ALIVE = os.getenv('ES_PIT_KEEP_ALIVE', '5m')
+
+# Tri stable : horodatage puis départage implicite du point-in-time
+CURSOR_SORT = [
+    {"@timestamp": {"order": "desc"}},
+    {"_shard_doc": "desc"}
+]
+
+
+# Facettes de la page de recherche : clé de réponse -> (paramètre, champ)
+# Le niveau d'alerte filtre sur "status" (voir build_search_query)
+SEARCH_FACETS = {
+    'sensor_types': ('sensor_type', 'sensor_type'),
+    'zones': ('zone', 'zone'),
+    'alert_levels': ('alert_level', 'status')
+}
+FACET_SIZE = 100
+
+
+# Projection par défaut des listes de logs (champs affichés par l'interface)
+LOG_LIST_FIELDS = [
+    '@timestamp', 'timestamp', 'sensor_id', 'sensor_type', 'zone', 'value',
+    'unit', 'status', 'alert_level', 'alert_message', 'building_id'
+]
+FIELD_NAME_PATTERN = re.compile(r'^[\w@.*-]+$')
+DATE_FIELDS = {'@timestamp', 'ingestion_timestamp'}
+
+
+class InvalidCursorError(ValueError):
+    """Curseur de pagination illisible"""
+
+
+class InvalidProjectionError(ValueError):
+    """Paramètre fields invalide"""
+
+
+class InvalidHandleError(ValueError):
+    """Référence de document invalide"""
+
+
+LOG_INDEX_PREFIX = 'iot-logs-'
+MGET_MAX_DOCS = int(os.getenv('MGET_MAX_DOCS', 1000))
+
+
+def build_search_query(params):
+    """Construire la requête Elasticsearch à partir des filtres de recherche"""
+    must_conditions = []
+    
+    # Recherche textuelle
+    query_text = params.get('q', '')
+    if query_text:
+        must_conditions.append({
+            "multi_match": {
+                "query": query_text,
+                "fields": ["sensor_id", "zone", "sensor_type", "alert_message"]
+            }
+        })
+    
+    # Filtres
+    if params.get('sensor_type'):
+        must_conditions.append({"term": {"sensor_type": params['sensor_type']}})
+    
+    if params.get('zone'):
+        must_conditions.append({"term": {"zone": params['zone']}})
+    
+    if params.get('alert_level'):
+        must_conditions.append({"term": {"status": params['alert_level']}})
+    
+    # Filtre de date
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    if date_from or date_to:
+        date_range = {}
+        if date_from:
+            date_range["gte"] = date_from
+        if date_to:
+            date_range["lte"] = date_to
+        
+        must_conditions.append({
+            "range": {"@timestamp": date_range}
+        })
+    
+    return {
+        "bool": {
+            "must": must_conditions if must_conditions else [{"match_all": {}}]
+        }
+    }
+
+
+def build_facets_query(params):
+    """
+    Construire une requête unique calculant toutes les facettes de recherche
+
+    Le texte et la période restreignent toutes les facettes ; chaque facette
+    est en plus filtrée par la sélection des autres facettes, mais pas par
+    la sienne, afin de garder visibles les valeurs alternatives.
+    """
+    base = {key: value for key, value in params.items() if key in ('q', 'date_from', 'date_to')}
+    selections = {
+        name: {"term": {field: params[param]}}
+        for name, (param, field) in SEARCH_FACETS.items()
+        if params.get(param)
+    }
+
+    aggs = {}
+    for name, (_, field) in SEARCH_FACETS.items():
+        others = [clause for other, clause in selections.items() if other != name]
+        aggs[name] = {
+            "filter": {"bool": {"filter": others}} if others else {"match_all": {}},
+            "aggs": {"values": {"terms": {"field": field, "size": FACET_SIZE}}}
+        }
+
+    return {
+        "query": build_search_query(base),
+        "size": 0,
+        "track_total_hits": False,
+        "aggs": aggs
+    }
+
+
+def parse_facets(result, counts=False):
+    """Extraire les valeurs (et éventuellement les effectifs) de chaque facette"""
+    facets = {}
+    for name in SEARCH_FACETS:
+        buckets = result['aggregations'][name]['values']['buckets']
+        if counts:
+            facets[name] = [{'value': b['key'], 'count': b['doc_count']} for b in buckets]
+        else:
+            facets[name] = [b['key'] for b in buckets]
+    return facets
+
+
+def parse_projection(value, default=None):
+    """
+    Lire le paramètre fields= d'une requête
+
+    "a,b" garde uniquement ces champs, "-a,-b" les retire, "*" renvoie le
+    document complet ; sans paramètre, la projection par défaut s'applique.
+
+    Returns:
+        dict ou None: {'includes': [...]} ou {'excludes': [...]} (None = _source complet)
+    """
+    if value is None or value == '':
+        return {'includes': list(default)} if default else None
+    if value == '*':
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    excluded = [field[1:] for field in fields if field.startswith('-')]
+    included = [field for field in fields if not field.startswith('-')]
+    if (excluded and included) or not fields:
+        raise InvalidProjectionError('fields must list fields to include or, prefixed with -, to exclude')
+    for field in excluded + included:
+        if not FIELD_NAME_PATTERN.match(field):
+            raise InvalidProjectionError(f'Invalid field name: {field}')
+    return {'excludes': excluded} if excluded else {'includes': included}
+
+
+def apply_projection(body, projection, docvalues=False):
+    """
+    Appliquer une projection à une requête de recherche
+
+    Avec docvalues, les champs inclus sont lus dans les doc values (champs
+    keyword, numériques et dates) sans charger _source.
+    """
+    if projection is None:
+        return body
+    if docvalues and projection.get('includes'):
+        body['_source'] = False
+        body['docvalue_fields'] = [
+            {"field": field, "format": "strict_date_optional_time"} if field in DATE_FIELDS else field
+            for field in projection['includes']
+        ]
+    else:
+        body['_source'] = projection
+    return body
+
+
+def projected_fields(projection, fallback):
+    """Liste des champs renvoyés par une projection, parmi fallback à défaut d'inclusions"""
+    if projection and projection.get('includes'):
+        return projection['includes']
+    if projection and projection.get('excludes'):
+        return [field for field in fallback if field not in projection['excludes']]
+    return fallback
+
+
+def hit_document(hit):
+    """Document d'un hit, qu'il vienne de _source ou des doc values"""
+    if '_source' in hit:
+        return hit['_source']
+    return {
+        field: values[0] if len(values) == 1 else values
+        for field, values in hit.get('fields', {}).items()
+    }
+
+
+def doc_handle(hit):
+    """Référence directe "index:id" d'un document"""
+    return f"{hit['_index']}:{hit['_id']}"
+
+
+def parse_handle(handle):
+    """
+    Décomposer une référence "index:id" (ou un identifiant seul)
+
+    Returns:
+        tuple: (index ou None, id)
+    """
+    if not isinstance(handle, str) or not handle:
+        raise InvalidHandleError('Invalid log id')
+    index, separator, doc_id = handle.partition(':')
+    if not separator:
+        return None, handle
+    if not index.startswith(LOG_INDEX_PREFIX) or not doc_id:
+        raise InvalidHandleError(f'Invalid log id: {handle}')
+    return index, doc_id
+
+
+def source_params(projection):
+    """Paramètres _source d'un get/mget correspondant à une projection"""
+    if projection is None:
+        return {}
+    if projection.get('includes'):
+        return {'source_includes': projection['includes']}
+    return {'source_excludes': projection['excludes']}
+
+
+def fetch_documents(es, handles, projection=None):
+    """
+    Lire des documents par référence
+
+    Les références "index:id" sont lues par un seul multi-get (lecture
+    directe, temps réel, un shard par document) ; les identifiants seuls,
+    dont l'index est inconnu, par une recherche ids groupée.
+
+    Returns:
+        dict: référence -> document (_source), absent si introuvable
+    """
+    parsed = {handle: parse_handle(handle) for handle in handles}
+    documents = {}
+
+    direct = [(handle, index, doc_id) for handle, (index, doc_id) in parsed.items() if index]
+    if direct:
+        result = es.mget(
+            docs=[{'_index': index, '_id': doc_id} for _, index, doc_id in direct],
+            **source_params(projection)
+        )
+        for (handle, _, _), doc in zip(direct, result['docs']):
+            if doc.get('found'):
+                documents[handle] = doc.get('_source', {})
+
+    bare = [doc_id for handle, (index, doc_id) in parsed.items() if not index]
+    if bare:
+        body = {"query": {"ids": {"values": bare}}, "size": len(bare)}
+        apply_projection(body, projection)
+        result = es.search(index=f"{LOG_INDEX_PREFIX}*", body=body)
+        for hit in result['hits']['hits']:
+            documents.setdefault(hit['_id'], hit['_source'])
+
+    return documents
+
+
+def encode_cursor(pit_id, search_after):
+    """Encoder l'état de pagination en jeton opaque"""
+    payload = json.dumps({'pit': pit_id, 'after': search_after}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Décoder un jeton de pagination"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not state.get('pit') or not isinstance(state.get('after'), list):
+            raise InvalidCursorError('Invalid cursor')
+        return state
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidCursorError('Invalid cursor') from e
+
+
+def offset_window_exceeded(page, per_page):
+    """Vérifier si une page par offset dépasse index.max_result_window"""
+    return page * per_page > MAX_RESULT_WINDOW
+
+
+def close_point_in_time(es, pit_id):
+    """Fermer un point-in-time (best effort)"""
+    try:
+        es.close_point_in_time(id=pit_id)
+    except Exception:
+        pass
+
+
+def cursor_search(es, index, query, per_page, cursor=None, source=None, docvalues=False):
+    """
+    Exécuter une page de recherche par curseur
+
+    Sans curseur, ouvre un point-in-time et renvoie la première page avec le
+    total. Avec un curseur, reprend après le dernier document de la page
+    précédente : le coût par page reste constant quelle que soit la profondeur.
+    source est une liste de champs ou une projection (voir parse_projection).
+
+    Returns:
+        tuple: (résultat Elasticsearch, next_cursor ou None)
+    """
+    if cursor:
+        state = decode_cursor(cursor)
+        pit_id = state['pit']
+        search_after = state['after']
+    else:
+        pit_id = es.open_point_in_time(
+            index=index, keep_alive=PIT_KEEP_ALIVE, ignore_unavailable=True
+        )['id']
+        search_after = None
+
+    body = {
+        "query": query,
+        "size": per_page,
+        "sort": CURSOR_SORT,
+        "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+        # Le total n'est compté que sur la première page
+        "track_total_hits": search_after is None
+    }
+    if search_after is not None:
+        body["search_after"] = search_after
+    if isinstance(source, dict):
+        apply_projection(body, source, docvalues)
+    elif source is not None:
+        body["_source"] = source
+
+    result = es.search(body=body)
+    hits = result['hits']['hits']
+    pit_id = result.get('pit_id', pit_id)
+
+    if len(hits) == per_page:
+        return result, encode_cursor(pit_id, hits[-1]['sort'])
+
+    close_point_in_time(es, pit_id)
+    return result, None
+
+
+def iter_export_pages(es, index, query, batch_size=1000, slices=1, source=None):
+    """
+    Parcourir tous les documents correspondant à une requête, page par page
+
+    Un seul point-in-time est ouvert puis découpé en tranches (sliced PIT),
+    parcourues en parallèle avec search_after : une requête en cours par
+    tranche, la page suivante est demandée avant de rendre la page reçue.
+    Les pages arrivent dans l'ordre de réception (pas de tri global entre
+    tranches). Seules les pages en cours sont en mémoire ; le
+    point-in-time est fermé dès que le parcours s'arrête.
+
+    Yields:
+        list: hits Elasticsearch d'une page
+    """
+    pit = {'id': es.open_point_in_time(
+        index=index, keep_alive=PIT_KEEP_ALIVE, ignore_unavailable=True
+    )['id']}
+
+    def fetch(slice_id, search_after):
+        body = {
+            "query": query,
+            "size": batch_size,
+            "sort": CURSOR_SORT,
+            "pit": {"id": pit['id'], "keep_alive": PIT_KEEP_ALIVE},
+            "track_total_hits": False
+        }
+        if slices > 1:
+            body["slice"] = {"id": slice_id, "max": slices}
+        if search_after is not None:
+            body["search_after"] = search_after
+        if source is not None:
+            body["_source"] = source
+        return slice_id, es.search(body=body)
+
+    executor = ThreadPoolExecutor(max_workers=slices, thread_name_prefix='export-slice')
+    pending = {executor.submit(fetch, slice_id, None) for slice_id in range(slices)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                slice_id, result = future.result()
+                pit['id'] = result.get('pit_id', pit['id'])
+                hits = result['hits']['hits']
+                if len(hits) == batch_size:
+                    pending.add(executor.submit(fetch, slice_id, hits[-1]['sort']))
+                if hits:
+                    yield hits
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        close_point_in_time(es, pit['id'])
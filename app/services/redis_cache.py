@@ -3,24 +3,100 @@ Redis Caching Utility
 Provides decorators and functions for caching with Redis
 """
 import redis
+import hashlib
 import json
+import math
+import random
+import time
 from functools import wraps
-from flask import request
+from flask import request, current_app
 from datetime import datetime, timedelta
 import os
+from app.services.database import get_redis, get_redis_binary, get_redis_pool_stats
+from app.services.index_planner import day_tags, ANY_DAY_TAG
+from app.services.local_cache import (
+    L1_ENABLED, INVALIDATION_CHANNEL, local_cache, tier_counters, ensure_subscriber
+)
 
 def get_redis_client():
-    """Get Redis client instance"""
-    redis_host = os.getenv('REDIS_HOST', 'redis')
-    redis_port = int(os.getenv('REDIS_PORT', 6379))
-    redis_db = int(os.getenv('REDIS_DB', 0))
-    
-    return redis.Redis(
-        host=redis_host,
-        port=redis_port,
-        db=redis_db,
-        decode_responses=True
-    )
+    """Get the shared Redis client (backed by the process-wide connection pool)"""
+    return get_redis()
+
+
+def get_binary_redis_client():
+    """Get the Redis client for route entries (responses not decoded: bodies stay bytes)"""
+    return get_redis_binary()
+
+
+CACHE_NAMESPACES = ('cache', 'route')
+KEY_INDEX_PREFIX = 'cacheidx:'
+SCAN_BATCH_SIZE = int(os.getenv('CACHE_SCAN_BATCH_SIZE', 500))
+
+
+def _namespace_of(key):
+    """Cache namespace of a key ("cache" or "route"), if any"""
+    namespace = key.split(':', 1)[0]
+    return namespace if namespace in CACHE_NAMESPACES else None
+
+
+def _track_key(pipe, key, ttl):
+    """
+    Record a cached key in its namespace index
+
+    The index is a sorted set scored by expiry time, so live keys can be
+    counted without walking the keyspace and a namespace can be cleared
+    in batches.
+    """
+    namespace = _namespace_of(key)
+    if namespace:
+        now = datetime.now().timestamp()
+        index_key = f"{KEY_INDEX_PREFIX}{namespace}"
+        pipe.zadd(index_key, {key: now + ttl})
+        pipe.zremrangebyscore(index_key, '-inf', now)
+
+
+def _untrack_keys(pipe, keys):
+    """Remove keys from their namespace index"""
+    by_namespace = {}
+    for key in keys:
+        namespace = _namespace_of(key)
+        if namespace:
+            by_namespace.setdefault(namespace, []).append(key)
+    for namespace, namespace_keys in by_namespace.items():
+        pipe.zrem(f"{KEY_INDEX_PREFIX}{namespace}", *namespace_keys)
+
+
+def _unlink_batch(redis_client, keys):
+    """Unlink a batch of keys and drop them from the namespace indexes"""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.unlink(*keys)
+    _untrack_keys(pipe, keys)
+    return pipe.execute()[0]
+
+
+def _clear_namespace(redis_client, namespace):
+    """Clear a whole namespace incrementally, batch by batch, from its index"""
+    index_key = f"{KEY_INDEX_PREFIX}{namespace}"
+    deleted = 0
+    while True:
+        keys = redis_client.zrange(index_key, 0, SCAN_BATCH_SIZE - 1)
+        if not keys:
+            return deleted
+        deleted += _unlink_batch(redis_client, keys)
+
+
+def _clear_matching(redis_client, pattern):
+    """Clear keys matching a pattern with SCAN + UNLINK, batch by batch"""
+    deleted = 0
+    batch = []
+    for key in redis_client.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= SCAN_BATCH_SIZE:
+            deleted += _unlink_batch(redis_client, batch)
+            batch = []
+    if batch:
+        deleted += _unlink_batch(redis_client, batch)
+    return deleted
 
 
 def cache_key(*args, **kwargs):
@@ -51,6 +127,7 @@ def cached(ttl=300):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            computed = False
             try:
                 redis_client = get_redis_client()
                 
@@ -67,47 +144,236 @@ def cached(ttl=300):
                 
                 # Call the function
                 result = f(*args, **kwargs)
+                computed = True
                 
                 # Store in cache
                 try:
-                    redis_client.setex(
-                        key,
-                        ttl,
-                        json.dumps(result, default=str)
-                    )
+                    value = json.dumps(result, default=str)
                 except (TypeError, ValueError):
                     # If JSON serialization fails, store as string
-                    redis_client.setex(key, ttl, str(result))
+                    value = str(result)
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.setex(key, ttl, value)
+                _track_key(pipe, key, ttl)
+                pipe.execute()
                 
                 return result
                 
-            except redis.ConnectionError:
-                # If Redis is down, just call the function
-                return f(*args, **kwargs)
+            except redis.RedisError:
+                # If Redis is down, serve the result already computed or call the function
+                return result if computed else f(*args, **kwargs)
         
         return decorated_function
     return decorator
 
 
-def cached_route(ttl=300):
+TAG_VERSION_PREFIX = 'tagver:'
+ENTRY_VERSION_PREFIX = 'tv:'
+
+
+def bump_tags(*tags):
+    """
+    Invalidate every cached entry depending on the given tags
+
+    Each tag carries a version counter; cached entries remember the versions
+    they were computed with and are ignored once a counter has moved on.
+    Nothing is deleted, stale entries simply expire.
+
+    Args:
+        tags (str): Tag names (e.g. "logs", "files", "zone:zone_a")
+    """
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return
+    try:
+        pipe = get_redis_client().pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(f"{TAG_VERSION_PREFIX}{tag}")
+        # Keep the in-process L1 caches of every worker coherent
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps({'tags': tags}))
+        pipe.execute()
+    except redis.RedisError:
+        pass
+    local_cache.invalidate_tags(tags)
+
+
+def request_tags(*params, base='logs', dates=('date_from', 'date_to')):
+    """
+    Build a cache tag resolver from request filters
+
+    Returns a callable giving one "<param>:<value>" tag per filter present
+    in the query string, or the base tag when the request is unfiltered.
+    Writes are also tracked per day: a request bounded by the `dates`
+    parameters depends on the "index:<day>" tags of its days only, any other
+    request on "index:*" (bumped by the index watcher for writes made outside
+    the application, see index_watch.py).
+
+    Usage:
+        @cached_route(ttl=3600, tags=request_tags('sensor_type', 'zone'))
+    """
+    def resolve():
+        tags = [
+            f"{param}:{request.args[param]}"
+            for param in params if request.args.get(param)
+        ]
+        days = day_tags(*(request.args.get(param) for param in dates)) if dates else None
+        if days is not None:
+            return tags + days
+        return (tags or [base]) + [ANY_DAY_TAG]
+    return resolve
+
+
+def _read_tagged_entry(redis_client, key, tags):
+    """
+    Read a cached entry and the current versions of its tags in one round trip
+
+    Expects the binary client: the body is returned as the stored bytes,
+    the other fields (etag, freshness, tag versions) are decoded.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(key)
+    if tags:
+        pipe.mget([f"{TAG_VERSION_PREFIX}{tag}" for tag in tags])
+    results = pipe.execute()
+
+    entry = {
+        field.decode(): value if field == b'body' else value.decode()
+        for field, value in results[0].items()
+    }
+    versions = {}
+    if tags:
+        versions = {tag: (version or b'0').decode() for tag, version in zip(tags, results[1])}
+
+    if entry and all(
+        entry.get(f"{ENTRY_VERSION_PREFIX}{tag}") == version
+        for tag, version in versions.items()
+    ):
+        return entry, versions
+    return None, versions
+
+
+def _write_tagged_entry(redis_client, key, body, etag, ttl, versions, fresh_until=None, delta=None):
+    """Store a cached entry stamped with the tag versions it was computed from"""
+    mapping = {'body': body, 'etag': etag}
+    if fresh_until is not None:
+        mapping['fresh_until'] = fresh_until
+        mapping['delta'] = delta
+    for tag, version in versions.items():
+        mapping[f"{ENTRY_VERSION_PREFIX}{tag}"] = version
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.delete(key)
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, ttl)
+    _track_key(pipe, key, ttl)
+    pipe.execute()
+
+
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', 30))
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+XFETCH_BETA = float(os.getenv('CACHE_XFETCH_BETA', 1.0))
+
+
+def _is_fresh(entry):
+    """
+    Check whether an entry can be served without refreshing it
+
+    Probabilistic early expiration (XFetch): the closer the entry is to its
+    freshness deadline and the longer it took to compute, the more likely
+    a reader is elected to refresh it ahead of time.
+    """
+    if 'fresh_until' not in entry:
+        return True
+    delta = float(entry.get('delta') or 0)
+    early = delta * XFETCH_BETA * -math.log(1.0 - random.random())
+    return time.time() + early < float(entry['fresh_until'])
+
+
+def _try_lock(redis_client, key):
+    """Take the recompute lock of a cache entry without blocking"""
+    lock = redis_client.lock(f"lock:{key}", timeout=SINGLE_FLIGHT_LOCK_TIMEOUT, blocking=False)
+    return lock if lock.acquire() else None
+
+
+def _release_lock(lock):
+    # Expired lock (LockError) or Redis gone: it expires on its own
+    try:
+        lock.release()
+    except redis.RedisError:
+        pass
+
+
+def _wait_for_entry(redis_client, key, tags):
+    """Wait for the lock holder to publish the entry being recomputed"""
+    deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        entry, versions = _read_tagged_entry(redis_client, key, tags)
+        if entry and entry.get('etag'):
+            return entry, versions
+        if not redis_client.exists(f"lock:{key}"):
+            break
+    return None, None
+
+
+def content_etag(body):
+    """Strong ETag derived from the encoded response body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _serve_entry(key, entry, ttl, tags):
+    """Serve an entry read from Redis, copying it into the L1 cache"""
+    body = entry['body']
+    if L1_ENABLED:
+        local_cache.set(key, (body, entry['etag']), len(body), ttl, tags)
+    return _cached_response(body, entry['etag'])
+
+
+def _cached_response(body, etag):
+    """Serve pre-encoded JSON bytes, or 304 when the client already has them"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+
+def cached_route(ttl=300, unless=None, tags=None, single_flight=False, stale_ttl=300, variant=None):
     """
     Decorator to cache Flask route responses
     
-    Only caches GET requests with status 200
+    Only caches GET requests with status 200 and a JSON body
     Includes request parameters and user info in cache key
     
+    Responses are stored and served as the encoded bytes produced by the
+    view, with a content hash as strong ETag; a matching If-None-Match
+    gets a 304 without body.
+    
     Args:
         ttl (int): Time to live in seconds (default: 5 minutes)
+        unless (callable): Skip the cache when it returns True for the current request
+        tags (list or callable): Tags the response depends on; bumping one of
+            them with bump_tags() invalidates the entry before its TTL
+        single_flight (bool): Recompute misses in one worker at a time (Redis
+            lock); the others wait for its result or are served the stale entry,
+            and entries are refreshed probabilistically before they expire
+        stale_ttl (int): With single_flight, how long past its TTL an entry may
+            still be served while it is being recomputed
+        variant (callable): Returns a string added to the cache key when the
+            response also depends on request headers (content negotiation);
+            responses then carry "Vary: Accept" for shared caches
     """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            lock = None
+            response = None
             try:
                 # Only cache GET requests
-                if request.method != 'GET':
+                if request.method != 'GET' or (unless is not None and unless()):
                     return f(*args, **kwargs)
                 
-                redis_client = get_redis_client()
+                redis_client = get_binary_redis_client()
                 
                 # Generate cache key including query params and user
                 from flask_login import current_user
@@ -117,66 +383,91 @@ def cached_route(ttl=300):
                     f.__name__,
                     request.path,
                     request.query_string.decode(),
-                    user_id
+                    user_id,
+                    variant() if variant is not None else None
                 ]
                 cache_key_str = f"route:{':'.join(str(p) for p in key_parts if p)}"
+                entry_tags = tags() if callable(tags) else list(tags or [])
                 
-                # Try to get from cache
-                cached_value = redis_client.get(cache_key_str)
-                if cached_value:
-                    from flask import jsonify
-                    try:
-                        # Return as proper JSON response
-                        data = json.loads(cached_value)
-                        return jsonify(data), 200
-                    except json.JSONDecodeError:
-                        return cached_value, 200
+                # L1: serialized response held by this process
+                if L1_ENABLED:
+                    ensure_subscriber()
+                    cached_value = local_cache.get(cache_key_str)
+                    if cached_value is not None:
+                        tier_counters.incr('l1_hits')
+                        return _cached_response(*cached_value)
+                    tier_counters.incr('l1_misses')
+                
+                # Try to get from cache (skipping entries whose tags have moved on)
+                entry, versions = _read_tagged_entry(redis_client, cache_key_str, entry_tags)
+                if entry and not entry.get('etag'):
+                    entry = None
+                tier_counters.incr('l2_hits' if entry else 'l2_misses')
+                
+                if entry:
+                    if not single_flight or _is_fresh(entry):
+                        return _serve_entry(cache_key_str, entry, ttl, entry_tags)
+                    # Expiring entry: one worker refreshes it, the others get it stale
+                    lock = _try_lock(redis_client, cache_key_str)
+                    if lock is None:
+                        tier_counters.incr('stale_hits')
+                        return _serve_entry(cache_key_str, entry, ttl, entry_tags)
+                elif single_flight:
+                    lock = _try_lock(redis_client, cache_key_str)
+                    if lock is None:
+                        # Another worker is computing it: wait for its result
+                        tier_counters.incr('coalesced_waits')
+                        entry, _ = _wait_for_entry(redis_client, cache_key_str, entry_tags)
+                        if entry:
+                            return _serve_entry(cache_key_str, entry, ttl, entry_tags)
                 
                 # Call the function
-                result = f(*args, **kwargs)
+                tier_counters.incr('recomputes')
+                started = time.time()
+                response = current_app.make_response(f(*args, **kwargs))
+                
+                # Only cache successful JSON responses
+                if (response.status_code != 200 or response.is_streamed
+                        or response.mimetype != 'application/json'):
+                    return response
                 
-                # Only cache successful responses
-                if isinstance(result, tuple) and len(result) >= 2:
-                    response_data, status_code = result[0], result[1]
-                    if status_code == 200:
-                        # If response is a Flask Response, extract JSON payload
-                        payload = None
-                        try:
-                            # Flask Response has get_json in Flask >=1.0
-                            if hasattr(response_data, 'get_json'):
-                                payload = response_data.get_json(silent=True)
-                            if payload is None and hasattr(response_data, 'get_data'):
-                                raw = response_data.get_data(as_text=True)
-                                payload = json.loads(raw)
-                        except Exception:
-                            payload = None
-
-                        try:
-                            if payload is not None:
-                                redis_client.setex(
-                                    cache_key_str,
-                                    ttl,
-                                    json.dumps(payload, default=str)
-                                )
-                        except (TypeError, ValueError):
-                            pass
+                body = response.get_data()
+                etag = content_etag(body)
+                if single_flight:
+                    _write_tagged_entry(
+                        redis_client, cache_key_str, body, etag,
+                        ttl + stale_ttl, versions,
+                        fresh_until=time.time() + ttl, delta=round(time.time() - started, 3)
+                    )
                 else:
-                    try:
-                        redis_client.setex(
-                            cache_key_str,
-                            ttl,
-                            json.dumps(result, default=str)
-                        )
-                    except (TypeError, ValueError):
-                        pass
+                    _write_tagged_entry(
+                        redis_client, cache_key_str, body, etag, ttl, versions
+                    )
+                if L1_ENABLED:
+                    local_cache.set(cache_key_str, (body, etag), len(body), ttl, entry_tags)
                 
-                return result
+                response.set_etag(etag)
+                return response.make_conditional(request)
                 
-            except redis.ConnectionError:
-                # If Redis is down, just call the function
+            except redis.RedisError:
+                # If Redis is down, serve the response already computed or call the function
+                if response is not None:
+                    return response
                 return f(*args, **kwargs)
+            finally:
+                if lock is not None:
+                    _release_lock(lock)
         
-        return decorated_function
+        if variant is None:
+            return decorated_function
+        
+        @wraps(f)
+        def negotiated_function(*args, **kwargs):
+            response = current_app.make_response(decorated_function(*args, **kwargs))
+            response.vary.add('Accept')
+            return response
+        
+        return negotiated_function
     return decorator
 
 
@@ -184,46 +475,69 @@ def clear_cache(pattern=None):
     """
     Clear cache entries
     
+    Keys are removed in batches with SCAN/UNLINK (or from the namespace index
+    for "cache:*" / "route:*"), so Redis is never blocked by a keyspace walk.
+    
     Args:
         pattern (str): Redis key pattern to delete (e.g., "cache:*" or "route:*")
     """
+    local_cache.clear()
     try:
         redis_client = get_redis_client()
+        redis_client.publish(INVALIDATION_CHANNEL, json.dumps({'clear': True}))
         
         if pattern:
-            keys = redis_client.keys(pattern)
-            if keys:
-                redis_client.delete(*keys)
-                return len(keys)
+            namespace = pattern[:-2] if pattern.endswith(':*') else None
+            if namespace in CACHE_NAMESPACES:
+                return _clear_namespace(redis_client, namespace)
+            return _clear_matching(redis_client, pattern)
         else:
-            redis_client.flushdb()
+            redis_client.flushdb(asynchronous=True)
             return -1  # All keys deleted
-        
-        return 0
-    except redis.ConnectionError:
+    except redis.RedisError:
         return None
 
 
+def count_cached_keys():
+    """Count live keys per cache namespace from the namespace indexes"""
+    redis_client = get_redis_client()
+    now = datetime.now().timestamp()
+    pipe = redis_client.pipeline(transaction=False)
+    for namespace in CACHE_NAMESPACES:
+        index_key = f"{KEY_INDEX_PREFIX}{namespace}"
+        pipe.zremrangebyscore(index_key, '-inf', now)
+        pipe.zcard(index_key)
+    results = pipe.execute()
+    return {
+        namespace: results[i * 2 + 1]
+        for i, namespace in enumerate(CACHE_NAMESPACES)
+    }
+
+
 def get_cache_stats():
     """Get Redis cache statistics"""
     try:
         redis_client = get_redis_client()
         
         info = redis_client.info()
+        counts = count_cached_keys()
         
         return {
             'connected': True,
             'memory_used': info.get('used_memory_human', 'N/A'),
             'memory_peak': info.get('used_memory_peak_human', 'N/A'),
             'keys_count': redis_client.dbsize(),
-            'cache_keys': len(redis_client.keys('cache:*')),
-            'route_keys': len(redis_client.keys('route:*')),
-            'uptime_seconds': info.get('uptime_in_seconds', 0)
+            'cache_keys': counts['cache'],
+            'route_keys': counts['route'],
+            'uptime_seconds': info.get('uptime_in_seconds', 0),
+            'pool': get_redis_pool_stats(),
+            'tiers': dict(tier_counters.stats(), l1_enabled=L1_ENABLED, l1=local_cache.stats())
         }
-    except redis.ConnectionError:
+    except redis.RedisError:
         return {
             'connected': False,
-            'error': 'Cannot connect to Redis'
+            'error': 'Cannot connect to Redis',
+            'pool': get_redis_pool_stats()
         }
 
 
@@ -243,41 +557,37 @@ class CacheManager:
                 except json.JSONDecodeError:
                     return value
             return None
-        except redis.ConnectionError:
+        except redis.RedisError:
             return None
     
     def set(self, key, value, ttl=300):
         """Set value in cache"""
         try:
-            self.redis_client.setex(
-                f"cache:{key}",
-                ttl,
-                json.dumps(value, default=str)
-            )
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(f"cache:{key}", ttl, json.dumps(value, default=str))
+            _track_key(pipe, f"cache:{key}", ttl)
+            pipe.execute()
             return True
-        except (redis.ConnectionError, TypeError, ValueError):
+        except (redis.RedisError, TypeError, ValueError):
             return False
     
     def delete(self, key):
         """Delete value from cache"""
         try:
-            return self.redis_client.delete(f"cache:{key}") > 0
-        except redis.ConnectionError:
+            return _unlink_batch(self.redis_client, [f"cache:{key}"]) > 0
+        except redis.RedisError:
             return False
     
     def clear(self, pattern='*'):
         """Clear cache with pattern"""
         try:
-            keys = self.redis_client.keys(f"cache:{pattern}")
-            if keys:
-                self.redis_client.delete(*keys)
-            return True
-        except redis.ConnectionError:
+            return clear_cache(f"cache:{pattern}") is not None
+        except redis.RedisError:
             return False
     
     def exists(self, key):
         """Check if key exists"""
         try:
             return self.redis_client.exists(f"cache:{key}") > 0
-        except redis.ConnectionError:
+        except redis.RedisError:
             return False
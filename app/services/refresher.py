@@ -0,0 +1,253 @@
+"""
+Rafraîchissement en arrière-plan des agrégats "chauds"
+Les requêtes d'agrégation coûteuses du dashboard sont enregistrées ici,
+recalculées périodiquement par un thread et stockées dans Redis : les
+routes ne font plus qu'une lecture (stale-while-revalidate)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import redis
+
+from app.services.redis_cache import get_redis_client, TAG_VERSION_PREFIX, ENTRY_VERSION_PREFIX
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TICK_SECONDS = float(os.getenv('REFRESH_TICK_SECONDS', 1))
+# Une requête non demandée depuis ce délai n'est plus rafraîchie
+REFRESH_IDLE_SECONDS = int(os.getenv('REFRESH_IDLE_SECONDS', 600))
+PRECOMPUTED_TTL = 86400
+# Attente d'une valeur calculée par un autre processus (première lecture)
+PRECOMPUTED_POLL_INTERVAL = 0.05
+
+PRECOMPUTED_PREFIX = 'precomputed:'
+SEEN_PREFIX = 'precomputed-seen:'
+
+_hot_queries = {}
+_refresher = None
+
+
+class HotQuery:
+    """Agrégat précalculé : fonction de calcul, période et tags dont il dépend"""
+
+    def __init__(self, name, compute, interval, tags=()):
+        self.name = name
+        self.compute = compute
+        self.interval = interval
+        self.tags = list(tags)
+
+    @property
+    def key(self):
+        return f"{PRECOMPUTED_PREFIX}{self.name}"
+
+    @property
+    def lock_timeout(self):
+        return max(self.interval, 30)
+
+    def lock(self, redis_client):
+        """Verrou de calcul, partagé par le thread et les lectures sans valeur"""
+        return redis_client.lock(f"lock:{self.key}", timeout=self.lock_timeout, blocking=False)
+
+
+def register_hot_query(name, compute, interval=60, tags=()):
+    """
+    Enregistrer un agrégat à précalculer
+
+    Args:
+        name (str): Nom de la requête
+        compute (callable): Fonction sans argument renvoyant un dict sérialisable
+        interval (int): Période de rafraîchissement en secondes
+        tags (list): Tags de cache ; un bump_tags() déclenche un recalcul anticipé
+    """
+    _hot_queries[name] = HotQuery(name, compute, interval, tags)
+
+
+def _with_age(data, computed_at):
+    data['computed_at'] = datetime.fromtimestamp(computed_at).isoformat()
+    data['age_seconds'] = round(max(time.time() - computed_at, 0), 3)
+    return data
+
+
+def _store(redis_client, query):
+    """Calculer un agrégat et l'écrire dans Redis avec les versions de ses tags"""
+    versions = {}
+    if query.tags:
+        # Versions lues avant le calcul : une invalidation concurrente le rend à nouveau dû
+        current = redis_client.mget([f"{TAG_VERSION_PREFIX}{tag}" for tag in query.tags])
+        versions = {tag: version or '0' for tag, version in zip(query.tags, current)}
+
+    data = query.compute()
+    computed_at = time.time()
+    mapping = {'body': json.dumps(data), 'computed_at': computed_at}
+    for tag, version in versions.items():
+        mapping[f"{ENTRY_VERSION_PREFIX}{tag}"] = version
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.delete(query.key)
+    pipe.hset(query.key, mapping=mapping)
+    pipe.expire(query.key, PRECOMPUTED_TTL)
+    pipe.execute()
+    return data, computed_at
+
+
+def _release(lock):
+    # Verrou expiré (LockError) ou Redis indisponible : il expire seul
+    try:
+        lock.release()
+    except redis.RedisError:
+        pass
+
+
+def _is_current(query, computed_at, stored_versions, current_versions):
+    """Valeur calculée il y a moins d'une période et sans tag invalidé depuis"""
+    if computed_at is None or time.time() - float(computed_at) >= query.interval:
+        return False
+    return list(stored_versions) == [version or '0' for version in current_versions]
+
+
+def _read_value(redis_client, query, mark_seen=False):
+    """
+    Lire la valeur stockée d'un agrégat et les versions de ses tags en un aller-retour
+
+    Returns:
+        tuple: (données, computed_at, à jour) ; (None, None, False) si absente
+    """
+    fields = ['body', 'computed_at'] + [f"{ENTRY_VERSION_PREFIX}{tag}" for tag in query.tags]
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hmget(query.key, fields)
+    if query.tags:
+        pipe.mget([f"{TAG_VERSION_PREFIX}{tag}" for tag in query.tags])
+    if mark_seen:
+        pipe.set(f"{SEEN_PREFIX}{query.name}", 1, ex=REFRESH_IDLE_SECONDS)
+    results = pipe.execute()
+
+    body, computed_at, *stored_versions = results[0]
+    if body is None:
+        return None, None, False
+    current_versions = results[1] if query.tags else []
+    return json.loads(body), float(computed_at), _is_current(query, computed_at, stored_versions, current_versions)
+
+
+def _compute_missing(redis_client, query, stale_at=None):
+    """
+    Calculer un agrégat absent ou périmé, un seul processus à la fois
+
+    Le calcul prend le verrou du thread de rafraîchissement ; les autres
+    lectures attendent la valeur qu'il publie, plus récente que celle
+    calculée à stale_at (ou reprennent le verrou si son détenteur a échoué).
+    """
+    deadline = time.monotonic() + query.lock_timeout
+    while True:
+        lock = query.lock(redis_client)
+        if lock.acquire():
+            try:
+                # Publiée entre-temps par le détenteur précédent
+                data, computed_at, current = _read_value(redis_client, query)
+                if current:
+                    return data, computed_at
+                return _store(redis_client, query)
+            finally:
+                _release(lock)
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"{query.name} is still being computed")
+        time.sleep(PRECOMPUTED_POLL_INTERVAL)
+        data, computed_at, current = _read_value(redis_client, query)
+        if data is not None and (current or computed_at != stale_at):
+            return data, computed_at
+
+
+def read_precomputed(name):
+    """
+    Lire la valeur précalculée d'un agrégat
+
+    La valeur est servie avec son horodatage (computed_at) et son âge. Si
+    elle est absente, plus vieille que sa période ou qu'un de ses tags a
+    été invalidé depuis son calcul, elle est recalculée par une seule
+    requête à la fois (voir _compute_missing) ; la valeur périmée n'est
+    servie que si ce calcul n'aboutit pas à temps.
+    """
+    query = _hot_queries[name]
+    try:
+        redis_client = get_redis_client()
+        data, computed_at, current = _read_value(redis_client, query, mark_seen=True)
+        if not current:
+            try:
+                data, computed_at = _compute_missing(redis_client, query, stale_at=computed_at)
+            except TimeoutError:
+                if data is None:
+                    raise
+                logger.warning(f"⚠️  Serving stale {name}: still being computed")
+    except redis.RedisError:
+        # Redis indisponible : calcul direct
+        data, computed_at = query.compute(), time.time()
+    return _with_age(data, computed_at)
+
+
+class Refresher:
+    """Thread recalculant les agrégats dus, un seul processus à la fois par agrégat"""
+
+    def __init__(self, tick=REFRESH_TICK_SECONDS):
+        self.tick = tick
+        self._thread = None
+
+    def start(self):
+        """Démarrer le thread de rafraîchissement"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='aggregate-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            for query in list(_hot_queries.values()):
+                try:
+                    self.refresh_if_due(query)
+                except Exception as e:
+                    logger.warning(f"⚠️  Refresh of {query.name} failed: {e}")
+            time.sleep(self.tick)
+
+    def _is_due(self, redis_client, query):
+        """Agrégat demandé récemment et périmé (période écoulée ou tag invalidé)"""
+        fields = ['computed_at'] + [f"{ENTRY_VERSION_PREFIX}{tag}" for tag in query.tags]
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.exists(f"{SEEN_PREFIX}{query.name}")
+        pipe.hmget(query.key, fields)
+        if query.tags:
+            pipe.mget([f"{TAG_VERSION_PREFIX}{tag}" for tag in query.tags])
+        results = pipe.execute()
+
+        if not results[0]:
+            return False
+        computed_at, *stored_versions = results[1]
+        return not _is_current(query, computed_at, stored_versions, results[2] if query.tags else [])
+
+    def refresh_if_due(self, query):
+        """Recalculer un agrégat s'il est dû et qu'aucun autre processus ne s'en charge"""
+        redis_client = get_redis_client()
+        if not self._is_due(redis_client, query):
+            return False
+        lock = query.lock(redis_client)
+        if not lock.acquire():
+            return False
+        try:
+            # Un autre processus a pu terminer le calcul entre-temps
+            if not self._is_due(redis_client, query):
+                return False
+            _store(redis_client, query)
+            return True
+        finally:
+            _release(lock)
+
+
+def init_refresher(app):
+    """Démarrer le rafraîchissement des agrégats si activé"""
+    global _refresher
+    if os.getenv('REFRESHER_ENABLED', 'True') != 'True':
+        return None
+    _refresher = Refresher()
+    _refresher.start()
+    app.logger.info(f"🔄 Rafraîchissement de {len(_hot_queries)} agrégat(s) en arrière-plan")
+    return _refresher
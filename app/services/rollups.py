@@ -0,0 +1,330 @@
+"""
+Rollups des logs IoT
+Résumés horaires et journaliers par capteur (sensor_id, zone, building_id,
+sensor_type) stockés dans les index iot-rollup-*, mis à jour
+incrémentalement à l'ingestion et reconstructibles depuis iot-logs-*
+
+Seuls l'upload de fichiers et /api/v1/ingest mettent les rollups à jour,
+pour les documents acceptés par Elasticsearch. Les écritures directes
+dans iot-logs-* (Logstash : input TCP et dossier de dépôt, générateur
+--stream) n'y sont pas comptées : après de telles écritures, lancer
+scripts/rebuild_rollups.py sur la période concernée.
+"""
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from elasticsearch import helpers
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'False') == 'True'
+ROLLUP_INDEX_PATTERN = 'iot-rollup-*'
+ROLLUP_TEMPLATE_NAME = 'iot-rollup-template'
+ROLLUP_DIMENSIONS = ('sensor_id', 'zone', 'building_id', 'sensor_type')
+ROLLUP_STATUSES = ('normal', 'warning', 'alert', 'critical')
+
+# Granularité -> (intervalle date_histogram, longueur du préfixe ISO, suffixe du début de bucket)
+GRANULARITIES = {
+    'hourly': ({'fixed_interval': '1h'}, 13, ':00:00+00:00'),
+    'daily': ({'calendar_interval': '1d'}, 10, 'T00:00:00+00:00')
+}
+
+# Fusion d'un résumé partiel dans un document de rollup existant
+MERGE_SCRIPT = """
+def s = ctx._source;
+s.count += params.count;
+if (params.value_count > 0) {
+    s.min = s.value_count > 0 ? Math.min(s.min, params.min) : params.min;
+    s.max = s.value_count > 0 ? Math.max(s.max, params.max) : params.max;
+    s.value_count += params.value_count;
+    s.sum += params.sum;
+    s.avg = s.sum / s.value_count;
+}
+for (entry in params.status_counts.entrySet()) {
+    def current = s.status_counts.containsKey(entry.getKey()) ? s.status_counts[entry.getKey()] : 0;
+    s.status_counts[entry.getKey()] = current + entry.getValue();
+}
+"""
+
+ROLLUP_TEMPLATE = {
+    "index_patterns": [ROLLUP_INDEX_PATTERN],
+    "template": {
+        "settings": {
+            "number_of_shards": 1,
+            "number_of_replicas": 0
+        },
+        "mappings": {
+            "properties": {
+                "granularity": {"type": "keyword"},
+                "bucket": {"type": "date"},
+                "sensor_id": {"type": "keyword"},
+                "zone": {"type": "keyword"},
+                "building_id": {"type": "keyword"},
+                "sensor_type": {"type": "keyword"},
+                "count": {"type": "long"},
+                "value_count": {"type": "long"},
+                "sum": {"type": "double"},
+                "min": {"type": "double"},
+                "max": {"type": "double"},
+                "avg": {"type": "double"},
+                "status_counts": {
+                    "dynamic": True,
+                    "properties": {status: {"type": "long"} for status in ROLLUP_STATUSES}
+                }
+            }
+        }
+    }
+}
+
+
+def ensure_rollup_template(es):
+    """Créer (ou mettre à jour) le template des index de rollup"""
+    es.indices.put_index_template(name=ROLLUP_TEMPLATE_NAME, body=ROLLUP_TEMPLATE)
+
+
+def rollup_index_name(granularity, bucket):
+    """Index mensuel pour les rollups horaires, annuel pour les journaliers"""
+    if granularity == 'hourly':
+        return f"iot-rollup-hourly-{bucket[:7].replace('-', '.')}"
+    return f"iot-rollup-daily-{bucket[:4]}"
+
+
+def rollup_doc_id(granularity, bucket, dimensions):
+    """Identifiant déterministe d'un bucket de rollup"""
+    key = '|'.join([granularity, bucket] + [str(dimensions.get(d) or '') for d in ROLLUP_DIMENSIONS])
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _empty_summary():
+    return {'count': 0, 'value_count': 0, 'sum': 0.0, 'min': None, 'max': None, 'status_counts': {}}
+
+
+class RollupAccumulator:
+    """Résumés partiels accumulés en mémoire avant fusion dans les rollups"""
+
+    def __init__(self):
+        self.summaries = {}
+
+    def add(self, document):
+        """Comptabiliser un document enrichi (horodatage ISO UTC)"""
+        timestamp = document.get('@timestamp')
+        if not isinstance(timestamp, str) or len(timestamp) < 13:
+            return
+        dimensions = tuple(document.get(d) for d in ROLLUP_DIMENSIONS)
+        value = document.get('value')
+        status = document.get('status')
+        for granularity, (_, prefix, suffix) in GRANULARITIES.items():
+            bucket = timestamp[:prefix] + suffix
+            summary = self.summaries.get((granularity, bucket, dimensions))
+            if summary is None:
+                summary = self.summaries[(granularity, bucket, dimensions)] = _empty_summary()
+            summary['count'] += 1
+            if isinstance(value, (int, float)):
+                summary['value_count'] += 1
+                summary['sum'] += value
+                summary['min'] = value if summary['min'] is None else min(summary['min'], value)
+                summary['max'] = value if summary['max'] is None else max(summary['max'], value)
+            if status:
+                summary['status_counts'][status] = summary['status_counts'].get(status, 0) + 1
+
+    def add_frame(self, frame):
+        """Comptabiliser un lot enrichi (DataFrame) : mêmes résumés qu'add() document par document"""
+        timestamps = frame['@timestamp'].astype(object)
+        valid = timestamps.map(lambda t: isinstance(t, str) and len(t) >= 13).to_numpy(dtype=bool)
+        if not valid.any():
+            return
+        group = frame.loc[valid, [d for d in ROLLUP_DIMENSIONS if d in frame]].astype(object)
+        for d in ROLLUP_DIMENSIONS:
+            if d not in group:
+                group[d] = None
+        group['value'] = frame.loc[valid, 'value'].astype(float) if 'value' in frame else float('nan')
+        group['status'] = frame.loc[valid, 'status'] if 'status' in frame else None
+        timestamps = timestamps[valid]
+        keys = ['bucket', *ROLLUP_DIMENSIONS]
+
+        for granularity, (_, prefix, suffix) in GRANULARITIES.items():
+            group['bucket'] = timestamps.str[:prefix] + suffix
+            grouped = group.groupby(keys, dropna=False, sort=False)
+            values = grouped['value'].agg(['size', 'count', 'sum', 'min', 'max'])
+            statuses = group[group['status'].notna() & (group['status'] != '')]
+            status_counts = statuses.groupby(keys + ['status'], dropna=False, sort=False).size()
+            for key, size, count, total, low, high in values.itertuples():
+                dimensions = tuple(None if value != value else value for value in key[1:])
+                summary = self.summaries.get((granularity, key[0], dimensions))
+                if summary is None:
+                    summary = self.summaries[(granularity, key[0], dimensions)] = _empty_summary()
+                summary['count'] += int(size)
+                if count:
+                    summary['value_count'] += int(count)
+                    summary['sum'] += float(total)
+                    summary['min'] = float(low) if summary['min'] is None else min(summary['min'], float(low))
+                    summary['max'] = float(high) if summary['max'] is None else max(summary['max'], float(high))
+            for key, count in status_counts.items():
+                dimensions = tuple(None if value != value else value for value in key[1:-1])
+                counts = self.summaries[(granularity, key[0], dimensions)]['status_counts']
+                counts[key[-1]] = counts.get(key[-1], 0) + int(count)
+
+    def actions(self):
+        """Actions bulk de fusion (upsert scripté) des résumés accumulés"""
+        for (granularity, bucket, dimension_values), summary in self.summaries.items():
+            dimensions = dict(zip(ROLLUP_DIMENSIONS, dimension_values))
+            document = dict(
+                dimensions,
+                granularity=granularity,
+                bucket=bucket,
+                avg=summary['sum'] / summary['value_count'] if summary['value_count'] else None,
+                **summary
+            )
+            yield {
+                '_op_type': 'update',
+                '_index': rollup_index_name(granularity, bucket),
+                '_id': rollup_doc_id(granularity, bucket, dimensions),
+                'script': {'source': MERGE_SCRIPT, 'lang': 'painless', 'params': summary},
+                'upsert': document,
+                'retry_on_conflict': 5
+            }
+
+    def flush(self, es):
+        """Fusionner les résumés dans les index de rollup puis vider l'accumulateur"""
+        if not self.summaries:
+            return 0
+        updated, errors = helpers.bulk(es, self.actions(), raise_on_error=False, refresh=True)
+        if errors:
+            logger.warning(f"⚠️  {len(errors)} rollup update(s) failed")
+        self.summaries = {}
+        return updated
+
+
+class PendingRollups:
+    """
+    Documents envoyés à _bulk, comptabilisés une fois acceptés
+
+    Chaque document (ou lot DataFrame) est suivi par son _id jusqu'au
+    résultat de son indexation ; seuls les documents indexés sont ajoutés
+    à l'accumulateur.
+    """
+
+    def __init__(self, accumulator):
+        self.accumulator = accumulator
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def track(self, doc_id, document):
+        """Suivre un document enrichi"""
+        with self._lock:
+            self._pending[doc_id] = (document, None)
+
+    def track_frame(self, doc_ids, frame):
+        """Suivre un lot enrichi (DataFrame), ligne par ligne"""
+        batch = {'frame': frame, 'accepted': [False] * len(frame), 'remaining': len(frame)}
+        with self._lock:
+            for position, doc_id in enumerate(doc_ids):
+                self._pending[doc_id] = (batch, position)
+
+    def done(self, doc_id, ok):
+        """Résultat d'indexation d'un document suivi"""
+        with self._lock:
+            entry = self._pending.pop(doc_id, None)
+            if entry is None:
+                return
+            item, position = entry
+            if position is None:
+                if ok:
+                    self.accumulator.add(item)
+                return
+            item['accepted'][position] = ok
+            item['remaining'] -= 1
+            if not item['remaining'] and any(item['accepted']):
+                self.accumulator.add_frame(item['frame'][item['accepted']])
+
+
+def _composite_sources(granularity):
+    interval = GRANULARITIES[granularity][0]
+    sources = [{"bucket": {"date_histogram": dict(field="@timestamp", **interval)}}]
+    sources += [{d: {"terms": {"field": d, "missing_bucket": True}}} for d in ROLLUP_DIMENSIONS]
+    return sources
+
+
+def _rebuild_actions(es, granularity, time_range, page_size):
+    """Documents de rollup recalculés depuis les logs bruts (agrégation composite paginée)"""
+    body = {
+        "size": 0,
+        "query": {"range": {"@timestamp": time_range}} if time_range else {"match_all": {}},
+        "aggs": {
+            "rollup": {
+                "composite": {"size": page_size, "sources": _composite_sources(granularity)},
+                "aggs": {
+                    "values": {"stats": {"field": "value"}},
+                    "statuses": {"terms": {"field": "status", "size": 20}}
+                }
+            }
+        }
+    }
+    while True:
+        result = es.search(index='iot-logs-*', body=body)
+        aggregation = result['aggregations']['rollup']
+        for bucket in aggregation['buckets']:
+            key = bucket['key']
+            # Même forme que les buckets incrémentaux (isoformat UTC)
+            bucket_start = datetime.fromtimestamp(key['bucket'] / 1000, timezone.utc).isoformat()
+            dimensions = {d: key.get(d) for d in ROLLUP_DIMENSIONS}
+            values = bucket['values']
+            yield {
+                '_index': rollup_index_name(granularity, bucket_start),
+                '_id': rollup_doc_id(granularity, bucket_start, dimensions),
+                '_source': dict(
+                    dimensions,
+                    granularity=granularity,
+                    bucket=bucket_start,
+                    count=bucket['doc_count'],
+                    value_count=values['count'],
+                    sum=values['sum'] if values['count'] else 0.0,
+                    min=values['min'],
+                    max=values['max'],
+                    avg=values['avg'],
+                    status_counts={b['key']: b['doc_count'] for b in bucket['statuses']['buckets']}
+                )
+            }
+        after_key = aggregation.get('after_key')
+        if not after_key or not aggregation['buckets']:
+            return
+        body['aggs']['rollup']['composite']['after'] = after_key
+
+
+def rebuild_rollups(es, date_from=None, date_to=None, page_size=1000):
+    """
+    Reconstruire les rollups depuis iot-logs-* (tout l'historique ou une période)
+
+    Les rollups de la période sont supprimés puis recalculés ; les bornes
+    sont arrondies au jour pour ne pas tronquer de bucket journalier.
+
+    Returns:
+        dict: nombre de documents de rollup écrits par granularité
+    """
+    ensure_rollup_template(es)
+    time_range = {}
+    if date_from:
+        time_range['gte'] = f"{date_from}||/d"
+    if date_to:
+        time_range['lte'] = f"{date_to}||/d"
+
+    written = {}
+    for granularity in GRANULARITIES:
+        bucket_filter = [{"term": {"granularity": granularity}}]
+        if time_range:
+            bucket_filter.append({"range": {"bucket": time_range}})
+        es.delete_by_query(
+            index=ROLLUP_INDEX_PATTERN,
+            body={"query": {"bool": {"filter": bucket_filter}}},
+            ignore_unavailable=True,
+            conflicts='proceed',
+            refresh=True
+        )
+        written[granularity], _ = helpers.bulk(
+            es, _rebuild_actions(es, granularity, time_range, page_size), raise_on_error=False
+        )
+    es.indices.refresh(index=ROLLUP_INDEX_PATTERN, ignore_unavailable=True)
+    return written
@@ -0,0 +1,220 @@
+"""
+Moteur de statistiques des logs IoT
+Calcule en un seul aller-retour Elasticsearch (size: 0 + agrégations filtrées)
+tous les indicateurs utilisés par les endpoints de statistiques, sur les
+logs bruts ou sur les rollups (ROLLUPS_ENABLED)
+"""
+from app.services.index_planner import LOG_INDEX_PATTERN, search_target
+from app.services.rollups import ROLLUPS_ENABLED, ROLLUP_INDEX_PATTERN, ROLLUP_STATUSES
+
+# Regroupement des statuts capteurs en catégories d'alerte
+STATUS_ALERT_CATEGORIES = {
+    'normal': 'normal',
+    'warning': 'high',
+    'alert': 'high',
+    'critical': 'critical'
+}
+
+
+# Agrégations ne portant que sur les dernières 24 h
+RECENT_AGGREGATIONS = ('today', 'last_24h_alerts')
+
+
+def build_stats_query():
+    """Construire la requête multi-agrégations des statistiques"""
+    return {
+        "size": 0,
+        "track_total_hits": True,
+        "aggs": {
+            "unique_sensors": {
+                "cardinality": {"field": "sensor_id"}
+            },
+            "temperature": {
+                "filter": {"term": {"sensor_type": "temperature"}},
+                "aggs": {"avg_value": {"avg": {"field": "value"}}}
+            },
+            "energy": {
+                "filter": {"term": {"sensor_type": "energy"}},
+                "aggs": {"total_value": {"sum": {"field": "value"}}}
+            },
+            "today": {
+                "filter": {"range": {"@timestamp": {"gte": "now/d"}}},
+                "aggs": {"by_status": {"terms": {"field": "status", "size": 20}}}
+            },
+            "last_24h_alerts": {
+                "filter": {
+                    "bool": {
+                        "filter": [{"range": {"@timestamp": {"gte": "now-24h"}}}],
+                        "must_not": [{"term": {"status": "normal"}}]
+                    }
+                }
+            },
+            "by_status": {
+                "terms": {"field": "status", "size": 20}
+            }
+        }
+    }
+
+
+def parse_stats_response(result):
+    """Extraire les indicateurs de la réponse Elasticsearch"""
+    aggs = result.get('aggregations', {})
+
+    status_counts = {
+        bucket['key']: bucket['doc_count']
+        for bucket in aggs.get('by_status', {}).get('buckets', [])
+    }
+    alerts = {'critical': 0, 'high': 0, 'normal': 0}
+    for status, count in status_counts.items():
+        alerts[STATUS_ALERT_CATEGORIES.get(status, 'normal')] += count
+
+    today = aggs.get('today', {})
+    today_status = {
+        bucket['key']: bucket['doc_count']
+        for bucket in today.get('by_status', {}).get('buckets', [])
+    }
+
+    avg_temperature = aggs.get('temperature', {}).get('avg_value', {}).get('value')
+    total_energy = aggs.get('energy', {}).get('total_value', {}).get('value')
+
+    return {
+        'total_logs': result['hits']['total']['value'],
+        'sensors_count': aggs.get('unique_sensors', {}).get('value', 0),
+        'avg_temperature': round(avg_temperature, 1) if avg_temperature is not None else 0,
+        'total_energy': round(total_energy, 2) if total_energy is not None else 0,
+        # Alertes depuis minuit : tout statut différent de "normal"
+        'today_alerts': today.get('doc_count', 0) - today_status.get('normal', 0),
+        'today_critical_warning': today_status.get('critical', 0) + today_status.get('warning', 0),
+        'alerts_last_24h': aggs.get('last_24h_alerts', {}).get('doc_count', 0),
+        'status_counts': status_counts,
+        'alerts': alerts
+    }
+
+
+def split_stats_query():
+    """
+    Séparer la requête en une partie historique et une partie récente
+
+    Returns:
+        tuple: (requête sur tout l'historique, requête sur les dernières 24 h)
+    """
+    historical = build_stats_query()
+    recent = {
+        "size": 0,
+        "track_total_hits": False,
+        "query": {"range": {"@timestamp": {"gte": "now-24h/d"}}},
+        "aggs": {name: historical['aggs'].pop(name) for name in RECENT_AGGREGATIONS}
+    }
+    return historical, recent
+
+
+def compute_log_stats(es, index=LOG_INDEX_PATTERN, use_rollups=None):
+    """
+    Calculer toutes les statistiques des logs en un seul aller-retour
+
+    Les indicateurs des dernières 24 h ne sont calculés que sur les index
+    journaliers concernés (msearch : deux recherches, une requête HTTP).
+    """
+    if use_rollups is None:
+        use_rollups = ROLLUPS_ENABLED
+    if use_rollups:
+        return compute_rollup_stats(es)
+    historical, recent = split_stats_query()
+    searches = [{'index': index}, historical, search_target('now-24h/d'), recent]
+    responses = es.msearch(searches=searches)['responses']
+    for response in responses:
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+    result = dict(responses[0])
+    result['aggregations'] = dict(responses[0].get('aggregations', {}), **responses[1].get('aggregations', {}))
+    return parse_stats_response(result)
+
+
+def build_rollup_stats_query():
+    """Requête des statistiques globales sur les rollups (équivalente à build_stats_query)"""
+    status_sums = {
+        status: {"sum": {"field": f"status_counts.{status}"}} for status in ROLLUP_STATUSES
+    }
+    last_24h = {"bool": {"filter": [
+        {"term": {"granularity": "hourly"}},
+        {"range": {"bucket": {"gte": "now-24h/h"}}}
+    ]}}
+    return {
+        "size": 0,
+        "track_total_hits": False,
+        # Journaliers pour l'historique, horaires pour les dernières 24 h
+        "query": {"bool": {"should": [{"term": {"granularity": "daily"}}, last_24h]}},
+        "aggs": {
+            "daily": {
+                "filter": {"term": {"granularity": "daily"}},
+                "aggs": {
+                    "total_logs": {"sum": {"field": "count"}},
+                    "unique_sensors": {"cardinality": {"field": "sensor_id"}},
+                    "temperature": {
+                        "filter": {"term": {"sensor_type": "temperature"}},
+                        "aggs": {
+                            "sum": {"sum": {"field": "sum"}},
+                            "value_count": {"sum": {"field": "value_count"}}
+                        }
+                    },
+                    "energy": {
+                        "filter": {"term": {"sensor_type": "energy"}},
+                        "aggs": {"sum": {"sum": {"field": "sum"}}}
+                    },
+                    "today": {
+                        "filter": {"range": {"bucket": {"gte": "now/d"}}},
+                        "aggs": dict(status_sums, total={"sum": {"field": "count"}})
+                    },
+                    **status_sums
+                }
+            },
+            "last_24h": {
+                "filter": last_24h,
+                "aggs": dict(status_sums, total={"sum": {"field": "count"}})
+            }
+        }
+    }
+
+
+def _value(agg):
+    return (agg or {}).get('value') or 0
+
+
+def parse_rollup_stats(result):
+    """Extraire les indicateurs (mêmes clés que stats_engine.parse_stats_response)"""
+    aggs = result.get('aggregations', {})
+    daily = aggs.get('daily', {})
+    last_24h = aggs.get('last_24h', {})
+    today = daily.get('today', {})
+
+    status_counts = {}
+    for status in ROLLUP_STATUSES:
+        count = int(_value(daily.get(status)))
+        if count:
+            status_counts[status] = count
+    alerts = {'critical': 0, 'high': 0, 'normal': 0}
+    for status, count in status_counts.items():
+        alerts[STATUS_ALERT_CATEGORIES.get(status, 'normal')] += count
+
+    temperature = daily.get('temperature', {})
+    value_count = _value(temperature.get('value_count'))
+    avg_temperature = _value(temperature.get('sum')) / value_count if value_count else 0
+
+    return {
+        'total_logs': int(_value(daily.get('total_logs'))),
+        'sensors_count': int(_value(daily.get('unique_sensors'))),
+        'avg_temperature': round(avg_temperature, 1),
+        'total_energy': round(_value(daily.get('energy', {}).get('sum')), 2),
+        'today_alerts': int(_value(today.get('total')) - _value(today.get('normal'))),
+        'today_critical_warning': int(_value(today.get('critical')) + _value(today.get('warning'))),
+        # Fenêtre alignée sur l'heure
+        'alerts_last_24h': int(_value(last_24h.get('total')) - _value(last_24h.get('normal'))),
+        'status_counts': status_counts,
+        'alerts': alerts
+    }
+
+
+def compute_rollup_stats(es):
+    """Statistiques globales lues dans les rollups (coût indépendant de l'historique)"""
+    result = es.search(index=ROLLUP_INDEX_PATTERN, body=build_rollup_stats_query(), ignore_unavailable=True)
+    return parse_rollup_stats(result)
@@ -0,0 +1,305 @@
+"""
+Ingestion en flux des passerelles capteurs
+Les documents reçus par /api/v1/ingest (NDJSON) sont placés dans une file
+bornée en mémoire ; des threads de vidage les regroupent en micro-lots
+(par nombre ou délai d'attente) envoyés à Elasticsearch via _bulk, avec
+le même enrichissement que le pipeline Logstash
+"""
+import atexit
+import collections
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from elasticsearch import helpers
+
+from app.services.database import get_elasticsearch
+from app.services.enrichment import enrich_records
+from app.services.ingestion import index_name_for, data_tags
+from app.services.redis_cache import bump_tags
+from app.services.rollups import ROLLUPS_ENABLED, PendingRollups, RollupAccumulator
+
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', 200000))
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 5000))
+STREAM_LINGER_MS = int(os.getenv('STREAM_LINGER_MS', 200))
+STREAM_FLUSHERS = int(os.getenv('STREAM_FLUSHERS', 2))
+STREAM_RETRY_AFTER = int(os.getenv('STREAM_RETRY_AFTER', 1))
+# Relances d'un lot avant de compter ses documents en échec
+STREAM_BULK_RETRIES = int(os.getenv('STREAM_BULK_RETRIES', 3))
+STREAM_BULK_BACKOFF = float(os.getenv('STREAM_BULK_BACKOFF', 0.5))
+# Refus temporaires par document (surcharge, shard ou nœud indisponible)
+RETRY_STATUSES = (429, 502, 503, 504)
+# Invalidation du cache au plus une fois par période (refresh_interval des index)
+STREAM_INVALIDATE_SECONDS = float(os.getenv('STREAM_INVALIDATE_SECONDS', 5))
+STREAM_DRAIN_SECONDS = float(os.getenv('STREAM_DRAIN_SECONDS', 10))
+# Jeton des passerelles (en-tête X-Ingest-Token) ; sans jeton, session requise
+STREAM_INGEST_TOKEN = os.getenv('STREAM_INGEST_TOKEN', '')
+MAX_REPORTED_ERRORS = 10
+
+_ingestor = None
+
+
+def parse_ndjson(body):
+    """
+    Lire un corps NDJSON (un objet JSON par ligne)
+
+    Returns:
+        tuple: (documents, nombre de lignes invalides, erreurs) ; les erreurs (au plus MAX_REPORTED_ERRORS)
+        indiquent le numéro de ligne, à partir de 1
+    """
+    documents = []
+    errors = []
+    invalid = 0
+    for number, line in enumerate(body.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            document = json.loads(line)
+        except ValueError as e:
+            document, error = None, f"invalid JSON: {e}"
+        else:
+            error = None if isinstance(document, dict) else 'expected a JSON object'
+        if error:
+            invalid += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': number, 'error': error})
+            continue
+        documents.append(document)
+    return documents, invalid, errors
+
+
+def token_authorized(token):
+    """Vérifier le jeton d'une passerelle (False si aucun jeton n'est configuré)"""
+    return bool(STREAM_INGEST_TOKEN) and hmac.compare_digest(token or '', STREAM_INGEST_TOKEN)
+
+
+class StreamIngestor:
+    """File bornée de documents vidée en micro-lots par des threads dédiés"""
+
+    def __init__(self, capacity=STREAM_QUEUE_SIZE, batch_size=STREAM_BATCH_SIZE,
+                 linger_ms=STREAM_LINGER_MS, flushers=STREAM_FLUSHERS):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.flushers = flushers
+        self._buffer = collections.deque()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._in_flight = 0
+        self._counters = collections.Counter()
+        self._touched = set()
+        self._last_invalidation = time.monotonic()
+
+    def start(self):
+        """Démarrer les threads de vidage"""
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        for number in range(len(self._threads), self.flushers):
+            thread = threading.Thread(target=self._run, name=f'stream-flusher-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def offer(self, documents):
+        """
+        Ajouter des documents à la file, tous ou aucun
+
+        Returns:
+            bool: False si la file n'a pas la place (le client doit réessayer)
+        """
+        with self._condition:
+            # Les lots en cours d'envoi occupent encore la mémoire
+            if len(self._buffer) + self._in_flight + len(documents) > self.capacity:
+                self._counters['rejected'] += len(documents)
+                return False
+            self._buffer.extend(documents)
+            self._counters['accepted'] += len(documents)
+            self._condition.notify()
+            return True
+
+    def _count(self, **values):
+        with self._condition:
+            self._counters.update(values)
+
+    def _take(self):
+        """
+        Attendre un lot complet ou l'expiration du délai d'attente du premier document
+
+        Renvoie un lot vide si des tags restent à invalider et que la file est vide.
+        """
+        with self._condition:
+            deadline = None
+            while len(self._buffer) < self.batch_size:
+                if not self._buffer:
+                    deadline = None
+                    if self._touched:
+                        if not self._condition.wait(STREAM_INVALIDATE_SECONDS) and not self._buffer:
+                            return []
+                    else:
+                        self._condition.wait()
+                    continue
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.linger
+                if now >= deadline:
+                    break
+                self._condition.wait(deadline - now)
+            count = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(count)]
+            self._in_flight += count
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                self._invalidate(set())
+                continue
+            try:
+                self.flush_batch(batch)
+            except Exception as e:
+                self._count(failed=len(batch))
+                logger.warning(f"⚠️  Stream flush of {len(batch)} document(s) failed: {e}")
+            finally:
+                with self._condition:
+                    self._in_flight -= len(batch)
+                    self._condition.notify_all()
+
+    def _actions(self, batch, rollups, touched):
+        actions = []
+        for document in enrich_records(batch):
+            # Identifiant fixé avant l'envoi : un renvoi ne crée pas de doublon
+            doc_id = uuid.uuid4().hex
+            if rollups is not None:
+                rollups.track(doc_id, document)
+            touched.update(data_tags(document))
+            actions.append({'_index': index_name_for(document), '_id': doc_id, '_source': document})
+        return actions
+
+    def _bulk(self, es, actions, rollups=None):
+        """
+        Indexer des actions avec relances
+
+        Les refus temporaires par document (RETRY_STATUSES) sont relancés
+        par streaming_bulk ; si la requête elle-même échoue, les documents
+        non confirmés sont renvoyés avec le même _id après une attente
+        croissante. Les documents déjà acquittés (202) ne sont jamais perdus
+        sans avoir été comptés en échec ; seuls les documents indexés sont
+        comptés dans les rollups.
+
+        Returns:
+            tuple: (documents indexés, documents en échec)
+        """
+        pending = {action['_id']: action for action in actions}
+        indexed = failed = 0
+        for attempt in range(STREAM_BULK_RETRIES + 1):
+            try:
+                for ok, item in helpers.streaming_bulk(
+                    es, list(pending.values()), chunk_size=self.batch_size,
+                    max_retries=STREAM_BULK_RETRIES, initial_backoff=STREAM_BULK_BACKOFF,
+                    retry_on_status=RETRY_STATUSES, raise_on_error=False
+                ):
+                    doc_id = item['index'].get('_id')
+                    pending.pop(doc_id, None)
+                    if rollups is not None:
+                        rollups.done(doc_id, ok)
+                    if ok:
+                        indexed += 1
+                    else:
+                        failed += 1
+                return indexed, failed
+            except Exception as e:
+                logger.warning(
+                    f"⚠️  Stream bulk attempt {attempt + 1} failed, {len(pending)} document(s) pending: {e}"
+                )
+                if attempt < STREAM_BULK_RETRIES:
+                    time.sleep(STREAM_BULK_BACKOFF * 2 ** attempt)
+        return indexed, failed + len(pending)
+
+    def flush_batch(self, batch):
+        """Indexer un lot en requêtes _bulk, avec relances"""
+        es = get_elasticsearch()
+        if es is None:
+            raise RuntimeError('Elasticsearch unavailable')
+        rollups = PendingRollups(RollupAccumulator()) if ROLLUPS_ENABLED else None
+        touched = set()
+        started = time.monotonic()
+        indexed, errors = self._bulk(es, self._actions(batch, rollups, touched), rollups)
+        self._count(
+            flushed=indexed, failed=errors, batches=1,
+            flush_ms=int((time.monotonic() - started) * 1000)
+        )
+        if rollups is not None:
+            try:
+                rollups.accumulator.flush(es)
+            except Exception as e:
+                logger.warning(f"⚠️  Rollup update failed: {e}")
+        self._invalidate(touched)
+        return indexed
+
+    def _invalidate(self, touched):
+        """Invalider les réponses en cache, au plus une fois par période"""
+        with self._condition:
+            self._touched.update(touched)
+            if not self._touched or time.monotonic() - self._last_invalidation < STREAM_INVALIDATE_SECONDS:
+                return
+            tags = sorted(self._touched)
+            self._touched = set()
+            self._last_invalidation = time.monotonic()
+        bump_tags('logs', *tags)
+
+    def drain(self, timeout=STREAM_DRAIN_SECONDS):
+        """Attendre le vidage de la file (arrêt du processus)"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self._buffer or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not any(thread.is_alive() for thread in self._threads):
+                    return False
+                self._condition.wait(min(remaining, self.linger or 0.1))
+        return True
+
+    def stats(self):
+        """Compteurs de la file (documents acceptés, refusés, indexés, en échec)"""
+        with self._condition:
+            counters = dict(self._counters)
+            depth = len(self._buffer)
+            in_flight = self._in_flight
+        batches = counters.get('batches', 0)
+        return {
+            'accepted': counters.get('accepted', 0),
+            'rejected': counters.get('rejected', 0),
+            'flushed': counters.get('flushed', 0),
+            'failed': counters.get('failed', 0),
+            'batches': batches,
+            'avg_flush_ms': round(counters.get('flush_ms', 0) / batches, 1) if batches else None,
+            'queue_depth': depth,
+            'in_flight': in_flight,
+            'capacity': self.capacity
+        }
+
+
+def init_stream_ingest(app):
+    """Démarrer l'ingestion en flux si activée"""
+    global _ingestor
+    if os.getenv('STREAM_INGEST_ENABLED', 'True') != 'True':
+        return None
+    _ingestor = StreamIngestor()
+    _ingestor.start()
+    # Documents encore en file à l'arrêt du processus
+    atexit.register(_ingestor.drain)
+    app.logger.info(
+        f"📡 Ingestion en flux : file de {_ingestor.capacity} documents, lots de {_ingestor.batch_size}"
+    )
+    return _ingestor
+
+
+def get_stream_ingestor():
+    """Obtenir l'ingestion en flux (None si désactivée)"""
+    return _ingestor
@@ -0,0 +1,268 @@
+"""
+Séries temporelles des capteurs
+Choix automatique de l'intervalle d'agrégation selon la période et le
+nombre de points demandés, lecture des rollups quand la granularité le
+permet, et sous-échantillonnage LTTB des points bruts
+"""
+import re
+from datetime import datetime, timedelta, timezone
+
+from app.services.index_planner import plan_indices
+from app.services.log_search import iter_export_pages
+from app.services.rollups import ROLLUPS_ENABLED, ROLLUP_INDEX_PATTERN
+
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 2000
+DEFAULT_RANGE = timedelta(hours=24)
+# Nombre maximal de points bruts lus avant sous-échantillonnage
+RAW_POINTS_LIMIT = 50000
+
+# Intervalles candidats (du plus fin au plus large)
+INTERVALS = [
+    ('1m', timedelta(minutes=1)),
+    ('5m', timedelta(minutes=5)),
+    ('15m', timedelta(minutes=15)),
+    ('30m', timedelta(minutes=30)),
+    ('1h', timedelta(hours=1)),
+    ('3h', timedelta(hours=3)),
+    ('6h', timedelta(hours=6)),
+    ('12h', timedelta(hours=12)),
+    ('1d', timedelta(days=1)),
+    ('7d', timedelta(days=7)),
+    ('30d', timedelta(days=30))
+]
+
+RANGE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+class InvalidSeriesRequest(ValueError):
+    """Paramètres de série invalides"""
+
+
+def _parse_datetime(value):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError as e:
+        raise InvalidSeriesRequest(f"Invalid date: {value}") from e
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def parse_series_range(params, now=None):
+    """
+    Lire la période demandée : from/to (ISO 8601) ou range relatif (ex. 24h, 7d)
+
+    Returns:
+        tuple: (début, fin) en datetime UTC
+    """
+    now = now or datetime.now(timezone.utc)
+    end = _parse_datetime(params['to']) if params.get('to') else now
+    if params.get('from'):
+        start = _parse_datetime(params['from'])
+    elif params.get('range'):
+        match = re.fullmatch(r'(\d+)([mhdw])', params['range'])
+        if not match:
+            raise InvalidSeriesRequest(f"Invalid range: {params['range']}")
+        start = end - timedelta(**{RANGE_UNITS[match.group(2)]: int(match.group(1))})
+    else:
+        start = end - DEFAULT_RANGE
+    if start >= end:
+        raise InvalidSeriesRequest('from must be before to')
+    return start, end
+
+
+def parse_max_points(value):
+    """Budget de points de la réponse, borné"""
+    try:
+        max_points = int(value) if value else DEFAULT_MAX_POINTS
+    except ValueError as e:
+        raise InvalidSeriesRequest('max_points must be an integer') from e
+    return max(2, min(max_points, MAX_POINTS_LIMIT))
+
+
+def choose_interval(start, end, max_points):
+    """Plus petit intervalle donnant au plus max_points buckets sur la période"""
+    span = end - start
+    for name, length in INTERVALS:
+        if span / length <= max_points:
+            return name, length
+    return INTERVALS[-1]
+
+
+def rollup_granularity(length):
+    """Granularité de rollup utilisable pour un intervalle (None si trop fin)"""
+    if length % timedelta(days=1) == timedelta(0):
+        return 'daily'
+    if length % timedelta(hours=1) == timedelta(0):
+        return 'hourly'
+    return None
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def build_series_query(filters, start, end, interval, granularity=None):
+    """Requête date_histogram (min/max/moyenne) sur les logs ou sur les rollups"""
+    conditions = [{"term": {field: value}} for field, value in filters.items()]
+    time_range = {"gte": start.isoformat(), "lt": end.isoformat()}
+    if granularity:
+        conditions.append({"term": {"granularity": granularity}})
+        conditions.append({"range": {"bucket": time_range}})
+        field = "bucket"
+        metrics = {
+            "min": {"min": {"field": "min"}},
+            "max": {"max": {"field": "max"}},
+            "sum": {"sum": {"field": "sum"}},
+            "value_count": {"sum": {"field": "value_count"}}
+        }
+    else:
+        conditions.append({"range": {"@timestamp": time_range}})
+        field = "@timestamp"
+        metrics = {
+            "min": {"min": {"field": "value"}},
+            "max": {"max": {"field": "value"}},
+            "avg": {"avg": {"field": "value"}}
+        }
+    return {
+        "size": 0,
+        "track_total_hits": False,
+        "query": {"bool": {"filter": conditions}},
+        "aggs": {
+            "series": {
+                "date_histogram": {"field": field, "fixed_interval": interval, "min_doc_count": 1},
+                "aggs": metrics
+            }
+        }
+    }
+
+
+def parse_series_response(result):
+    """Convertir les buckets en tableaux colonnes"""
+    columns = {'timestamps': [], 'min': [], 'max': [], 'avg': [], 'count': []}
+    for bucket in result['aggregations']['series']['buckets']:
+        if 'avg' in bucket:
+            avg = bucket['avg']['value']
+            count = bucket['doc_count']
+        else:
+            count = int(bucket['value_count']['value'])
+            avg = bucket['sum']['value'] / count if count else None
+        columns['timestamps'].append(bucket['key'])
+        columns['min'].append(_round(bucket['min']['value']))
+        columns['max'].append(_round(bucket['max']['value']))
+        columns['avg'].append(_round(avg))
+        columns['count'].append(count)
+    return columns
+
+
+def lttb(timestamps, values, threshold):
+    """
+    Sous-échantillonnage Largest-Triangle-Three-Buckets
+
+    Conserve le premier et le dernier point et, dans chaque bucket
+    intermédiaire, le point formant le plus grand triangle avec le point
+    retenu précédemment et la moyenne du bucket suivant : la forme de la
+    courbe (pics compris) est préservée avec threshold points.
+    """
+    length = len(timestamps)
+    if threshold >= length or threshold < 3:
+        return list(timestamps), list(values)
+
+    sampled_t = [timestamps[0]]
+    sampled_v = [values[0]]
+    bucket_size = (length - 2) / (threshold - 2)
+    previous = 0
+
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, length)
+        if next_start >= next_end:
+            next_start, next_end = length - 1, length
+        avg_t = sum(timestamps[next_start:next_end]) / (next_end - next_start)
+        avg_v = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        prev_t, prev_v = timestamps[previous], values[previous]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs(
+                (prev_t - avg_t) * (values[j] - prev_v)
+                - (prev_t - timestamps[j]) * (avg_v - prev_v)
+            )
+            if area > best_area:
+                best, best_area = j, area
+        sampled_t.append(timestamps[best])
+        sampled_v.append(values[best])
+        previous = best
+
+    sampled_t.append(timestamps[-1])
+    sampled_v.append(values[-1])
+    return sampled_t, sampled_v
+
+
+def _epoch_millis(value):
+    return int(_parse_datetime(value).timestamp() * 1000)
+
+
+def fetch_bucketed_series(es, filters, start, end, max_points, use_rollups=None):
+    """Série agrégée (min/max/avg par intervalle), depuis les rollups si possible"""
+    if use_rollups is None:
+        use_rollups = ROLLUPS_ENABLED
+    interval, length = choose_interval(start, end, max_points)
+    granularity = rollup_granularity(length) if use_rollups else None
+    # Seuls les index journaliers de la période sont interrogés
+    index = ROLLUP_INDEX_PATTERN if granularity else plan_indices(start, end)
+    result = es.search(
+        index=index,
+        body=build_series_query(filters, start, end, interval, granularity),
+        ignore_unavailable=True,
+        allow_no_indices=True
+    )
+    series = parse_series_response(result)
+    series.update({
+        'mode': 'buckets',
+        'interval': interval,
+        'source': 'rollups' if granularity else 'logs'
+    })
+    return series
+
+
+def fetch_raw_series(es, filters, start, end, max_points):
+    """Points bruts de la période, sous-échantillonnés par LTTB"""
+    conditions = [{"term": {field: value}} for field, value in filters.items()]
+    conditions.append({"range": {"@timestamp": {"gte": start.isoformat(), "lt": end.isoformat()}}})
+    conditions.append({"exists": {"field": "value"}})
+
+    timestamps, values = [], []
+    truncated = False
+    pages = iter_export_pages(
+        es, plan_indices(start, end), {"bool": {"filter": conditions}},
+        batch_size=5000, source=['@timestamp', 'value']
+    )
+    try:
+        for hits in pages:
+            for hit in hits:
+                source = hit['_source']
+                timestamps.append(_epoch_millis(source['@timestamp']))
+                values.append(float(source['value']))
+            if len(timestamps) >= RAW_POINTS_LIMIT:
+                truncated = True
+                break
+    finally:
+        pages.close()
+
+    # Parcours par date décroissante : remettre dans l'ordre chronologique
+    timestamps.reverse()
+    values.reverse()
+    raw_count = len(timestamps)
+    timestamps, values = lttb(timestamps, values, max_points)
+    return {
+        'mode': 'raw',
+        'timestamps': timestamps,
+        'values': [_round(v) for v in values],
+        'raw_count': raw_count,
+        # Au-delà de RAW_POINTS_LIMIT, seuls les points les plus récents sont lus
+        'truncated': truncated
+    }
@@ -0,0 +1,113 @@
+"""
+Génération des règles d'enrichissement du pipeline Logstash
+Le bloc de config/logstash/pipeline/logstash.conf compris entre les
+marqueurs BEGIN/END est produit depuis SENSOR_RULES, ZONE_LOCATIONS et
+RULES_VERSION (app/services/enrichment.py) : le dossier de dépôt et
+l'input TCP appliquent les mêmes seuils que l'application
+
+Usage:
+    python scripts/build_logstash_conf.py          # réécrire le bloc généré
+    python scripts/build_logstash_conf.py --check  # code 1 si le bloc est périmé
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from app.services.enrichment import RULES_VERSION, SENSOR_RULES, ZONE_LOCATIONS
+
+CONF_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'config', 'logstash', 'pipeline', 'logstash.conf'
+)
+BEGIN_MARKER = '  # BEGIN règles générées depuis SENSOR_RULES (python scripts/build_logstash_conf.py)'
+END_MARKER = '  # END règles générées'
+
+
+def _quote(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _mutate(fields, indent):
+    pad = ' ' * indent
+    lines = [f"{pad}mutate {{", f"{pad}  add_field => {{"]
+    lines += [f"{pad}    {_quote(name)} => {_quote(value)}" for name, value in fields]
+    lines += [f"{pad}  }}", f"{pad}}}"]
+    return lines
+
+
+def _rule_chain(field, rules, indent):
+    """Conditions évaluées dans l'ordre, la première vérifiée l'emporte (voir classify)"""
+    pad = ' ' * indent
+    lines = []
+    for number, (op, threshold, label, *message) in enumerate(rules):
+        keyword = 'if' if number == 0 else '} else if'
+        lines.append(f"{pad}{keyword} [value] {op} {threshold} {{")
+        fields = [(field, label)] + ([('alert_message', message[0])] if message else [])
+        lines += _mutate(fields, indent + 2)
+    lines.append(f"{pad}}} else {{")
+    lines += _mutate([(field, 'normal')], indent + 2)
+    lines.append(f"{pad}}}")
+    return lines
+
+
+def render_rules():
+    """Bloc de filtre Logstash équivalent à enrich_record (seuils, unité, statut, localisation)"""
+    lines = [BEGIN_MARKER]
+    for sensor_type, rules in SENSOR_RULES.items():
+        lines.append(f"  if [sensor_type] == {_quote(sensor_type)} {{")
+        if rules.get('alert_level'):
+            lines.append("    if [value] {")
+            lines += _rule_chain('alert_level', rules['alert_level'], 6)
+            lines.append("    }")
+        # Statut et unité complétés s'ils ne sont pas fournis par le capteur
+        lines.append('    if [value] and (![status] or [status] == "") {')
+        lines += _rule_chain('status', rules.get('status', []), 6) if rules.get('status') else \
+            _mutate([('status', 'normal')], 6)
+        lines.append("    }")
+        if rules.get('unit'):
+            lines.append('    if ![unit] or [unit] == "" {')
+            lines += _mutate([('unit', rules['unit'])], 6)
+            lines.append("    }")
+        lines.append("  }")
+    for number, (zone, location) in enumerate(ZONE_LOCATIONS.items()):
+        keyword = 'if' if number == 0 else '} else if'
+        lines.append(f"  {keyword} [zone] == {_quote(zone)} {{")
+        lines += _mutate([('[location][lat]', location['lat']), ('[location][lon]', location['lon'])], 4)
+    if ZONE_LOCATIONS:
+        lines.append("  }")
+    lines += _mutate([('pipeline_version', RULES_VERSION)], 2)
+    lines.append(END_MARKER)
+    return '\n'.join(lines)
+
+
+def build_conf(conf):
+    """Remplacer le bloc généré d'une configuration Logstash"""
+    start = conf.index(BEGIN_MARKER)
+    end = conf.index(END_MARKER, start) + len(END_MARKER)
+    return conf[:start] + render_rules() + conf[end:]
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Générer les règles Logstash depuis SENSOR_RULES')
+    parser.add_argument('--check', action='store_true', help='Vérifier sans écrire (code 1 si périmé)')
+    parser.add_argument('--conf', default=CONF_PATH, help='Fichier de pipeline Logstash')
+    args = parser.parse_args()
+
+    with open(args.conf, encoding='utf-8') as handle:
+        conf = handle.read()
+    built = build_conf(conf)
+    if args.check:
+        if built != conf:
+            print(f"❌ {args.conf} n'est pas à jour : python scripts/build_logstash_conf.py")
+            sys.exit(1)
+        print(f"✅ {args.conf} à jour (règles {RULES_VERSION})")
+        return
+    with open(args.conf, 'w', encoding='utf-8') as handle:
+        handle.write(built)
+    print(f"✅ Règles {RULES_VERSION} écrites dans {args.conf}")
+
+
+if __name__ == '__main__':
+    main()
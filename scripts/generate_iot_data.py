@@ -1,14 +1,40 @@
 """
 Script de génération de données IoT pour Smart Building
 Génère des logs de capteurs: température, humidité, CO2, luminosité, énergie, occupation
+
+Usage:
+    python scripts/generate_iot_data.py
+    python scripts/generate_iot_data.py --fast --records 100000000 --format parquet --seed 42
+    python scripts/generate_iot_data.py --stream es --rate 20000 --duration 60 --senders 4
 """
 
+import argparse
 import csv
 import json
+import queue
 import random
-from datetime import datetime, timedelta
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from faker import Faker
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from elasticsearch import Elasticsearch
+
+from app.services.enrichment import classify, classify_column, enrich_frame, unit_for
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # format parquet indisponible
+    pa = pq = None
 
 fake = Faker()
 
@@ -16,6 +42,17 @@ fake = Faker()
 NUM_SENSORS = 50
 NUM_RECORDS = 10000
 OUTPUT_DIR = 'data/uploads'
+# Mode rapide : lignes générées par bloc (un fichier et une graine par bloc)
+FAST_BLOCK_SIZE = 1000000
+WRITE_BUFFER_SIZE = 16 * 1024 * 1024
+# Mode flux : événements par requête _bulk (ou écriture TCP) et rapport de progression
+STREAM_BATCH_SIZE = 1000
+STREAM_REPORT_SECONDS = 5
+ES_HOST = os.getenv('ELASTICSEARCH_HOST', 'localhost')
+ES_PORT = int(os.getenv('ELASTICSEARCH_PORT', 9200))
+LOGSTASH_HOST = os.getenv('LOGSTASH_HOST', 'localhost')
+LOGSTASH_PORT = int(os.getenv('LOGSTASH_PORT', 5000))
+CSV_FIELDS = ['timestamp', 'sensor_id', 'sensor_type', 'zone', 'value', 'unit', 'status', 'building_id']
 BUILDINGS = ['Building_A', 'Building_B', 'Building_C']
 ZONES = ['zone_a', 'zone_b', 'zone_c', 'zone_d', 'zone_e']
 SENSOR_TYPES = ['temperature', 'humidity', 'co2', 'luminosity', 'energy', 'occupancy']
@@ -82,39 +119,13 @@ def generate_sensor_value(sensor_type, hour):
     return 0
 
 def get_unit(sensor_type):
-    """Obtenir l'unité de mesure"""
-    units = {
-        'temperature': '°C',
-        'humidity': '%',
-        'co2': 'ppm',
-        'luminosity': 'lux',
-        'energy': 'kWh',
-        'occupancy': '%'
-    }
-    return units.get(sensor_type, '')
+    """Obtenir l'unité de mesure (table de règles de app/services/enrichment.py)"""
+    return unit_for(sensor_type)
 
 def get_status(sensor_type, value):
-    """Déterminer le statut selon la valeur"""
-    if sensor_type == 'temperature':
-        if value > 30:
-            return 'alert'
-        elif value < 15:
-            return 'alert'
-        return 'normal'
-    
-    elif sensor_type == 'co2':
-        if value > 1000:
-            return 'critical'
-        elif value > 800:
-            return 'warning'
-        return 'normal'
-    
-    elif sensor_type == 'humidity':
-        if value > 70 or value < 30:
-            return 'warning'
-        return 'normal'
-    
-    return 'normal'
+    """Déterminer le statut selon la valeur (mêmes seuils que l'ingestion)"""
+    status, _ = classify(sensor_type, value, 'status')
+    return status
 
 def generate_csv_data(filename, num_records):
     """Générer un fichier CSV avec des données IoT"""
@@ -223,26 +234,418 @@ def generate_json_data(filename, num_records):
     print(f"✅ Fichier JSON créé: {filepath}")
     return filepath
 
-def main():
-    """Fonction principale"""
-    print("🚀 Démarrage de la génération de données IoT pour Smart Building")
-    print("=" * 70)
-    
+def build_sensor_table(num_sensors, seed):
+    """Capteurs du jeu de données rapide (types et zones répartis, identifiants uniques)"""
+    rng = np.random.default_rng([seed, 0])
+    types = np.array([SENSOR_TYPES[i % len(SENSOR_TYPES)] for i in range(num_sensors)], dtype=object)
+    zones = np.array(ZONES, dtype=object)[rng.integers(len(ZONES), size=num_sensors)]
+    buildings = np.array(BUILDINGS, dtype=object)[rng.integers(len(BUILDINGS), size=num_sensors)]
+    ids = np.array(
+        [f"{sensor_type[:4].upper()}_{zone}_{number:05d}" for number, (sensor_type, zone) in enumerate(zip(types, zones))],
+        dtype=object
+    )
+    return {'sensor_id': ids, 'sensor_type': types, 'zone': zones, 'building_id': buildings}
+
+
+def generate_values(rng, sensor_types, hours):
+    """
+    Valeurs de tout un bloc, par type de capteur (mêmes profils que generate_sensor_value)
+
+    Profil journalier (heures de bureau / nuit) et anomalies injectées :
+    5 % des températures décalées de -10 ou +15, 3 % de pics de CO2.
+    """
+    size = len(sensor_types)
+    values = np.zeros(size)
+    office = (hours >= 8) & (hours <= 18)
+
+    mask = sensor_types == 'temperature'
+    n = int(mask.sum())
+    base = 20 + np.where(office[mask], rng.uniform(2, 8, n), rng.uniform(-2, 2, n))
+    anomalies = rng.random(n) < 0.05
+    base[anomalies] += rng.choice([-10, 15], size=int(anomalies.sum()))
+    values[mask] = np.round(base + rng.uniform(-1, 1, n), 2)
+
+    mask = sensor_types == 'humidity'
+    values[mask] = np.round(50 + rng.uniform(-20, 20, int(mask.sum())), 2)
+
+    mask = sensor_types == 'co2'
+    n = int(mask.sum())
+    co2 = 400 + np.where(office[mask], rng.integers(200, 800, n), 0)
+    peaks = rng.random(n) < 0.03
+    co2[peaks] = rng.integers(1000, 1500, int(peaks.sum()))
+    values[mask] = co2
+
+    daylight = (hours >= 6) & (hours <= 20)
+    profiles = {
+        'luminosity': (daylight, (300, 1000), (0, 100)),
+        'energy': (office, (5, 25), (1, 5)),
+        'occupancy': (office, (30, 95), (0, 10))
+    }
+    for sensor_type, (active, high, low) in profiles.items():
+        mask = sensor_types == sensor_type
+        n = int(mask.sum())
+        values[mask] = np.round(np.where(
+            active[mask], rng.uniform(*high, n), rng.uniform(*low, n)
+        ), 2)
+    return values
+
+
+def generate_block(rows, sensors, start, span_seconds, seed, block):
+    """
+    Générer un bloc de mesures en colonnes
+
+    Le bloc a sa propre graine (seed, numéro de bloc) : le jeu de données
+    est identique quel que soit le nombre de processus.
+    """
+    rng = np.random.default_rng([seed, block + 1])
+    offsets = rng.integers(0, span_seconds, size=rows)
+    timestamps = np.datetime64(start, 's') + offsets.astype('timedelta64[s]')
+    picks = rng.integers(len(sensors['sensor_id']), size=rows)
+    sensor_types = sensors['sensor_type'][picks]
+    hours = (timestamps.astype('int64') // 3600) % 24
+
+    values = generate_values(rng, sensor_types, hours)
+    statuses, _ = classify_column(sensor_types, values, 'status')
+    units = pd.Series(sensor_types).map({t: unit_for(t) for t in SENSOR_TYPES}).to_numpy()
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'sensor_id': sensors['sensor_id'][picks],
+        'sensor_type': sensor_types,
+        'zone': sensors['zone'][picks],
+        'value': values,
+        'unit': units,
+        'status': statuses,
+        'building_id': sensors['building_id'][picks]
+    })
+
+
+def format_timestamps(timestamps, separator):
+    """Horodatages en texte 'YYYY-MM-DD?HH:MM:SS' (sans passer par strftime)"""
+    text = np.datetime_as_string(timestamps, unit='s')
+    # Chaînes UCS-4 de largeur fixe : 11e caractère remplacé en place
+    text.view(np.uint32).reshape(len(text), -1)[:, 10] = ord(separator)
+    return text.tolist()
+
+
+def format_lines(frame, output_format):
+    """
+    Lignes CSV ou NDJSON d'un bloc
+
+    Les parties qui ne dépendent que du capteur et du statut sont formatées
+    une fois par combinaison, puis assemblées avec l'horodatage et la valeur.
+    """
+    sensor_codes, _ = pd.factorize(frame['sensor_id'])
+    status_codes, statuses = pd.factorize(frame['status'])
+    _, first_rows = np.unique(sensor_codes, return_index=True)
+    attributes = frame.iloc[first_rows]
+
+    if output_format == 'csv':
+        quote = str
+        prefix_format = '{},{},{},'
+        suffix_format = ',{},{},{}'
+        line_format = '{},{}{}{}'.format
+    else:
+        def quote(value):
+            return json.dumps(value, ensure_ascii=False)
+        prefix_format = '"sensor_id":{},"sensor_type":{},"zone":{},"value":'
+        suffix_format = ',"unit":{},"status":{},"building_id":{}}}'
+        line_format = '{{"timestamp":"{}",{}{}{}'.format
+
+    prefixes = [
+        prefix_format.format(quote(row.sensor_id), quote(row.sensor_type), quote(row.zone))
+        for row in attributes.itertuples()
+    ]
+    suffixes = [
+        suffix_format.format(quote(row.unit), quote(status), quote(row.building_id))
+        for row in attributes.itertuples() for status in statuses
+    ]
+    keys = (sensor_codes * len(statuses) + status_codes).tolist()
+    timestamps = format_timestamps(frame['timestamp'].to_numpy(), ' ' if output_format == 'csv' else 'T')
+    values = frame['value'].to_numpy().astype(str).tolist()
+    return [
+        line_format(timestamp, prefixes[sensor], value, suffixes[key])
+        for timestamp, sensor, value, key in zip(timestamps, sensor_codes.tolist(), values, keys)
+    ]
+
+
+def write_block(frame, path, output_format):
+    """Écrire un bloc en une fois (CSV, NDJSON ou Parquet)"""
+    if output_format == 'parquet':
+        table = pa.Table.from_pandas(
+            frame.assign(timestamp=frame['timestamp'].dt.tz_localize('UTC')), preserve_index=False
+        )
+        pq.write_table(table, path, compression='zstd')
+        return
+    lines = format_lines(frame, output_format)
+    with open(path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as handle:
+        if output_format == 'csv':
+            handle.write(','.join(CSV_FIELDS) + '\n')
+        handle.write('\n'.join(lines))
+        handle.write('\n')
+
+
+def _generate_shard(task):
+    """Tâche d'un processus : générer et écrire un bloc"""
+    rows, sensors, start, span_seconds, seed, block, path, output_format = task
+    frame = generate_block(rows, sensors, start, span_seconds, seed, block)
+    write_block(frame, path, output_format)
+    return path, rows
+
+
+def shard_paths(prefix, output_format, blocks):
+    """Fichiers de sortie : un par bloc (suffixe -part-NNNNN s'il y en a plusieurs)"""
+    extension = 'json' if output_format == 'ndjson' else output_format
+    if blocks == 1:
+        return [f"{prefix}.{extension}"]
+    return [f"{prefix}-part-{block:05d}.{extension}" for block in range(blocks)]
+
+
+def generate_fast(records, num_sensors, days, seed, output_format, prefix,
+                  workers=None, block_size=FAST_BLOCK_SIZE, end=None):
+    """
+    Générer un grand jeu de données reproductible, réparti en blocs sur plusieurs processus
+
+    Returns:
+        list: fichiers écrits
+    """
+    if output_format == 'parquet' and pq is None:
+        raise RuntimeError("Le format parquet nécessite pyarrow (pip install pyarrow)")
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    span_seconds = int(days * 86400)
+    start = end - timedelta(seconds=span_seconds)
+    sensors = build_sensor_table(num_sensors, seed)
+
+    blocks = max(1, -(-records // block_size))
+    paths = shard_paths(prefix, output_format, blocks)
+    os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+    tasks = [
+        (min(block_size, records - block * block_size), sensors, start, span_seconds, seed, block,
+         paths[block], output_format)
+        for block in range(blocks)
+    ]
+
+    started = time.time()
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for future in as_completed([pool.submit(_generate_shard, task) for task in tasks]):
+            path, rows = future.result()
+            written += rows
+            elapsed = time.time() - started
+            print(f"  ✅ {written}/{records} enregistrements ({written / elapsed:,.0f}/s) - {path}")
+    return paths
+
+
+def bulk_payload(frame):
+    """Corps _bulk d'un bloc : documents enrichis comme à l'ingestion, dans leur index journalier"""
+    frame = frame.assign(timestamp=format_timestamps(frame['timestamp'].to_numpy(), 'T'))
+    enriched = enrich_frame(frame)
+    day_codes, days = pd.factorize(enriched['@timestamp'].str[:10])
+    actions = [json.dumps({'index': {'_index': f"iot-logs-{day.replace('-', '.')}"}}) for day in days]
+    documents = enriched.to_json(orient='records', lines=True, force_ascii=False).splitlines()
+    lines = [f"{actions[day]}\n{document}" for day, document in zip(day_codes.tolist(), documents)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def tcp_payload(frame):
+    """Lignes JSON d'un bloc pour l'input TCP de Logstash (codec json_lines)"""
+    return ('\n'.join(format_lines(frame, 'ndjson')) + '\n').encode('utf-8')
+
+
+def latency_percentiles(latencies):
+    """Percentiles de latence (ms) des envois"""
+    if not latencies:
+        return {}
+    values = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'p50': round(p50, 1), 'p90': round(p90, 1), 'p99': round(p99, 1), 'max': round(values.max(), 1)}
+
+
+def _es_sender():
+    """Envoi d'un corps _bulk ; renvoie le nombre de documents refusés"""
+    es = Elasticsearch([f'http://{ES_HOST}:{ES_PORT}'], request_timeout=120)
+
+    def send(payload):
+        response = es.bulk(operations=payload, filter_path='errors,items.*.error')
+        return len(response.get('items', [])) if response.get('errors') else 0
+    return send
+
+
+def _tcp_sender():
+    """Écriture sur une connexion TCP dédiée (sans accusé de réception)"""
+    connection = socket.create_connection((LOGSTASH_HOST, LOGSTASH_PORT), timeout=30)
+
+    def send(payload):
+        connection.sendall(payload)
+        return 0
+    return send
+
+
+def stream_events(target, rate, records, duration, num_sensors, seed, senders,
+                  batch_size=STREAM_BATCH_SIZE):
+    """
+    Rejouer un trafic capteurs vers Elasticsearch (_bulk) ou Logstash (TCP)
+
+    Les lots sont générés au fil de l'eau (horodatés à l'instant présent) et
+    libérés au rythme demandé ; plusieurs threads d'envoi les consomment. Si
+    les envois ne suivent pas, la file se remplit et le débit obtenu baisse.
+
+    Args:
+        target: 'es' ou 'logstash'
+        rate: événements par seconde (0 : sans limite)
+        records: nombre total d'événements (ignoré si duration est donné)
+        duration: durée en secondes
+
+    Returns:
+        dict: événements envoyés, en échec, durée, débit obtenu et percentiles de latence
+    """
+    make_sender, build_payload = (_es_sender, bulk_payload) if target == 'es' else (_tcp_sender, tcp_payload)
+    if rate:
+        # Au moins dix libérations par seconde pour lisser le débit
+        batch_size = max(1, min(batch_size, rate // 10))
+    sensors = build_sensor_table(num_sensors, seed)
+    batches = queue.Queue(maxsize=senders * 2)
+    lock = threading.Lock()
+    totals = {'sent': 0, 'failed': 0}
+    latencies = []
+
+    def run_sender(send):
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            payload, rows = item
+            started = time.perf_counter()
+            try:
+                failed = send(payload)
+            except Exception as e:
+                print(f"  ❌ Envoi de {rows} événements échoué: {e}")
+                failed = rows
+            elapsed = time.perf_counter() - started
+            with lock:
+                totals['sent'] += rows - failed
+                totals['failed'] += failed
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=run_sender, args=(make_sender(),), daemon=True) for _ in range(senders)]
+    for thread in threads:
+        thread.start()
+
+    started = time.monotonic()
+    deadline = started + duration if duration else None
+    next_report = started + STREAM_REPORT_SECONDS
+    produced = block = 0
+    try:
+        while (deadline is None and produced < records) or (deadline is not None and time.monotonic() < deadline):
+            rows = batch_size if deadline is not None else min(batch_size, records - produced)
+            if rate:
+                delay = started + produced / rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            span = max(1, int(rows / rate)) if rate else 1
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            frame = generate_block(rows, sensors, now - timedelta(seconds=span), span, seed, block)
+            batches.put((build_payload(frame), rows))
+            produced += rows
+            block += 1
+            if time.monotonic() >= next_report:
+                next_report += STREAM_REPORT_SECONDS
+                with lock:
+                    sent, percentiles = totals['sent'], latency_percentiles(latencies)
+                print(f"  📡 {sent} événements ({sent / (time.monotonic() - started):,.0f}/s), "
+                      f"latence p50 {percentiles.get('p50')} ms, p99 {percentiles.get('p99')} ms")
+    except KeyboardInterrupt:
+        print("  ⏹️  Interrompu, vidage des lots en file...")
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+
+    seconds = time.monotonic() - started
+    return {
+        'events': totals['sent'],
+        'failed': totals['failed'],
+        'seconds': round(seconds, 2),
+        'throughput': round(totals['sent'] / seconds) if seconds else 0,
+        'requests': len(latencies),
+        'latency_ms': latency_percentiles(latencies)
+    }
+
+
+def generate_default_files(num_records):
+    """Fichiers d'exemple (CSV, JSON et alertes), générés ligne par ligne"""
     # Générer fichier CSV
-    csv_file = generate_csv_data('iot_sensors_data.csv', NUM_RECORDS)
+    csv_file = generate_csv_data('iot_sensors_data.csv', num_records)
     
     # Générer fichier JSON
-    json_file = generate_json_data('iot_sensors_data.json', NUM_RECORDS // 2)
+    json_file = generate_json_data('iot_sensors_data.json', num_records // 2)
     
     # Générer un fichier d'alertes
     alerts_file = generate_csv_data('iot_alerts.csv', 500)
+    return [csv_file, json_file, alerts_file]
+
+def parse_args(argv=None):
+    """Arguments de la ligne de commande"""
+    parser = argparse.ArgumentParser(description='Générer des données de capteurs IoT')
+    parser.add_argument('--fast', action='store_true',
+                        help='Génération vectorisée (NumPy) répartie sur plusieurs processus')
+    parser.add_argument('--stream', choices=['es', 'logstash'],
+                        help='Envoyer le trafic généré vers Elasticsearch (_bulk) ou Logstash (TCP 5000)')
+    parser.add_argument('--records', type=int, default=NUM_RECORDS, help='Nombre d\'enregistrements')
+    parser.add_argument('--sensors', type=int, default=NUM_SENSORS, help='Nombre de capteurs (modes rapide et flux)')
+    parser.add_argument('--days', type=float, default=7, help='Période couverte en jours')
+    parser.add_argument('--end', type=datetime.fromisoformat,
+                        help='Fin de la période, ex. 2026-01-31T00:00:00 (par défaut : maintenant)')
+    parser.add_argument('--seed', type=int, default=0, help='Graine (même graine, mêmes données)')
+    parser.add_argument('--format', dest='output_format', choices=['csv', 'ndjson', 'parquet'], default='csv')
+    parser.add_argument('--output', default=os.path.join(OUTPUT_DIR, 'iot_generated'),
+                        help='Préfixe des fichiers (mode rapide)')
+    parser.add_argument('--workers', type=int, help='Nombre de processus (par défaut : nombre de CPU)')
+    parser.add_argument('--block-size', type=int, default=FAST_BLOCK_SIZE, help='Lignes par bloc/fichier')
+    parser.add_argument('--rate', type=int, default=0, help='Événements par seconde en mode flux (0 : sans limite)')
+    parser.add_argument('--duration', type=float, help='Durée du flux en secondes (remplace --records)')
+    parser.add_argument('--senders', type=int, default=4, help='Threads d\'envoi concurrents en mode flux')
+    parser.add_argument('--batch-size', type=int, default=STREAM_BATCH_SIZE, help='Événements par requête en mode flux')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Fonction principale"""
+    args = parse_args(argv)
+    print("🚀 Démarrage de la génération de données IoT pour Smart Building")
+    print("=" * 70)
+    
+    if args.stream:
+        print(f"📡 Flux vers {args.stream} : {args.rate or 'max'} événements/s, {args.sensors} capteurs, "
+              f"{args.senders} threads d'envoi")
+        result = stream_events(
+            args.stream, args.rate, args.records, args.duration, args.sensors, args.seed,
+            args.senders, batch_size=args.batch_size
+        )
+        latency = result['latency_ms']
+        print("=" * 70)
+        print(f"✅ {result['events']} événements en {result['seconds']}s ({result['throughput']:,}/s), "
+              f"{result['failed']} en échec, {result['requests']} requêtes")
+        if latency:
+            print(f"⏱️  Latence par requête (ms) : p50 {latency['p50']}, p90 {latency['p90']}, "
+                  f"p99 {latency['p99']}, max {latency['max']}")
+        return
+    if args.fast:
+        started = time.time()
+        files = generate_fast(
+            args.records, args.sensors, args.days, args.seed, args.output_format, args.output,
+            workers=args.workers, block_size=args.block_size, end=args.end
+        )
+        print(f"⏱️  {args.records} enregistrements en {time.time() - started:.1f}s")
+    else:
+        files = generate_default_files(args.records)
     
     print("=" * 70)
     print("✅ Génération terminée!")
     print(f"\nFichiers créés:")
-    print(f"  - {csv_file}")
-    print(f"  - {json_file}")
-    print(f"  - {alerts_file}")
+    for path in files[:10]:
+        print(f"  - {path}")
+    if len(files) > 10:
+        print(f"  ... ({len(files)} fichiers)")
     print("\n📊 Vous pouvez maintenant uploader ces fichiers via l'interface web")
 
 if __name__ == '__main__':
@@ -7,6 +7,8 @@ from elasticsearch import Elasticsearch
 import json
 import time
 import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 # Connexion à Elasticsearch
 ES_HOST = os.getenv('ELASTICSEARCH_HOST', 'localhost')
@@ -97,6 +99,16 @@ def create_index_template(es):
     except Exception as e:
         print(f"❌ Erreur lors de la création du template: {e}")
 
+def create_rollup_template(es):
+    """Créer le template des index de rollup (iot-rollup-*)"""
+    from app.services.rollups import ensure_rollup_template, ROLLUP_TEMPLATE_NAME
+    
+    try:
+        ensure_rollup_template(es)
+        print(f"✅ Template d'index '{ROLLUP_TEMPLATE_NAME}' créé avec succès")
+    except Exception as e:
+        print(f"❌ Erreur lors de la création du template de rollup: {e}")
+
 def create_initial_index(es):
     """Créer un index initial pour tester"""
     from datetime import datetime
@@ -175,6 +187,7 @@ def main():
         
         # Créer le template d'index
         create_index_template(es)
+        create_rollup_template(es)
         
         # Créer l'index initial
         create_initial_index(es)
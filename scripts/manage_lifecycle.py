@@ -0,0 +1,112 @@
+"""
+Cycle de vie des index iot-logs-*
+Rapport (par défaut, sans modification) ou application du plan : jours
+clos en lecture seule, shards réduits, un segment par shard, snapshot et
+suppression au-delà de la rétention
+
+Usage:
+    python scripts/manage_lifecycle.py [--measure]
+    python scripts/manage_lifecycle.py --apply [--retention-days 90]
+    python scripts/manage_lifecycle.py --install-policy [--snapshot-policy nightly]
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from elasticsearch import Elasticsearch
+
+from app.services.lifecycle import (
+    run_lifecycle, install_lifecycle_policy, LIFECYCLE_POLICY_NAME, LIFECYCLE_MAX_INDEX_SIZE,
+    LIFECYCLE_REQUEST_TIMEOUT
+)
+
+ES_HOST = os.getenv('ELASTICSEARCH_HOST', 'localhost')
+ES_PORT = int(os.getenv('ELASTICSEARCH_PORT', 9200))
+
+
+def format_size(size):
+    """Taille lisible"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def print_report(report, measure):
+    """Afficher le rapport par index"""
+    header = f"{'index':<36} {'phase':<9} {'docs':>10} {'taille':>9} {'seg':>5} {'sh':>3} {'ro':>3}"
+    if measure:
+        header += f" {'ms':>6}"
+    print(header + "  actions")
+    for entry in report:
+        line = (
+            f"{entry['index']:<36} {entry['phase']:<9} {entry['docs']:>10} "
+            f"{format_size(entry['size_bytes']):>9} {entry['segments']:>5} {entry['shards']:>3} "
+            f"{'oui' if entry['read_only'] else '-':>3}"
+        )
+        if measure:
+            line += f" {entry['query_ms']:>6}"
+        actions = ', '.join(
+            f"{action} ✓" if action in entry['done'] else action for action in entry['actions']
+        )
+        line += f"  {actions or '-'}"
+        if entry['oversized']:
+            line += f"  ⚠️  > {format_size(LIFECYCLE_MAX_INDEX_SIZE)}"
+        if entry['error']:
+            line += f"  ❌ {entry['error']}"
+        print(line)
+
+    total_size = sum(entry['size_bytes'] for entry in report)
+    total_segments = sum(entry['segments'] for entry in report)
+    pending = sum(len(entry['actions']) - len(entry['done']) for entry in report)
+    print(f"\n📊 {len(report)} index, {format_size(total_size)}, {total_segments} segment(s), "
+          f"{pending} action(s) en attente")
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Cycle de vie des index iot-logs-*')
+    parser.add_argument('--apply', action='store_true', help='Appliquer le plan (par défaut : rapport seul)')
+    parser.add_argument('--measure', action='store_true', help='Mesurer le coût d\'une agrégation par index')
+    parser.add_argument('--warm-after-days', type=int, help='Jours avant passage en lecture seule')
+    parser.add_argument('--retention-days', type=int, help='Jours de rétention avant suppression')
+    parser.add_argument('--install-policy', action='store_true',
+                        help=f"Installer la politique ILM '{LIFECYCLE_POLICY_NAME}' (gestion par Elasticsearch)")
+    parser.add_argument('--snapshot-policy', help='Politique SLM attendue avant suppression (avec --install-policy)')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🗂️  Cycle de vie des index" + ("" if args.apply or args.install_policy else " (dry-run)"))
+    print("=" * 70)
+
+    try:
+        es = Elasticsearch([f'http://{ES_HOST}:{ES_PORT}'], request_timeout=LIFECYCLE_REQUEST_TIMEOUT, max_retries=0)
+        started = time.time()
+        if args.install_policy:
+            count = install_lifecycle_policy(es, snapshot_policy=args.snapshot_policy)
+            print(f"✅ Politique '{LIFECYCLE_POLICY_NAME}' installée ({count} index existant(s) rattaché(s))")
+            return 0
+
+        report = run_lifecycle(
+            es,
+            dry_run=not args.apply,
+            measure=args.measure,
+            warm_after_days=args.warm_after_days,
+            retention_days=args.retention_days
+        )
+        print_report(report, args.measure)
+        print(f"⏱️  Terminé en {time.time() - started:.1f}s")
+        if any(entry['error'] for entry in report):
+            return 1
+    except Exception as e:
+        print(f"\n❌ Erreur: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Reconstruction des rollups horaires et journaliers
+Recalcule les index iot-rollup-* depuis iot-logs-* (tout l'historique ou
+une période), par exemple après activation de ROLLUPS_ENABLED ou après
+des écritures qui ne mettent pas les rollups à jour (Logstash : input TCP
+et dossier de dépôt, generate_iot_data.py --stream)
+
+Usage:
+    python scripts/rebuild_rollups.py [--from 2025-01-01] [--to 2025-12-31]
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from elasticsearch import Elasticsearch
+
+from app.services.rollups import rebuild_rollups
+
+ES_HOST = os.getenv('ELASTICSEARCH_HOST', 'localhost')
+ES_PORT = int(os.getenv('ELASTICSEARCH_PORT', 9200))
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Reconstruire les rollups depuis iot-logs-*')
+    parser.add_argument('--from', dest='date_from', help='Début de la période (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', help='Fin de la période (YYYY-MM-DD)')
+    parser.add_argument('--page-size', type=int, default=1000, help='Buckets par page d\'agrégation')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🔄 Reconstruction des rollups")
+    print("=" * 70)
+
+    try:
+        es = Elasticsearch([f'http://{ES_HOST}:{ES_PORT}'], request_timeout=300)
+        started = time.time()
+        written = rebuild_rollups(es, args.date_from, args.date_to, page_size=args.page_size)
+        for granularity, count in written.items():
+            print(f"✅ {count} rollup(s) {granularity}")
+        print(f"⏱️  Terminé en {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"\n❌ Erreur: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
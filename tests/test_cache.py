@@ -0,0 +1,266 @@
+"""
+Unit tests for the route cache and its in-process tier
+"""
+import time
+
+import fakeredis
+import pytest
+import redis
+from flask import Flask, jsonify
+from flask_login import LoginManager
+
+from app.services import redis_cache
+from app.services.local_cache import LocalCache, TierCounters
+from app.services.redis_cache import (
+    _is_fresh, bump_tags, cached, cached_route, clear_cache, count_cached_keys, KEY_INDEX_PREFIX
+)
+
+
+class TestLocalCache:
+    """Test the L1 LRU cache"""
+
+    def test_get_returns_stored_value(self):
+        """Test basic set/get"""
+        cache = LocalCache(max_entries=10, max_bytes=1000, max_ttl=60)
+        cache.set("a", b"{}", 2, ttl=60)
+        assert cache.get("a") == b"{}"
+        assert cache.get("missing") is None
+
+    def test_least_recently_used_is_evicted(self):
+        """Test eviction by entry count"""
+        cache = LocalCache(max_entries=2, max_bytes=1000, max_ttl=60)
+        cache.set("a", b"1", 1, ttl=60)
+        cache.set("b", b"2", 1, ttl=60)
+        cache.get("a")
+        cache.set("c", b"3", 1, ttl=60)
+        assert cache.get("a") == b"1"
+        assert cache.get("b") is None
+
+    def test_byte_budget(self):
+        """Test eviction by total size"""
+        cache = LocalCache(max_entries=10, max_bytes=10, max_ttl=60)
+        cache.set("a", b"x" * 6, 6, ttl=60)
+        cache.set("b", b"y" * 6, 6, ttl=60)
+        assert cache.get("a") is None
+        assert cache.stats()["bytes"] == 6
+
+    def test_ttl_is_capped(self):
+        """Test that entries expire after the L1 TTL cap"""
+        cache = LocalCache(max_entries=10, max_bytes=1000, max_ttl=0.05)
+        cache.set("a", b"1", 1, ttl=3600)
+        time.sleep(0.06)
+        assert cache.get("a") is None
+
+    def test_tag_invalidation(self):
+        """Test that only entries carrying an invalidated tag are dropped"""
+        cache = LocalCache(max_entries=10, max_bytes=1000, max_ttl=60)
+        cache.set("a", b"1", 1, ttl=60, tags=["zone:zone_a"])
+        cache.set("b", b"2", 1, ttl=60, tags=["logs"])
+        cache.invalidate_tags(["zone:zone_a"])
+        assert cache.get("a") is None
+        assert cache.get("b") == b"2"
+
+
+class TestTierCounters:
+    """Test hit ratio reporting"""
+
+    def test_hit_ratios(self):
+        """Test computed ratios"""
+        counters = TierCounters()
+        for name in ["l1_hits", "l1_hits", "l1_misses", "l2_misses"]:
+            counters.incr(name)
+        stats = counters.stats()
+        assert stats["l1_hit_ratio"] == round(2 / 3, 4)
+        assert stats["l2_hit_ratio"] == 0
+
+
+class TestEarlyRefresh:
+    """Test probabilistic early expiration of single-flight entries"""
+
+    def test_entries_without_deadline_are_fresh(self):
+        """Test that plain entries rely on their Redis TTL only"""
+        assert _is_fresh({'body': '{}', 'etag': 'x'})
+
+    def test_expired_entry_is_refreshed(self):
+        """Test that an entry past its deadline is never fresh"""
+        assert not _is_fresh({'fresh_until': time.time() - 1, 'delta': 0})
+
+    def test_early_refresh_grows_with_compute_time(self):
+        """Test that expensive entries are refreshed ahead of their deadline"""
+        entry = {'fresh_until': time.time() + 5, 'delta': 0}
+        assert _is_fresh(entry)
+        entry['delta'] = 1000
+        refreshed = sum(not _is_fresh(entry) for _ in range(50))
+        assert refreshed > 40
+
+
+class FailingWrites:
+    """Redis stub whose reads miss and whose writes fail"""
+
+    def get(self, key):
+        return None
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def setex(self, *args):
+        pass
+
+    def zadd(self, *args, **kwargs):
+        pass
+
+    def zremrangebyscore(self, *args):
+        pass
+
+    def execute(self):
+        raise redis.ConnectionError('connection lost')
+
+
+class TestRedisFallback:
+    """Test the fallback when Redis fails mid-request"""
+
+    def test_result_is_not_recomputed(self, monkeypatch):
+        """Test that a write failure serves the result already computed"""
+        monkeypatch.setattr(redis_cache, 'get_redis_client', FailingWrites)
+        calls = []
+
+        @cached(ttl=60)
+        def expensive():
+            calls.append(1)
+            return {'value': len(calls)}
+
+        assert expensive() == {'value': 1}
+        assert calls == [1]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Decoding and binary clients on one in-memory Redis server"""
+    server = fakeredis.FakeServer()
+    text = fakeredis.FakeRedis(server=server, decode_responses=True)
+    binary = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(redis_cache, 'get_redis_client', lambda: text)
+    monkeypatch.setattr(redis_cache, 'get_binary_redis_client', lambda: binary)
+    monkeypatch.setattr(redis_cache, 'L1_ENABLED', False)
+    return binary
+
+
+@pytest.fixture
+def cached_client(fake_redis):
+    """Flask client exposing a cached JSON route and its call count"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    LoginManager(app).user_loader(lambda user_id: None)
+    calls = []
+
+    @app.route('/readings')
+    @cached_route(ttl=60, tags=['logs'])
+    def readings():
+        calls.append(1)
+        return jsonify({'zone': 'entrepôt', 'calls': len(calls)})
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+class TestCachedRoute:
+    """Test route entries stored as bytes and served with ETags"""
+
+    def test_body_round_trips_as_bytes(self, cached_client, fake_redis):
+        """Test that the stored body is the exact encoded response"""
+        first = cached_client.get('/readings')
+        second = cached_client.get('/readings')
+
+        assert cached_client.calls == [1]
+        assert second.data == first.data
+        assert 'entrepôt' in second.get_json()['zone']
+        key = next(key for key in fake_redis.keys('route:*'))
+        assert fake_redis.hget(key, 'body') == first.data
+
+    def test_etag_and_not_modified(self, cached_client):
+        """Test strong ETags on miss and hit, and 304 for a matching If-None-Match"""
+        first = cached_client.get('/readings')
+        etag = first.headers['ETag']
+        assert etag == f'"{redis_cache.content_etag(first.data)}"'
+        assert cached_client.get('/readings').headers['ETag'] == etag
+
+        not_modified = cached_client.get('/readings', headers={'If-None-Match': etag})
+        assert not_modified.status_code == 304
+        assert not_modified.data == b''
+        assert cached_client.get('/readings', headers={'If-None-Match': '"other"'}).status_code == 200
+
+    def test_bumped_tag_recomputes(self, cached_client):
+        """Test that a tag bump skips the stored entry"""
+        etag = cached_client.get('/readings').headers['ETag']
+        bump_tags('logs')
+
+        response = cached_client.get('/readings')
+        assert cached_client.calls == [1, 1]
+        assert response.get_json()['calls'] == 2
+        assert response.headers['ETag'] != etag
+
+
+def _cache_entries(count):
+    """Store `count` results through the cached decorator"""
+    @cached(ttl=60)
+    def square(number):
+        return number * number
+
+    for number in range(count):
+        square(number)
+
+
+class TestClearCache:
+    """Test namespace clearing, the SCAN fallback and the key indexes"""
+
+    def test_clear_namespace_from_index(self, fake_redis, cached_client, monkeypatch):
+        """Test that a namespace is cleared in batches from its index only"""
+        monkeypatch.setattr(redis_cache, 'SCAN_BATCH_SIZE', 2)
+        _cache_entries(5)
+        cached_client.get('/readings')
+        fake_redis.set('cache-unrelated', 1)
+
+        assert clear_cache('cache:*') == 5
+
+        assert fake_redis.keys('cache:*') == []
+        assert fake_redis.zcard(f"{KEY_INDEX_PREFIX}cache") == 0
+        assert fake_redis.exists('cache-unrelated')
+        assert count_cached_keys() == {'cache': 0, 'route': 1}
+
+    def test_clear_pattern_with_scan(self, fake_redis, cached_client, monkeypatch):
+        """Test that other patterns are cleared by SCAN and dropped from the index"""
+        monkeypatch.setattr(redis_cache, 'SCAN_BATCH_SIZE', 2)
+        _cache_entries(3)
+        cached_client.get('/readings')
+        cached_client.get('/readings?zone=zone_a')
+
+        assert clear_cache('route:readings:*') == 2
+
+        assert fake_redis.keys('route:*') == []
+        assert count_cached_keys() == {'cache': 3, 'route': 0}
+
+    def test_clear_everything(self, fake_redis):
+        """Test that no pattern flushes the database"""
+        _cache_entries(2)
+
+        assert clear_cache() == -1
+        assert fake_redis.dbsize() == 0
+
+    def test_expired_index_members_are_removed(self, fake_redis):
+        """Test that keys past their expiry no longer count and leave the index"""
+        _cache_entries(2)
+        index_key = f"{KEY_INDEX_PREFIX}cache"
+        fake_redis.zadd(index_key, {'cache:expired': time.time() - 1})
+
+        assert count_cached_keys() == {'cache': 2, 'route': 0}
+        assert fake_redis.zscore(index_key, 'cache:expired') is None
+
+    def test_writes_prune_expired_members(self, fake_redis):
+        """Test that tracking a new key also drops expired members"""
+        index_key = f"{KEY_INDEX_PREFIX}cache"
+        fake_redis.zadd(index_key, {'cache:expired': time.time() - 1})
+
+        _cache_entries(1)
+
+        assert fake_redis.zrange(index_key, 0, -1) == [b'cache:square:(0,):[]']
@@ -0,0 +1,268 @@
+"""
+Unit tests for the chunked upload protocol
+"""
+import copy
+import hashlib
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager, UserMixin
+from pymongo import ReturnDocument
+
+from app.routes import upload
+
+
+def _matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if '$in' in condition and value not in condition['$in']:
+                return False
+            if '$lt' in condition and not (value is not None and value < condition['$lt']):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _apply(document, update):
+    for path, value in update.get('$set', {}).items():
+        target = document
+        *parents, leaf = path.split('.')
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    for path in update.get('$unset', {}):
+        target = document
+        *parents, leaf = path.split('.')
+        for part in parents:
+            target = target.get(part, {})
+        target.pop(leaf, None)
+
+
+class FakeCollection:
+    """In-memory subset of a pymongo collection"""
+
+    def __init__(self):
+        self.documents = []
+
+    def insert_one(self, document):
+        document.setdefault('_id', f"id{len(self.documents)}")
+        self.documents.append(copy.deepcopy(document))
+        return SimpleNamespace(inserted_id=document['_id'])
+
+    def find_one(self, query):
+        for document in self.documents:
+            if _matches(document, query):
+                return copy.deepcopy(document)
+        return None
+
+    def find_one_and_update(self, query, update, return_document=ReturnDocument.BEFORE):
+        for document in self.documents:
+            if _matches(document, query):
+                before = copy.deepcopy(document)
+                _apply(document, update)
+                return copy.deepcopy(document) if return_document == ReturnDocument.AFTER else before
+        return None
+
+    def update_one(self, query, update):
+        self.find_one_and_update(query, update)
+
+
+class User(UserMixin):
+    id = 'alice'
+    username = 'alice'
+
+
+@pytest.fixture
+def mongo(tmp_path, monkeypatch):
+    """Patch the upload blueprint onto a temporary folder and fake MongoDB"""
+    fake = SimpleNamespace(upload_sessions=FakeCollection(), uploaded_files=FakeCollection())
+    submitted = []
+    monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(upload, 'STAGING_FOLDER', str(tmp_path / '.staging'))
+    monkeypatch.setattr(upload, 'get_mongodb', lambda: fake)
+    monkeypatch.setattr(upload, 'bump_tags', lambda *tags: None)
+    monkeypatch.setattr(upload, 'get_ingestion_worker',
+                        lambda: SimpleNamespace(submit=lambda *args: submitted.append(args)))
+    fake.submitted = submitted
+    return fake
+
+
+@pytest.fixture
+def client(mongo):
+    """Flask client with the upload blueprint and a logged-in user"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test-secret-key'
+    login_manager = LoginManager(app)
+    login_manager.request_loader(lambda request: User())
+    app.register_blueprint(upload.upload_bp, url_prefix='/upload')
+    return app.test_client()
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _initiate(client, total_size, chunk_size=4):
+    response = client.post('/upload/chunked', json={
+        'filename': 'sensors.csv', 'total_size': total_size, 'chunk_size': chunk_size
+    })
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def _put(client, upload_id, index, data, checksum=None):
+    return client.put(f'/upload/chunked/{upload_id}/{index}', data=data,
+                      headers={'X-Chunk-Checksum': checksum or _sha256(data)})
+
+
+PAYLOAD = b'timestamp,value\n1,2\n'
+
+
+class TestChunkedUpload:
+    """Test the initiate / chunk / complete round trip"""
+
+    def test_round_trip(self, client, mongo):
+        """Test that chunks sent out of order are assembled into the uploaded file"""
+        upload_id = _initiate(client, len(PAYLOAD))
+        chunks = [PAYLOAD[i:i + 4] for i in range(0, len(PAYLOAD), 4)]
+        for index in reversed(range(len(chunks))):
+            assert _put(client, upload_id, index, chunks[index]).status_code == 200
+
+        response = client.post(f'/upload/chunked/{upload_id}/complete', json={'sha256': _sha256(PAYLOAD)})
+
+        assert response.status_code == 201
+        stored = mongo.uploaded_files.documents[0]
+        assert stored['sha256'] == _sha256(PAYLOAD)
+        with open(stored['filepath'], 'rb') as handle:
+            assert handle.read() == PAYLOAD
+        assert not os.path.exists(os.path.join(upload.STAGING_FOLDER, upload_id))
+        assert mongo.submitted == [(stored['_id'], stored['filepath'])]
+        assert mongo.upload_sessions.find_one({'upload_id': upload_id})['status'] == 'completed'
+
+    def test_missing_chunks_block_completion(self, client):
+        """Test that completion lists the chunks still to send"""
+        upload_id = _initiate(client, len(PAYLOAD))
+        _put(client, upload_id, 0, PAYLOAD[:4])
+
+        response = client.post(f'/upload/chunked/{upload_id}/complete')
+
+        assert response.status_code == 409
+        assert response.get_json()['missing_chunks'] == [1, 2, 3, 4]
+
+    def test_rejected_retry_keeps_verified_chunk(self, client, mongo):
+        """Test that a retry failing its size or checksum check leaves the accepted chunk intact"""
+        upload_id = _initiate(client, len(PAYLOAD))
+        for index in range(0, len(PAYLOAD), 4):
+            assert _put(client, upload_id, index // 4, PAYLOAD[index:index + 4]).status_code == 200
+
+        assert _put(client, upload_id, 0, b'XXXX', checksum=_sha256(b'YYYY')).status_code == 422
+        assert _put(client, upload_id, 0, b'XX').status_code == 400
+
+        response = client.post(f'/upload/chunked/{upload_id}/complete')
+        assert response.status_code == 201
+        with open(mongo.uploaded_files.documents[0]['filepath'], 'rb') as handle:
+            assert handle.read() == PAYLOAD
+        assert os.listdir(upload.STAGING_FOLDER) == []
+
+    def test_corrupted_chunk_detected_at_completion(self, client, mongo):
+        """Test that a chunk altered on disk is re-requested instead of being assembled"""
+        upload_id = _initiate(client, len(PAYLOAD))
+        for index in range(0, len(PAYLOAD), 4):
+            _put(client, upload_id, index // 4, PAYLOAD[index:index + 4])
+        with open(os.path.join(upload.STAGING_FOLDER, upload_id, '2.chunk'), 'wb') as handle:
+            handle.write(b'oops')
+
+        response = client.post(f'/upload/chunked/{upload_id}/complete')
+
+        assert response.status_code == 409
+        assert response.get_json()['missing_chunks'] == [2]
+        assert mongo.uploaded_files.documents == []
+        session = mongo.upload_sessions.find_one({'upload_id': upload_id})
+        assert session['status'] == 'uploading'
+        assert '2' not in session['chunks']
+
+        assert _put(client, upload_id, 2, PAYLOAD[8:12]).status_code == 200
+        assert client.post(f'/upload/chunked/{upload_id}/complete').status_code == 201
+
+    def test_file_checksum_mismatch_reopens_session(self, client, mongo):
+        """Test that a whole-file digest mismatch keeps the session open"""
+        upload_id = _initiate(client, 4)
+        _put(client, upload_id, 0, PAYLOAD[:4])
+
+        response = client.post(f'/upload/chunked/{upload_id}/complete', json={'sha256': _sha256(b'other')})
+
+        assert response.status_code == 422
+        assert mongo.upload_sessions.find_one({'upload_id': upload_id})['status'] == 'uploading'
+
+    def test_chunk_after_completion_is_refused(self, client):
+        """Test that a late chunk cannot write into a finalized upload"""
+        upload_id = _initiate(client, 4)
+        _put(client, upload_id, 0, PAYLOAD[:4])
+        assert client.post(f'/upload/chunked/{upload_id}/complete').status_code == 201
+
+        assert _put(client, upload_id, 0, PAYLOAD[:4]).status_code == 409
+
+    def test_chunk_accepted_only_while_uploading(self, client, mongo):
+        """Test that a chunk verified after the session left "uploading" is discarded"""
+        upload_id = _initiate(client, 4)
+        original = mongo.upload_sessions.find_one_and_update
+
+        def finalize_first(query, update, **kwargs):
+            mongo.upload_sessions.documents[0]['status'] = 'assembling'
+            return original(query, update, **kwargs)
+
+        mongo.upload_sessions.find_one_and_update = finalize_first
+
+        assert _put(client, upload_id, 0, PAYLOAD[:4]).status_code == 409
+        assert os.listdir(os.path.join(upload.STAGING_FOLDER, upload_id)) == []
+
+    def test_total_size_is_capped(self, client, monkeypatch):
+        """Test that oversized uploads are refused before any staging file is created"""
+        monkeypatch.setattr(upload, 'MAX_TOTAL_SIZE', 10)
+
+        response = client.post('/upload/chunked', json={'filename': 'sensors.csv', 'total_size': 11})
+
+        assert response.status_code == 413
+        assert not os.path.exists(upload.STAGING_FOLDER)
+
+
+class TestUploadSessionExpiry:
+    """Test expiry of abandoned chunked uploads"""
+
+    def test_abandoned_session_expires(self, client, mongo):
+        """Test that an idle session is expired and its chunks removed"""
+        upload_id = _initiate(client, len(PAYLOAD))
+        _put(client, upload_id, 0, PAYLOAD[:4])
+        later = datetime.now() + timedelta(seconds=upload.UPLOAD_SESSION_TTL + 1)
+
+        assert upload.expire_upload_sessions(mongo, now=later) == 1
+
+        assert mongo.upload_sessions.find_one({'upload_id': upload_id})['status'] == 'expired'
+        assert not os.path.exists(os.path.join(upload.STAGING_FOLDER, upload_id))
+        assert _put(client, upload_id, 1, PAYLOAD[4:8]).status_code == 409
+
+    def test_active_session_is_kept(self, client, mongo):
+        """Test that a session still receiving chunks is not expired"""
+        upload_id = _initiate(client, len(PAYLOAD))
+
+        assert upload.expire_upload_sessions(mongo) == 0
+        assert os.path.isdir(os.path.join(upload.STAGING_FOLDER, upload_id))
+
+    def test_orphan_staging_files_are_removed(self, client, mongo):
+        """Test that old staging files without an active session are swept"""
+        os.makedirs(upload.STAGING_FOLDER)
+        orphan = os.path.join(upload.STAGING_FOLDER, 'deadbeef.part')
+        with open(orphan, 'wb') as handle:
+            handle.write(b'partial')
+        old = (datetime.now() - timedelta(seconds=upload.UPLOAD_SESSION_TTL + 60)).timestamp()
+        os.utime(orphan, (old, old))
+
+        upload.expire_upload_sessions(mongo)
+
+        assert not os.path.exists(orphan)
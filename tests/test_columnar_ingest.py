@@ -0,0 +1,88 @@
+"""
+Unit tests for Parquet / Arrow IPC ingestion
+"""
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.feather as feather  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+from app.services.columnar_ingest import batch_frame, iter_record_batches  # noqa: E402
+from app.services.enrichment import enrich_records  # noqa: E402
+from app.services.ingestion import IngestionWorker  # noqa: E402
+from app.services.rollups import PendingRollups, RollupAccumulator  # noqa: E402
+
+ROWS = [
+    {'timestamp': '2026-03-01T10:15:00', 'sensor_id': 'TEMP_zone_a_1', 'sensor_type': 'temperature',
+     'zone': 'zone_a', 'value': 31.5, 'unit': '°C', 'status': 'alert', 'building_id': 'Building_A'},
+    {'timestamp': '2026-03-02T23:59:59', 'sensor_id': 'CO2_zone_c_2', 'sensor_type': 'co2',
+     'zone': 'zone_c', 'value': 900.0, 'unit': 'ppm', 'status': 'warning', 'building_id': 'Building_B'}
+]
+
+
+def sample_table(rows=ROWS, repeat=50):
+    """Arrow table with dated timestamps and a dictionary-encoded column"""
+    frame = pd.DataFrame(rows * repeat)
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'])
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    return table.set_column(2, 'sensor_type', table['sensor_type'].dictionary_encode())
+
+
+def columnar_actions(path):
+    """Bulk actions produced by the ingestion worker for a file"""
+    progress = {'bytes': 0}
+    rollups = PendingRollups(RollupAccumulator())
+    actions = list(IngestionWorker()._actions('file', str(path), progress, set(), threading.Lock(), rollups))
+    for action in actions:
+        rollups.done(action['_id'], True)
+    daily = sum(summary['count'] for (granularity, _, _), summary in rollups.accumulator.summaries.items()
+                if granularity == 'daily')
+    assert daily == len(actions)
+    return actions, progress
+
+
+class TestColumnarRead:
+    """Test memory-mapped batch reading"""
+
+    def test_parquet_batches(self, tmp_path):
+        """Test batch sizes and progress over a Parquet file"""
+        path = tmp_path / 'logs.parquet'
+        pq.write_table(sample_table(), path)
+        progress = {'bytes': 0}
+        batches = list(iter_record_batches(str(path), progress, batch_size=40))
+        assert [batch.num_rows for batch in batches] == [40, 40, 20]
+        assert progress['bytes'] == path.stat().st_size
+
+    def test_mapping_types(self):
+        """Test that dictionaries are decoded and keyword fields become strings"""
+        table = sample_table().set_column(7, 'building_id', pa.array(range(100)))
+        frame = batch_frame(table.to_batches()[0])
+        assert frame['sensor_type'].tolist()[:2] == ['temperature', 'co2']
+        assert frame['building_id'].tolist()[:2] == ['0', '1']
+
+
+class TestColumnarIngestion:
+    """Test bulk actions built from columnar files"""
+
+    @pytest.mark.parametrize('extension', ['parquet', 'arrow'])
+    def test_sources_match_row_enrichment(self, tmp_path, extension):
+        """Test that serialized sources equal the per-document enrichment"""
+        path = tmp_path / f'logs.{extension}'
+        if extension == 'parquet':
+            pq.write_table(sample_table(), path)
+        else:
+            feather.write_feather(sample_table(), str(path))
+        actions, progress = columnar_actions(path)
+        assert len(actions) == 100
+        assert progress['bytes'] == path.stat().st_size
+        expected = enrich_records([dict(row) for row in ROWS])
+        for action, document in zip(actions[:2], expected):
+            source = json.loads(action['_source'])
+            for field in ('@timestamp', 'value', 'status', 'alert_level', 'location', 'pipeline_version'):
+                assert source.get(field) == document.get(field)
+            assert action['_index'] == f"iot-logs-{document['@timestamp'][:10].replace('-', '.')}"
+        assert [action['_id'] for action in actions[:2]] == ['file-0', 'file-1']
@@ -0,0 +1,133 @@
+"""
+Unit tests for the shared Redis connection pool
+"""
+import threading
+
+import fakeredis
+import pytest
+import redis
+
+from app.services import database
+from app.services.database import InstrumentedConnectionPool, create_redis_pool, get_redis_pool_stats
+
+# Renamed in recent fakeredis releases
+FakeConnection = getattr(fakeredis, 'FakeRedisConnection', fakeredis.FakeConnection)
+
+
+@pytest.fixture
+def pool():
+    """Instrumented pool of two in-memory connections"""
+    return InstrumentedConnectionPool(
+        connection_class=FakeConnection, server=fakeredis.FakeServer(),
+        max_connections=2, timeout=0.5
+    )
+
+
+class TestInstrumentedConnectionPool:
+    """Test the checkout counters of the pool"""
+
+    def test_counts_checkouts_and_releases(self, pool):
+        """Test checkouts, connections in use and their peak"""
+        client = redis.Redis(connection_pool=pool)
+        client.set('reading', 1)
+        client.get('reading')
+
+        first = pool.get_connection()
+        second = pool.get_connection()
+        stats = pool.stats()
+        assert (stats['checkouts'], stats['in_use'], stats['peak_in_use']) == (4, 2, 2)
+        assert stats['saturated'] is True
+
+        pool.release(first)
+        pool.release(second)
+        stats = pool.stats()
+        assert (stats['in_use'], stats['peak_in_use'], stats['saturated']) == (0, 2, False)
+
+    def test_records_waits_for_a_free_connection(self, pool):
+        """Test that a checkout blocked on a saturated pool is counted as waited"""
+        held = [pool.get_connection(), pool.get_connection()]
+        waited_before = pool.stats()['waited_checkouts']
+        releaser = threading.Timer(0.1, pool.release, args=(held.pop(),))
+        releaser.start()
+
+        connection = pool.get_connection()
+        releaser.join()
+
+        stats = pool.stats()
+        assert stats['waited_checkouts'] == waited_before + 1
+        assert stats['max_wait_ms'] >= 50
+        assert stats['avg_wait_ms'] > 0
+        pool.release(connection)
+        pool.release(held.pop())
+
+    def test_counts_checkout_errors(self, pool):
+        """Test that a checkout timing out on a saturated pool is counted as an error"""
+        pool.timeout = 0.05
+        held = [pool.get_connection(), pool.get_connection()]
+
+        with pytest.raises(redis.ConnectionError):
+            pool.get_connection()
+
+        stats = pool.stats()
+        assert (stats['checkout_errors'], stats['checkouts'], stats['in_use']) == (1, 2, 2)
+        for connection in held:
+            pool.release(connection)
+
+
+class TestCreateRedisPool:
+    """Test the pool settings read from the environment"""
+
+    def test_settings_from_environment(self, monkeypatch):
+        """Test that every REDIS_* variable reaches the pool"""
+        for name, value in {
+            'REDIS_HOST': 'cache', 'REDIS_PORT': '6380', 'REDIS_DB': '2', 'REDIS_PASSWORD': 'secret',
+            'REDIS_MAX_CONNECTIONS': '7', 'REDIS_POOL_TIMEOUT': '0.5', 'REDIS_SOCKET_TIMEOUT': '1.5',
+            'REDIS_SOCKET_CONNECT_TIMEOUT': '3', 'REDIS_HEALTH_CHECK_INTERVAL': '10'
+        }.items():
+            monkeypatch.setenv(name, value)
+
+        pool = create_redis_pool()
+
+        kwargs = pool.connection_kwargs
+        assert (pool.max_connections, pool.timeout) == (7, 0.5)
+        assert (kwargs['host'], kwargs['port'], kwargs['db'], kwargs['password']) == ('cache', 6380, 2, 'secret')
+        assert (kwargs['socket_timeout'], kwargs['socket_connect_timeout']) == (1.5, 3.0)
+        assert kwargs['health_check_interval'] == 10
+        assert kwargs['decode_responses'] is True
+
+    def test_defaults_and_explicit_server(self, monkeypatch):
+        """Test the defaults and the host/port arguments used by the fallback"""
+        for name in ('REDIS_PASSWORD', 'REDIS_MAX_CONNECTIONS', 'REDIS_POOL_TIMEOUT', 'REDIS_DB'):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv('REDIS_HOST', 'redis')
+
+        pool = create_redis_pool('localhost', 6379, decode_responses=False)
+
+        kwargs = pool.connection_kwargs
+        assert (kwargs['host'], kwargs['port'], kwargs['db'], kwargs['password']) == ('localhost', 6379, 0, None)
+        assert (pool.max_connections, pool.timeout) == (50, 2.0)
+        assert kwargs['decode_responses'] is False
+
+
+class TestPoolStats:
+    """Test the pool metrics exposed by get_redis_pool_stats"""
+
+    def test_no_pool_yet(self, monkeypatch):
+        """Test that stats are empty before the pool exists"""
+        monkeypatch.setattr(database, 'redis_pool', None)
+        assert get_redis_pool_stats() == {}
+
+    def test_includes_binary_pool(self, monkeypatch, pool):
+        """Test that the route cache pool is reported next to the shared pool"""
+        monkeypatch.setattr(database, 'redis_pool', pool)
+        monkeypatch.setattr(database, 'redis_binary_client', None)
+        redis.Redis(connection_pool=pool).ping()
+        assert get_redis_pool_stats()['checkouts'] == 1
+        assert 'binary' not in get_redis_pool_stats()
+
+        binary = redis.Redis(connection_pool=InstrumentedConnectionPool(
+            connection_class=FakeConnection, server=fakeredis.FakeServer(), max_connections=1
+        ))
+        monkeypatch.setattr(database, 'redis_binary_client', binary)
+        binary.ping()
+        assert get_redis_pool_stats()['binary']['checkouts'] == 1
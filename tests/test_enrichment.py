@@ -0,0 +1,157 @@
+"""
+Unit tests for the shared enrichment rule table
+"""
+import copy
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from app.services.enrichment import (
+    classify, enrich_frame, enrich_record, enrich_records, frame_documents, frame_json, parse_timestamp,
+    RULES_VERSION, SENSOR_RULES
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts'))
+
+from build_logstash_conf import CONF_PATH, build_conf, render_rules  # noqa: E402
+
+
+def comparable(document):
+    """Document without volatile or null fields"""
+    return {
+        key: value for key, value in document.items()
+        if value is not None and key != 'ingestion_timestamp'
+    }
+
+
+class TestRules:
+    """Test threshold evaluation"""
+
+    def test_first_matching_rule_wins(self):
+        """Test ordered thresholds and the normal default"""
+        assert classify('co2', 1200, 'status') == ('critical', None)
+        assert classify('co2', 900, 'status') == ('warning', None)
+        assert classify('co2', 500, 'status') == ('normal', None)
+        assert classify('temperature', 31, 'alert_level') == ('high', 'Température élevée détectée')
+
+    def test_missing_rules(self):
+        """Test types without alert rules and missing values"""
+        assert classify('energy', 3, 'alert_level') == (None, None)
+        assert classify('energy', 3, 'status') == ('normal', None)
+        assert classify('co2', None, 'status') == (None, None)
+
+
+class TestParseTimestamp:
+    """Test timestamp parsing for string and numeric inputs"""
+
+    def test_epoch_seconds_and_milliseconds(self):
+        """Test that numeric epochs are read as seconds or milliseconds"""
+        expected = datetime(2023, 11, 14, 22, 13, 20, tzinfo=timezone.utc)
+        assert parse_timestamp(1700000000) == expected
+        assert parse_timestamp(1700000000.0) == expected
+        assert parse_timestamp(1700000000000) == expected
+
+    def test_non_string_values_fail_to_parse(self):
+        """Test that unsupported types return None instead of raising"""
+        assert parse_timestamp(True) is None
+        assert parse_timestamp(['2025-12-30']) is None
+        assert parse_timestamp('   ') is None
+
+    def test_enrich_record_with_numeric_timestamp(self):
+        """Test that enrich_record accepts an epoch timestamp"""
+        record = enrich_record({'timestamp': 1700000000, 'sensor_type': 'temperature', 'value': 20})
+        assert record['@timestamp'] == '2023-11-14T22:13:20+00:00'
+        assert '_dateparsefailure' not in record.get('tags', [])
+
+    def test_enrich_record_with_unparseable_type(self):
+        """Test that other types take the _dateparsefailure path"""
+        record = enrich_record({'timestamp': {'at': 1}, 'sensor_type': 'temperature', 'value': 20})
+        assert '_dateparsefailure' in record['tags']
+
+
+class TestBatchEnrichment:
+    """Test that column operations match per-record enrichment"""
+
+    RECORDS = [
+        {'timestamp': '2025-12-30 11:57:12', 'sensor_id': ' TEMP_1 ', 'sensor_type': 'temperature',
+         'zone': 'zone_a', 'value': '31.2', 'unit': '', 'status': ''},
+        {'timestamp': '2025-12-30T11:57:12.966804', 'sensor_type': 'co2', 'zone': 'zone_c',
+         'value': 1200, 'status': 'critical'},
+        {'@timestamp': '2025-12-30T13:00:00+02:00', 'sensor_type': 'humidity', 'value': 25.5},
+        {'timestamp': 'yesterday', 'sensor_type': 'energy', 'zone': 'zone_b', 'value': 'n/a'},
+        {'timestamp': '2025-12-31 00:00:00', 'sensor_type': 'pressure', 'value': '1013.25'}
+    ]
+
+    def test_frame_matches_records(self):
+        """Test field-by-field equality with enrich_record"""
+        expected = [enrich_record(copy.deepcopy(record)) for record in self.RECORDS]
+        actual = frame_documents(enrich_frame(pd.DataFrame.from_records(copy.deepcopy(self.RECORDS))))
+        for wanted, got in zip(expected, actual):
+            if '_dateparsefailure' in wanted.get('tags', []):
+                # Horodatage de repli : instant de l'enrichissement
+                wanted.pop('@timestamp')
+                got.pop('@timestamp')
+            assert comparable(got) == comparable(wanted)
+
+    MIXED_RECORDS = [
+        {'timestamp': 1700000000, 'sensor_type': 'temperature', 'zone': 'zone_a', 'value': 20},
+        {'timestamp': 1700000000123, 'sensor_type': 'co2', 'value': '900'},
+        {'timestamp': 1700000000.5, 'sensor_type': 'humidity', 'value': 25.5},
+        {'timestamp': '2025-12-30 11:57:12', 'sensor_type': 'energy', 'value': 3},
+        {'timestamp': True, 'sensor_type': 'pressure', 'value': 1013}
+    ]
+
+    def test_mixed_timestamp_types_match_records(self):
+        """Test that numeric and string timestamps agree between record and frame paths"""
+        records = self.MIXED_RECORDS * 13
+        expected = [enrich_record(copy.deepcopy(record)) for record in records]
+        actual = frame_documents(enrich_frame(pd.DataFrame.from_records(copy.deepcopy(records))))
+        for wanted, got in zip(expected, actual):
+            if '_dateparsefailure' in wanted.get('tags', []):
+                wanted.pop('@timestamp')
+                got.pop('@timestamp')
+            assert comparable(got) == comparable(wanted)
+        assert len(enrich_records(copy.deepcopy(records))) == len(records)
+
+    def test_json_matches_documents(self):
+        """Test that frame_json omits missing fields like frame_documents"""
+        frame = enrich_frame(pd.DataFrame.from_records(copy.deepcopy(self.RECORDS + self.MIXED_RECORDS)))
+        documents = [json.loads(line) for line in frame_json(frame)]
+        assert documents == json.loads(json.dumps(frame_documents(frame)))
+        assert 'zone' not in documents[2] and 'value' not in documents[3]
+
+    def test_filled_fields(self):
+        """Test status/unit filling, timestamps and location"""
+        documents = enrich_records(copy.deepcopy(self.RECORDS) * 20)
+        first, _, humidity, energy, pressure = documents[:5]
+        assert first['@timestamp'] == '2025-12-30T11:57:12+00:00'
+        assert (first['status'], first['unit'], first['alert_level']) == ('alert', '°C', 'high')
+        assert first['location'] == {'lat': 48.8566, 'lon': 2.3522}
+        assert humidity['@timestamp'] == '2025-12-30T11:00:00+00:00'
+        assert humidity['status'] == 'warning'
+        assert 'value' not in energy and energy['tags'] == ['_dateparsefailure']
+        assert (pressure['status'], 'unit' in pressure) == ('normal', False)
+        assert documents[0]['pipeline_version'] == RULES_VERSION
+
+
+class TestLogstashRules:
+    """Test the Logstash filter generated from the rule table"""
+
+    def test_conf_is_up_to_date(self):
+        """Test that logstash.conf carries the block generated from SENSOR_RULES"""
+        with open(CONF_PATH, encoding='utf-8') as handle:
+            conf = handle.read()
+        assert build_conf(conf) == conf
+
+    def test_every_threshold_is_rendered(self):
+        """Test that each rule and the rules version appear in the generated block"""
+        block = render_rules()
+        for sensor_type, rules in SENSOR_RULES.items():
+            assert f'if [sensor_type] == "{sensor_type}"' in block
+            for op, threshold, label, *_ in rules.get('alert_level', []) + rules.get('status', []):
+                assert f"[value] {op} {threshold} {{" in block
+                assert f'=> "{label}"' in block
+        assert f'"pipeline_version" => "{RULES_VERSION}"' in block
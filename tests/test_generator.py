@@ -0,0 +1,90 @@
+"""
+Unit tests for the vectorized data generator
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts'))
+
+from generate_iot_data import (  # noqa: E402
+    build_sensor_table, bulk_payload, format_lines, generate_block, latency_percentiles
+)
+from app.services.enrichment import classify, unit_for  # noqa: E402
+
+START = datetime(2026, 1, 1)
+
+
+def block(seed=3, number=0, rows=5000):
+    """Generate one block over a week"""
+    return generate_block(rows, build_sensor_table(20, seed), START, 7 * 86400, seed, number)
+
+
+class TestGenerateBlock:
+    """Test block generation"""
+
+    def test_blocks_are_reproducible(self):
+        """Test that a block only depends on the seed and its number"""
+        assert block().equals(block())
+        assert not block(number=1)['value'].equals(block(number=0)['value'])
+
+    def test_status_and_unit_follow_rules(self):
+        """Test that generated statuses match the enrichment rules"""
+        frame = block()
+        for row in frame.sample(200, random_state=0).itertuples():
+            assert row.status == classify(row.sensor_type, row.value, 'status')[0]
+            assert row.unit == unit_for(row.sensor_type)
+        assert frame['timestamp'].between(np.datetime64(START), np.datetime64('2026-01-08')).all()
+
+
+class TestFormatLines:
+    """Test text output of a block"""
+
+    def test_ndjson_lines_match_frame(self):
+        """Test that each NDJSON line decodes to its row"""
+        frame = block(rows=100)
+        for line, row in zip(format_lines(frame, 'ndjson'), frame.itertuples()):
+            document = json.loads(line)
+            assert document['timestamp'] == row.timestamp.isoformat()
+            assert document['sensor_id'] == row.sensor_id
+            assert document['value'] == row.value
+            assert document['status'] == row.status
+            assert document['building_id'] == row.building_id
+
+    def test_csv_lines_match_frame(self):
+        """Test CSV column order and timestamp format"""
+        frame = block(rows=10)
+        fields = format_lines(frame, 'csv')[0].split(',')
+        row = frame.iloc[0]
+        assert fields[0] == row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        assert fields[1:4] == [row['sensor_id'], row['sensor_type'], row['zone']]
+        assert float(fields[4]) == row['value']
+        assert fields[5:] == [row['unit'], row['status'], row['building_id']]
+
+
+class TestStreamPayloads:
+    """Test the stream mode request bodies"""
+
+    def test_bulk_payload_targets_daily_indices(self):
+        """Test that bulk documents are enriched and routed by day"""
+        frame = generate_block(50, build_sensor_table(5, 1), datetime(2026, 1, 1, 23, 59, 50), 20, 1, 0)
+        lines = bulk_payload(frame).decode('utf-8').splitlines()
+        assert len(lines) == 100
+        for action, source in zip(lines[::2], lines[1::2]):
+            document = json.loads(source)
+            day = document['@timestamp'][:10].replace('-', '.')
+            assert json.loads(action) == {'index': {'_index': f'iot-logs-{day}'}}
+            assert document['pipeline_version']
+        assert {json.loads(action)['index']['_index'] for action in lines[::2]} == {
+            'iot-logs-2026.01.01', 'iot-logs-2026.01.02'
+        }
+
+    def test_latency_percentiles(self):
+        """Test percentile report in milliseconds"""
+        report = latency_percentiles([i / 1000 for i in range(1, 101)])
+        assert report['p50'] == 50.5
+        assert report['max'] == 100.0
+        assert latency_percentiles([]) == {}
@@ -0,0 +1,100 @@
+"""
+Unit tests for time-range index planning
+"""
+from datetime import datetime, timezone
+
+from app.services.index_planner import day_tags, parse_bound, plan_indices, search_target
+
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+class TestParseBound:
+    """Test period bound parsing"""
+
+    def test_date_math(self):
+        """Test relative bounds against a fixed now"""
+        assert parse_bound('now', NOW) == NOW
+        assert parse_bound('now-7d', NOW) == datetime(2026, 3, 3, 12, 0, tzinfo=timezone.utc)
+        assert parse_bound('now-24h/d', NOW) == datetime(2026, 3, 9, tzinfo=timezone.utc)
+
+    def test_rounding(self):
+        """Test that rounding goes to the start of the unit, or its end for upper bounds"""
+        assert parse_bound('now/M', NOW) == datetime(2026, 3, 1, tzinfo=timezone.utc)
+        assert parse_bound('now/w', NOW) == datetime(2026, 3, 9, tzinfo=timezone.utc)
+        assert parse_bound('now-1M/M', NOW) == datetime(2026, 2, 1, tzinfo=timezone.utc)
+        assert parse_bound('now/d', NOW, round_up=True) == datetime(2026, 3, 10, 23, 59, 59, 999000, tzinfo=timezone.utc)
+        assert parse_bound('now-1y/y', NOW, round_up=True).date() == datetime(2025, 12, 31).date()
+
+    def test_calendar_offsets_and_anchors(self):
+        """Test month offsets and date math anchored on a date"""
+        assert parse_bound('2026-03-31||-1M', NOW) == datetime(2026, 2, 28, tzinfo=timezone.utc)
+        assert parse_bound('2026-03-01||+1d/d', NOW) == datetime(2026, 3, 2, tzinfo=timezone.utc)
+        assert parse_bound('now-1d+12h', NOW) == datetime(2026, 3, 10, tzinfo=timezone.utc)
+
+    def test_iso_dates_are_converted_to_utc(self):
+        """Test that offsets shift the bound to UTC"""
+        assert parse_bound('2026-03-01T01:00:00+02:00', NOW) == datetime(2026, 2, 28, 23, 0, tzinfo=timezone.utc)
+        assert parse_bound('2026-03-01', NOW) == datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+    def test_invalid_bound(self):
+        """Test that unparseable bounds are ignored"""
+        assert parse_bound('yesterday', NOW) is None
+        assert parse_bound('now-1x', NOW) is None
+        assert parse_bound('tomorrow||+1d', NOW) is None
+        assert parse_bound('', NOW) is None
+
+
+class TestPlanIndices:
+    """Test index selection for a period"""
+
+    def test_daily_indices(self):
+        """Test that a short period targets one index per day"""
+        assert plan_indices('2026-03-01', '2026-03-03T10:00:00Z', NOW) == (
+            'iot-logs-2026.03.01,iot-logs-2026.03.02,iot-logs-2026.03.03'
+        )
+
+    def test_open_ended_period(self):
+        """Test that a missing end extends the period to tomorrow"""
+        assert plan_indices('now-1d', None, NOW) == (
+            'iot-logs-2026.03.09,iot-logs-2026.03.10,iot-logs-2026.03.11'
+        )
+
+    def test_rounded_period_covers_whole_units(self):
+        """Test that a rounded upper bound keeps the last day of the unit"""
+        indices = plan_indices('now-1M/M', 'now-1M/M', NOW).split(',')
+        assert (indices[0], indices[-1], len(indices)) == ('iot-logs-2026.02.01', 'iot-logs-2026.02.28', 28)
+
+    def test_missing_start_targets_all_indices(self):
+        """Test the fallback on the full pattern"""
+        assert plan_indices(None, '2026-03-01', NOW) == 'iot-logs-*'
+        assert plan_indices('not a date', None, NOW) == 'iot-logs-*'
+
+    def test_long_period_uses_monthly_patterns(self):
+        """Test that long periods collapse into month wildcards"""
+        assert plan_indices('2026-01-15', '2026-03-02', NOW) == (
+            'iot-logs-2026.01.*,iot-logs-2026.02.*,iot-logs-2026.03.*'
+        )
+
+    def test_search_target_ignores_missing_days(self):
+        """Test that days without an index do not fail the search"""
+        target = search_target('2026-03-10', '2026-03-10', NOW)
+        assert target == {
+            'index': 'iot-logs-2026.03.10',
+            'ignore_unavailable': True,
+            'allow_no_indices': True
+        }
+
+
+class TestDayTags:
+    """Test cache tags of bounded periods"""
+
+    def test_bounded_period(self):
+        """Test one tag per planned day"""
+        assert day_tags('2026-03-01', '2026-03-03T12:00:00', now=NOW) == [
+            'index:2026.03.01', 'index:2026.03.02', 'index:2026.03.03'
+        ]
+
+    def test_unbounded_or_long_periods(self):
+        """Test that unbounded and month-grouped periods get no day tags"""
+        assert day_tags(None, '2026-03-03', now=NOW) is None
+        assert day_tags('2025-01-01', '2026-03-03', now=NOW) is None
@@ -0,0 +1,25 @@
+"""
+Unit tests for the index write watcher
+"""
+from app.services.index_watch import changed_tags
+
+
+class TestChangedTags:
+    """Test tags bumped for index write counters"""
+
+    def test_written_created_and_deleted_days(self):
+        """Test that every changed day is invalidated with index:*"""
+        previous = {'iot-logs-2026.03.09': '100', 'iot-logs-2026.03.10': '50', 'iot-logs-2025.12.01': '10'}
+        current = {'iot-logs-2026.03.09': '100', 'iot-logs-2026.03.10': '75', 'iot-logs-2026.03.11': '1'}
+        assert changed_tags(previous, current) == {
+            'index:*', 'index:2026.03.10', 'index:2026.03.11', 'index:2025.12.01'
+        }
+
+    def test_no_change(self):
+        """Test that unchanged counters bump nothing"""
+        totals = {'iot-logs-2026.03.09': '100'}
+        assert changed_tags(totals, dict(totals)) == set()
+
+    def test_foreign_index(self):
+        """Test that non-daily indices only bump index:*"""
+        assert changed_tags({}, {'iot-logs-export': '3'}) == {'index:*'}
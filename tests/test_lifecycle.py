@@ -0,0 +1,83 @@
+"""
+Unit tests for the log index lifecycle plan
+"""
+from datetime import date
+
+from app.services.lifecycle import (
+    LIFECYCLE_MAX_SHARD_SIZE, index_day, lifecycle_policy, plan_lifecycle, shrink_shard_count
+)
+
+TODAY = date(2026, 3, 10)
+
+
+def index(name, segments=1, shards=1, read_only=False, ilm_policy=None):
+    """Build collected statistics for an index"""
+    return {
+        'name': name, 'day': index_day(name), 'docs': 100, 'size_bytes': 1000, 'primary_size_bytes': 1000,
+        'segments': segments, 'shards': shards, 'replicas': 0,
+        'read_only': read_only, 'ilm_policy': ilm_policy
+    }
+
+
+def plan_for(*stats_list, **kwargs):
+    """Plan indexed by index name"""
+    indices = {stats['name']: stats for stats in stats_list}
+    return {name: (phase, actions) for name, phase, actions in plan_lifecycle(indices, TODAY, **kwargs)}
+
+
+class TestPlanLifecycle:
+    """Test phase and action selection"""
+
+    def test_recent_days_stay_hot(self):
+        """Test that today and the still-open previous day are untouched"""
+        plan = plan_for(index('iot-logs-2026.03.10', segments=12), index('iot-logs-2026.03.09', segments=8),
+                        warm_after_days=1)
+        assert plan['iot-logs-2026.03.10'] == ('hot', [])
+        assert plan['iot-logs-2026.03.09'] == ('hot', [])
+
+    def test_closed_days_are_frozen(self):
+        """Test read-only, shrink and force-merge of closed days"""
+        plan = plan_for(
+            index('iot-logs-2026.03.08', segments=12, shards=2),
+            index('iot-logs-2026.03.07', segments=1, read_only=True),
+            warm_after_days=1
+        )
+        assert plan['iot-logs-2026.03.08'] == ('warm', ['readonly', 'shrink', 'forcemerge'])
+        assert plan['iot-logs-2026.03.07'] == ('warm', [])
+
+    def test_expired_days_are_deleted(self):
+        """Test retention"""
+        plan = plan_for(index('iot-logs-2025.12.01'), retention_days=90)
+        assert plan['iot-logs-2025.12.01'] == ('expired', ['delete'])
+
+    def test_ilm_and_foreign_indices_are_skipped(self):
+        """Test that ILM-managed and unparseable indices get no action"""
+        plan = plan_for(index('iot-logs-2025.12.01', ilm_policy='iot-logs-policy'), index('iot-logs-export'))
+        assert plan['iot-logs-2025.12.01'] == ('ilm', [])
+        assert plan['iot-logs-export'] == ('unmanaged', [])
+
+    def test_shrunk_index_keeps_its_day(self):
+        """Test that shrunk replacements are still planned by day, and not shrunk again"""
+        assert index_day('shrunk-iot-logs-2026.03.01') == date(2026, 3, 1)
+        plan = plan_for(index('shrunk-iot-logs-2026.03.01', segments=4, shards=2, read_only=True))
+        assert plan['shrunk-iot-logs-2026.03.01'] == ('warm', ['forcemerge'])
+
+    def test_shrink_keeps_shards_under_size_limit(self):
+        """Test that the target shard count is a factor bounded by the shard size"""
+        stats = index('iot-logs-2026.03.01', shards=6)
+        assert shrink_shard_count(dict(stats, primary_size_bytes=10)) == 1
+        assert shrink_shard_count(dict(stats, primary_size_bytes=2 * LIFECYCLE_MAX_SHARD_SIZE + 1)) == 3
+        assert shrink_shard_count(dict(stats, primary_size_bytes=6 * LIFECYCLE_MAX_SHARD_SIZE + 1)) == 6
+
+
+class TestLifecyclePolicy:
+    """Test the equivalent ILM policy"""
+
+    def test_phase_ages_match_plan(self):
+        """Test that ILM phase ages mirror the script thresholds"""
+        policy = lifecycle_policy(warm_after_days=1, retention_days=90, snapshot_policy='nightly')
+        phases = policy['phases']
+        assert phases['warm']['min_age'] == '2d'
+        assert phases['warm']['actions']['forcemerge'] == {'max_num_segments': 1}
+        assert phases['delete']['min_age'] == '91d'
+        assert phases['delete']['actions']['wait_for_snapshot'] == {'policy': 'nightly'}
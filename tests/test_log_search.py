@@ -0,0 +1,260 @@
+"""
+Unit tests for log search helpers (pagination)
+"""
+import pytest
+from app.services.columnar import to_columnar
+from app.services.log_search import (
+    encode_cursor, decode_cursor, cursor_search, offset_window_exceeded,
+    build_facets_query, parse_facets, parse_projection, apply_projection, projected_fields,
+    hit_document, doc_handle, parse_handle, fetch_documents, iter_export_pages,
+    InvalidCursorError, InvalidProjectionError, InvalidHandleError, MAX_RESULT_WINDOW
+)
+
+
+class FakeElasticsearch:
+    """Elasticsearch stub serving a fixed list of hits through a point-in-time"""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.bodies = []
+        self.closed = []
+
+    def open_point_in_time(self, index=None, keep_alive=None, **params):
+        return {'id': 'pit-1'}
+
+    def close_point_in_time(self, id=None):
+        self.closed.append(id)
+
+    def search(self, body=None, **kwargs):
+        self.bodies.append(body)
+        start = 0
+        if 'search_after' in body:
+            start = body['search_after'][1] + 1
+        page = self.hits[start:start + body['size']]
+        return {
+            'pit_id': 'pit-2',
+            'took': 1,
+            'hits': {'total': {'value': len(self.hits)}, 'hits': page}
+        }
+
+
+@pytest.fixture
+def hits():
+    """Provide ten sorted hits"""
+    return [
+        {'_id': str(i), '_score': None, '_source': {'value': i}, 'sort': [1000 - i, i]}
+        for i in range(10)
+    ]
+
+
+class TestCursorEncoding:
+    """Test opaque cursor tokens"""
+
+    def test_round_trip(self):
+        """Test that a cursor decodes to its state"""
+        token = encode_cursor('pit-abc', [1767225600000, 42])
+        assert decode_cursor(token) == {'pit': 'pit-abc', 'after': [1767225600000, 42]}
+
+    def test_invalid_cursor(self):
+        """Test that garbage cursors are rejected"""
+        with pytest.raises(InvalidCursorError):
+            decode_cursor('not-a-cursor')
+
+
+class TestCursorSearch:
+    """Test point-in-time + search_after pagination"""
+
+    def test_walks_all_pages(self, hits):
+        """Test that following next_cursor visits every hit once"""
+        es = FakeElasticsearch(hits)
+        seen = []
+        cursor = None
+        while True:
+            result, cursor = cursor_search(es, 'iot-logs-*', {'match_all': {}}, 4, cursor=cursor)
+            seen.extend(hit['_id'] for hit in result['hits']['hits'])
+            if cursor is None:
+                break
+        assert seen == [str(i) for i in range(10)]
+        assert es.closed == ['pit-2']
+
+    def test_total_only_on_first_page(self, hits):
+        """Test that hit counting is limited to the first page"""
+        es = FakeElasticsearch(hits)
+        _, cursor = cursor_search(es, 'iot-logs-*', {'match_all': {}}, 4)
+        cursor_search(es, 'iot-logs-*', {'match_all': {}}, 4, cursor=cursor)
+        assert es.bodies[0]['track_total_hits'] is True
+        assert es.bodies[1]['track_total_hits'] is False
+        assert es.bodies[1]['pit']['id'] == 'pit-2'
+
+    def test_offset_window(self):
+        """Test detection of pages beyond max_result_window"""
+        assert not offset_window_exceeded(1, 50)
+        assert offset_window_exceeded(MAX_RESULT_WINDOW // 50 + 1, 50)
+
+
+class SlicedElasticsearch(FakeElasticsearch):
+    """Elasticsearch stub splitting hits across PIT slices"""
+
+    def search(self, body=None, **kwargs):
+        sliced = body.get('slice', {'id': 0, 'max': 1})
+        hits = [hit for hit in self.hits if int(hit['_id']) % sliced['max'] == sliced['id']]
+        start = 0
+        if 'search_after' in body:
+            start = next(n for n, hit in enumerate(hits) if hit['sort'] == body['search_after']) + 1
+        page = hits[start:start + body['size']]
+        return {'pit_id': 'pit-2', 'hits': {'hits': page}}
+
+
+class TestExportPages:
+    """Test sliced point-in-time exports"""
+
+    def test_single_slice(self, hits):
+        """Test that an unsliced export visits every hit in order"""
+        es = FakeElasticsearch(hits)
+        pages = list(iter_export_pages(es, 'iot-logs-*', {'match_all': {}}, batch_size=4))
+        assert [hit['_id'] for page in pages for hit in page] == [str(i) for i in range(10)]
+        assert 'slice' not in es.bodies[0]
+        assert es.closed == ['pit-2']
+
+    def test_slices_cover_every_hit_once(self, hits):
+        """Test that concurrent slices together return each hit exactly once"""
+        es = SlicedElasticsearch(hits)
+        pages = list(iter_export_pages(es, 'iot-logs-*', {'match_all': {}}, batch_size=2, slices=3))
+        assert sorted(int(hit['_id']) for page in pages for hit in page) == list(range(10))
+        assert es.closed == ['pit-2']
+
+    def test_closed_when_abandoned(self, hits):
+        """Test that stopping early still closes the point-in-time"""
+        es = FakeElasticsearch(hits)
+        pages = iter_export_pages(es, 'iot-logs-*', {'match_all': {}}, batch_size=4)
+        next(pages)
+        pages.close()
+        assert es.closed == ['pit-2']
+
+
+class TestFacets:
+    """Test the multi-facet filters query"""
+
+    def test_single_query_with_all_facets(self):
+        """Test that one request carries the three facets on keyword fields"""
+        body = build_facets_query({})
+        assert body['size'] == 0
+        assert set(body['aggs']) == {'sensor_types', 'zones', 'alert_levels'}
+        assert body['aggs']['alert_levels']['aggs']['values']['terms']['field'] == 'status'
+        assert all(agg['filter'] == {'match_all': {}} for agg in body['aggs'].values())
+
+    def test_facet_ignores_its_own_selection(self):
+        """Test that each facet is filtered by the other selections only"""
+        body = build_facets_query({'zone': 'zone_a', 'sensor_type': 'co2', 'counts': 'true'})
+        zones = body['aggs']['zones']['filter']['bool']['filter']
+        assert zones == [{'term': {'sensor_type': 'co2'}}]
+        levels = body['aggs']['alert_levels']['filter']['bool']['filter']
+        assert {'term': {'zone': 'zone_a'}} in levels and len(levels) == 2
+        assert body['query'] == {'bool': {'must': [{'match_all': {}}]}}
+
+    def test_parse_counts(self):
+        """Test values and counts extraction"""
+        result = {'aggregations': {
+            name: {'values': {'buckets': [{'key': 'x', 'doc_count': 3}]}}
+            for name in ('sensor_types', 'zones', 'alert_levels')
+        }}
+        assert parse_facets(result)['zones'] == ['x']
+        assert parse_facets(result, counts=True)['zones'] == [{'value': 'x', 'count': 3}]
+
+
+class TestColumnar:
+    """Test the columnar response format"""
+
+    def test_dictionary_encoding(self):
+        """Test that repetitive strings are dictionary encoded and others kept"""
+        logs = [
+            {'zone': 'zone_a', 'value': 1.5, 'sensor_id': f's{i}'} for i in range(4)
+        ] + [{'zone': 'zone_b', 'value': 2.0}]
+        payload = to_columnar(logs, ['zone', 'value', 'sensor_id'])
+        assert payload['rows'] == 5
+        assert payload['columns']['zone'] == {'dictionary': ['zone_a', 'zone_b'], 'codes': [0, 0, 0, 0, 1]}
+        assert payload['columns']['value'] == [1.5, 1.5, 1.5, 1.5, 2.0]
+        assert payload['columns']['sensor_id'] == ['s0', 's1', 's2', 's3', None]
+
+
+class TestProjection:
+    """Test fields= projections"""
+
+    def test_parse(self):
+        """Test includes, excludes, full document and default"""
+        assert parse_projection('sensor_id,value') == {'includes': ['sensor_id', 'value']}
+        assert parse_projection('-location,-metadata') == {'excludes': ['location', 'metadata']}
+        assert parse_projection('*', default=['value']) is None
+        assert parse_projection(None, default=['value']) == {'includes': ['value']}
+        assert parse_projection(None) is None
+
+    def test_invalid(self):
+        """Test that mixed or malformed projections are rejected"""
+        with pytest.raises(InvalidProjectionError):
+            parse_projection('value,-location')
+        with pytest.raises(InvalidProjectionError):
+            parse_projection('value;drop')
+
+    def test_docvalues(self):
+        """Test that docvalues reads included fields without _source"""
+        body = apply_projection({}, {'includes': ['@timestamp', 'value']}, docvalues=True)
+        assert body['_source'] is False
+        assert body['docvalue_fields'][1] == 'value'
+        hit = {'_id': '1', 'fields': {'@timestamp': ['2026-03-01T00:00:00.000Z'], 'value': [21.5]}}
+        assert hit_document(hit) == {'@timestamp': '2026-03-01T00:00:00.000Z', 'value': 21.5}
+
+    def test_projected_fields(self):
+        """Test columns selected by a projection"""
+        assert projected_fields({'excludes': ['zone']}, ['zone', 'value']) == ['value']
+        assert projected_fields(None, ['zone']) == ['zone']
+
+
+class FakeDocumentStore:
+    """Elasticsearch stub serving documents by index and id"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def mget(self, docs=None, **params):
+        self.calls.append(('mget', params))
+        return {'docs': [
+            dict(d, found=True, _source=self.docs[(d['_index'], d['_id'])])
+            if (d['_index'], d['_id']) in self.docs else dict(d, found=False)
+            for d in docs
+        ]}
+
+    def search(self, index=None, body=None):
+        self.calls.append(('search', body))
+        ids = body['query']['ids']['values']
+        hits = [
+            {'_index': i, '_id': d, '_source': source}
+            for (i, d), source in self.docs.items() if d in ids
+        ]
+        return {'hits': {'total': {'value': len(hits)}, 'hits': hits}}
+
+
+class TestDocumentHandles:
+    """Test direct document lookups by index:id handle"""
+
+    def test_handle_round_trip(self):
+        """Test handle encoding and validation"""
+        hit = {'_index': 'iot-logs-2026.03.01', '_id': 'abc-1'}
+        assert parse_handle(doc_handle(hit)) == ('iot-logs-2026.03.01', 'abc-1')
+        assert parse_handle('abc-1') == (None, 'abc-1')
+        with pytest.raises(InvalidHandleError):
+            parse_handle('users:1')
+
+    def test_fetch_documents(self):
+        """Test that handles use one mget and bare ids one ids search"""
+        es = FakeDocumentStore({
+            ('iot-logs-2026.03.01', 'a'): {'value': 1},
+            ('iot-logs-2026.03.02', 'b'): {'value': 2}
+        })
+        documents = fetch_documents(
+            es, ['iot-logs-2026.03.01:a', 'iot-logs-2026.03.01:missing', 'b'],
+            projection={'includes': ['value']}
+        )
+        assert documents == {'iot-logs-2026.03.01:a': {'value': 1}, 'b': {'value': 2}}
+        assert [call[0] for call in es.calls] == ['mget', 'search']
+        assert es.calls[0][1] == {'source_includes': ['value']}
@@ -0,0 +1,128 @@
+"""
+Unit tests for the background aggregate refresher
+"""
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from app.services import redis_cache, refresher
+from app.services.refresher import HotQuery, Refresher, read_precomputed
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    """Shared in-memory Redis for the refresher and the tag versions"""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(refresher, 'get_redis_client', lambda: client)
+    monkeypatch.setattr(redis_cache, 'get_redis_client', lambda: client)
+    return client
+
+
+@pytest.fixture
+def counting_query(monkeypatch):
+    """Registered hot query counting its computations"""
+    calls = []
+
+    def compute():
+        calls.append(time.time())
+        return {'total': len(calls)}
+
+    query = HotQuery('test_total', compute, interval=60, tags=['logs'])
+    monkeypatch.setitem(refresher._hot_queries, query.name, query)
+    query.calls = calls
+    return query
+
+
+class TestReadPrecomputed:
+    """Test reads of precomputed aggregates"""
+
+    def test_missing_value_is_computed_once(self, redis_client, counting_query):
+        """Test that the first read computes and the next ones reuse the value"""
+        first = read_precomputed('test_total')
+        second = read_precomputed('test_total')
+
+        assert first['total'] == second['total'] == 1
+        assert len(counting_query.calls) == 1
+        assert 'computed_at' in second and second['age_seconds'] >= 0
+        assert redis_client.exists(f"{refresher.SEEN_PREFIX}test_total")
+
+    def test_value_older_than_interval_is_recomputed(self, redis_client, counting_query):
+        """Test that an expired period triggers a recomputation"""
+        read_precomputed('test_total')
+        redis_client.hset(counting_query.key, 'computed_at', time.time() - counting_query.interval - 1)
+
+        assert read_precomputed('test_total')['total'] == 2
+
+    def test_bumped_tag_triggers_recomputation(self, redis_client, counting_query):
+        """Test that invalidating a tag makes the stored value stale"""
+        read_precomputed('test_total')
+        redis_cache.bump_tags('logs')
+
+        assert read_precomputed('test_total')['total'] == 2
+        assert read_precomputed('test_total')['total'] == 2
+
+    def test_concurrent_stale_reads_compute_once(self, redis_client, counting_query, monkeypatch):
+        """Test that readers of a stale value wait for a single recomputation"""
+        read_precomputed('test_total')
+        redis_cache.bump_tags('logs')
+        compute = counting_query.compute
+
+        def slow_compute():
+            time.sleep(0.2)
+            return compute()
+
+        monkeypatch.setattr(counting_query, 'compute', slow_compute)
+        results = []
+        readers = [threading.Thread(target=lambda: results.append(read_precomputed('test_total')))
+                   for _ in range(5)]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+
+        assert [result['total'] for result in results] == [2] * 5
+        assert len(counting_query.calls) == 2
+
+    def test_stale_value_served_when_computation_times_out(self, redis_client, counting_query, monkeypatch):
+        """Test that a stale value is still served while another process holds the lock"""
+        read_precomputed('test_total')
+        redis_cache.bump_tags('logs')
+        lock = counting_query.lock(redis_client)
+        assert lock.acquire()
+        monkeypatch.setattr(HotQuery, 'lock_timeout', property(lambda self: 0.1))
+
+        assert read_precomputed('test_total')['total'] == 1
+        assert len(counting_query.calls) == 1
+
+
+class TestRefresher:
+    """Test the refresh thread decisions"""
+
+    def test_unrequested_query_is_not_refreshed(self, redis_client, counting_query):
+        """Test that only recently read aggregates are refreshed"""
+        assert Refresher().refresh_if_due(counting_query) is False
+        assert counting_query.calls == []
+
+    def test_refreshes_when_due(self, redis_client, counting_query):
+        """Test refresh on tag invalidation and expired period only"""
+        read_precomputed('test_total')
+        assert Refresher().refresh_if_due(counting_query) is False
+
+        redis_cache.bump_tags('logs')
+        assert Refresher().refresh_if_due(counting_query) is True
+        assert Refresher().refresh_if_due(counting_query) is False
+
+        redis_client.hset(counting_query.key, 'computed_at', time.time() - counting_query.interval)
+        assert Refresher().refresh_if_due(counting_query) is True
+        assert len(counting_query.calls) == 3
+
+    def test_locked_query_is_skipped(self, redis_client, counting_query):
+        """Test that a query being computed elsewhere is not computed twice"""
+        read_precomputed('test_total')
+        redis_cache.bump_tags('logs')
+        assert counting_query.lock(redis_client).acquire()
+
+        assert Refresher().refresh_if_due(counting_query) is False
+        assert len(counting_query.calls) == 1
@@ -0,0 +1,130 @@
+"""
+Unit tests for hourly/daily rollups
+"""
+import pandas as pd
+
+from app.services.rollups import PendingRollups, RollupAccumulator, rollup_doc_id, rollup_index_name
+from app.services.stats_engine import parse_rollup_stats
+
+
+def make_doc(timestamp, value, status='normal', sensor_type='temperature'):
+    """Build an enriched log document"""
+    return {
+        '@timestamp': timestamp, 'sensor_id': 'TEMP_zone_a_1', 'zone': 'zone_a',
+        'building_id': 'Building_A', 'sensor_type': sensor_type,
+        'value': value, 'status': status
+    }
+
+
+class TestRollupAccumulator:
+    """Test in-memory partial summaries"""
+
+    def test_hourly_and_daily_buckets(self):
+        """Test that a document lands in one hourly and one daily bucket"""
+        acc = RollupAccumulator()
+        acc.add(make_doc('2026-03-01T10:15:00+00:00', 20.0))
+        acc.add(make_doc('2026-03-01T10:45:00+00:00', 30.0, status='warning'))
+        acc.add(make_doc('2026-03-01T11:05:00+00:00', 10.0))
+        buckets = sorted((g, b) for g, b, _ in acc.summaries)
+        assert buckets == [
+            ('daily', '2026-03-01T00:00:00+00:00'),
+            ('hourly', '2026-03-01T10:00:00+00:00'),
+            ('hourly', '2026-03-01T11:00:00+00:00')
+        ]
+        daily = next(s for (g, _, _), s in acc.summaries.items() if g == 'daily')
+        assert daily['count'] == 3 and daily['sum'] == 60.0
+        assert (daily['min'], daily['max']) == (10.0, 30.0)
+        assert daily['status_counts'] == {'normal': 2, 'warning': 1}
+
+    def test_upsert_actions(self):
+        """Test scripted upserts with deterministic ids"""
+        acc = RollupAccumulator()
+        acc.add(make_doc('2026-03-01T10:15:00+00:00', 20.0))
+        actions = list(acc.actions())
+        hourly = next(a for a in actions if a['upsert']['granularity'] == 'hourly')
+        assert hourly['_op_type'] == 'update'
+        assert hourly['_index'] == rollup_index_name('hourly', '2026-03-01T10:00:00+00:00') == 'iot-rollup-hourly-2026.03'
+        assert hourly['upsert']['avg'] == 20.0
+        dimensions = {'sensor_id': 'TEMP_zone_a_1', 'zone': 'zone_a', 'building_id': 'Building_A', 'sensor_type': 'temperature'}
+        assert hourly['_id'] == rollup_doc_id('hourly', '2026-03-01T10:00:00+00:00', dimensions)
+
+    def test_frame_matches_documents(self):
+        """Test that a batch adds the same summaries as its documents one by one"""
+        documents = [
+            make_doc('2026-03-01T10:15:00+00:00', 20.0),
+            make_doc('2026-03-01T10:45:00+00:00', 30.0, status='warning'),
+            make_doc('2026-03-01T11:05:00+00:00', None, status=''),
+            dict(make_doc('2026-03-02T08:00:00+00:00', 1200.0, status='critical', sensor_type='co2'), zone=None)
+        ]
+        by_document = RollupAccumulator()
+        for document in documents:
+            by_document.add(document)
+        by_frame = RollupAccumulator()
+        by_frame.add_frame(pd.DataFrame(documents))
+        assert by_frame.summaries == by_document.summaries
+
+
+class TestPendingRollups:
+    """Test that only documents accepted by Elasticsearch are summarized"""
+
+    def documents(self):
+        return [
+            make_doc('2026-03-01T10:15:00+00:00', 20.0),
+            make_doc('2026-03-01T10:45:00+00:00', 30.0, status='warning'),
+            make_doc('2026-03-01T11:05:00+00:00', 10.0)
+        ]
+
+    def expected(self, documents):
+        accumulator = RollupAccumulator()
+        for document in documents:
+            accumulator.add(document)
+        return accumulator.summaries
+
+    def test_rejected_documents_are_skipped(self):
+        """Test that a failed or unanswered document never reaches the summaries"""
+        documents = self.documents()
+        pending = PendingRollups(RollupAccumulator())
+        for number, document in enumerate(documents):
+            pending.track(f'f-{number}', document)
+        pending.done('f-0', True)
+        pending.done('f-1', False)
+        assert pending.accumulator.summaries == self.expected(documents[:1])
+
+    def test_frame_added_once_all_results_are_known(self):
+        """Test that a batch is summarized with its accepted rows only"""
+        documents = self.documents()
+        pending = PendingRollups(RollupAccumulator())
+        pending.track_frame(['f-0', 'f-1', 'f-2'], pd.DataFrame(documents))
+        pending.done('f-2', True)
+        pending.done('f-1', False)
+        assert pending.accumulator.summaries == {}
+        pending.done('f-0', True)
+        assert pending.accumulator.summaries == self.expected([documents[0], documents[2]])
+
+
+class TestRollupStats:
+    """Test statistics computed from rollups"""
+
+    def test_parse(self):
+        """Test that rollup sums map to the raw statistics keys"""
+        result = {'aggregations': {
+            'daily': {
+                'total_logs': {'value': 1000.0},
+                'unique_sensors': {'value': 12},
+                'temperature': {'sum': {'value': 2240.0}, 'value_count': {'value': 100.0}},
+                'energy': {'sum': {'value': 512.345}},
+                'today': {'total': {'value': 50.0}, 'normal': {'value': 40.0},
+                          'warning': {'value': 6.0}, 'critical': {'value': 4.0}},
+                'normal': {'value': 900.0}, 'warning': {'value': 60.0},
+                'alert': {'value': 0.0}, 'critical': {'value': 40.0}
+            },
+            'last_24h': {'total': {'value': 80.0}, 'normal': {'value': 70.0}}
+        }}
+        stats = parse_rollup_stats(result)
+        assert stats['total_logs'] == 1000
+        assert stats['avg_temperature'] == 22.4
+        assert stats['total_energy'] == 512.35
+        assert stats['today_alerts'] == 10
+        assert stats['today_critical_warning'] == 10
+        assert stats['alerts_last_24h'] == 10
+        assert stats['alerts'] == {'critical': 40, 'high': 60, 'normal': 900}
@@ -0,0 +1,120 @@
+"""
+Unit tests for the single-query statistics engine
+"""
+import pytest
+from app.services.stats_engine import build_stats_query, split_stats_query, compute_log_stats
+
+
+class FakeElasticsearch:
+    """Minimal Elasticsearch stub recording search calls"""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def search(self, index=None, body=None):
+        self.calls.append((index, body))
+        return self.response
+
+    def msearch(self, searches=None):
+        self.calls.append(searches)
+        return {"responses": [self.response] * (len(searches) // 2)}
+
+
+@pytest.fixture
+def stats_response():
+    """Provide a canned multi-aggregation response"""
+    return {
+        "hits": {"total": {"value": 1200, "relation": "eq"}},
+        "aggregations": {
+            "unique_sensors": {"value": 18},
+            "temperature": {"doc_count": 300, "avg_value": {"value": 22.468}},
+            "energy": {"doc_count": 200, "total_value": {"value": 1543.219}},
+            "today": {
+                "doc_count": 90,
+                "by_status": {"buckets": [
+                    {"key": "normal", "doc_count": 70},
+                    {"key": "warning", "doc_count": 12},
+                    {"key": "critical", "doc_count": 5},
+                    {"key": "alert", "doc_count": 3}
+                ]}
+            },
+            "last_24h_alerts": {"doc_count": 25},
+            "by_status": {"buckets": [
+                {"key": "normal", "doc_count": 1000},
+                {"key": "warning", "doc_count": 100},
+                {"key": "alert", "doc_count": 60},
+                {"key": "critical", "doc_count": 40}
+            ]}
+        }
+    }
+
+
+class TestStatsQuery:
+    """Test the multi-aggregation query"""
+
+    def test_query_does_not_fetch_documents(self):
+        """Test that the query only returns aggregations"""
+        query = build_stats_query()
+        assert query["size"] == 0
+        assert query["track_total_hits"] is True
+
+    def test_recent_aggregations_are_pruned(self):
+        """Test that 24h indicators target only the recent daily indices"""
+        historical, recent = split_stats_query()
+        assert "today" not in historical["aggs"] and "today" in recent["aggs"]
+        es = FakeElasticsearch({"hits": {"total": {"value": 0}}, "aggregations": {}})
+        compute_log_stats(es, use_rollups=False)
+        header = es.calls[0][2]
+        assert header["index"].count("iot-logs-") == 3
+        assert header["ignore_unavailable"] is True
+
+    def test_query_contains_all_aggregations(self):
+        """Test that every indicator is computed in the same request"""
+        aggs = build_stats_query()["aggs"]
+        for name in ["unique_sensors", "temperature", "energy", "today",
+                     "last_24h_alerts", "by_status"]:
+            assert name in aggs
+
+
+class TestStatsParsing:
+    """Test extraction of indicators from the response"""
+
+    def test_single_round_trip(self, stats_response):
+        """Test that all stats come from one search call"""
+        es = FakeElasticsearch(stats_response)
+        compute_log_stats(es)
+        assert len(es.calls) == 1
+
+    def test_indicators(self, stats_response):
+        """Test computed indicators"""
+        stats = compute_log_stats(FakeElasticsearch(stats_response))
+        assert stats["total_logs"] == 1200
+        assert stats["sensors_count"] == 18
+        assert stats["avg_temperature"] == 22.5
+        assert stats["total_energy"] == 1543.22
+        assert stats["today_alerts"] == 20
+        assert stats["today_critical_warning"] == 17
+        assert stats["alerts_last_24h"] == 25
+
+    def test_alert_categories(self, stats_response):
+        """Test status grouping into alert categories"""
+        stats = compute_log_stats(FakeElasticsearch(stats_response))
+        assert stats["alerts"] == {"critical": 40, "high": 160, "normal": 1000}
+
+    def test_empty_index(self):
+        """Test defaults when aggregations have no values"""
+        response = {
+            "hits": {"total": {"value": 0, "relation": "eq"}},
+            "aggregations": {
+                "unique_sensors": {"value": 0},
+                "temperature": {"doc_count": 0, "avg_value": {"value": None}},
+                "energy": {"doc_count": 0, "total_value": {"value": 0.0}},
+                "today": {"doc_count": 0, "by_status": {"buckets": []}},
+                "last_24h_alerts": {"doc_count": 0},
+                "by_status": {"buckets": []}
+            }
+        }
+        stats = compute_log_stats(FakeElasticsearch(response))
+        assert stats["avg_temperature"] == 0
+        assert stats["today_alerts"] == 0
@@ -0,0 +1,95 @@
+"""
+Unit tests for the micro-batching stream ingestion queue
+"""
+import threading
+
+from app.services import stream_ingest
+from app.services.stream_ingest import StreamIngestor, parse_ndjson
+
+
+class RecordingIngestor(StreamIngestor):
+    """Ingestor collecting flushed batches instead of calling Elasticsearch"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def flush_batch(self, batch):
+        self.release.wait(5)
+        self.batches.append(batch)
+        self._count(flushed=len(batch), batches=1)
+        return len(batch)
+
+
+class TestParseNdjson:
+    """Test NDJSON body parsing"""
+
+    def test_valid_and_invalid_lines(self):
+        """Test that invalid lines are reported with their number"""
+        body = '{"sensor_id": "a"}\n\nnot json\n[1, 2]\n{"sensor_id": "b"}\n'
+        documents, invalid, errors = parse_ndjson(body)
+        assert documents == [{'sensor_id': 'a'}, {'sensor_id': 'b'}]
+        assert invalid == 2
+        assert [error['line'] for error in errors] == [3, 4]
+
+
+class TestStreamIngestor:
+    """Test queueing, batching and back-pressure"""
+
+    def test_batches_by_count_and_linger(self):
+        """Test that full batches and the remainder are both flushed"""
+        ingestor = RecordingIngestor(capacity=100, batch_size=4, linger_ms=20, flushers=1)
+        ingestor.start()
+        assert ingestor.offer([{'n': i} for i in range(10)])
+        assert ingestor.drain(timeout=5)
+        assert [len(batch) for batch in ingestor.batches] == [4, 4, 2]
+        stats = ingestor.stats()
+        assert (stats['accepted'], stats['flushed'], stats['batches']) == (10, 10, 3)
+
+    def test_full_queue_rejects_whole_request(self):
+        """Test back-pressure: in-flight batches count against capacity"""
+        ingestor = RecordingIngestor(capacity=6, batch_size=4, linger_ms=10, flushers=1)
+        ingestor.release.clear()
+        ingestor.start()
+        assert ingestor.offer([{'n': i} for i in range(5)])
+        assert not ingestor.offer([{'n': 5}, {'n': 6}])
+        assert ingestor.stats()['rejected'] == 2
+        ingestor.release.set()
+        assert ingestor.drain(timeout=5)
+        assert ingestor.offer([{'n': 5}, {'n': 6}])
+
+
+class TestBulkRetries:
+    """Test that a failed bulk request resends only unconfirmed documents"""
+
+    def test_resends_pending_documents(self, monkeypatch):
+        """Test that documents acknowledged before an exception are not resent or lost"""
+        calls = []
+
+        def streaming_bulk(es, actions, **kwargs):
+            calls.append([action['_id'] for action in actions])
+            for number, action in enumerate(actions):
+                if len(calls) == 1 and number == 2:
+                    raise ConnectionError('connection reset')
+                ok = action['_id'] != 'd4'
+                yield ok, {'index': {'_id': action['_id'], 'status': 201 if ok else 400}}
+
+        monkeypatch.setattr(stream_ingest.helpers, 'streaming_bulk', streaming_bulk)
+        monkeypatch.setattr(stream_ingest, 'STREAM_BULK_BACKOFF', 0)
+        actions = [{'_index': 'iot-logs-2026.03.01', '_id': f'd{n}', '_source': {}} for n in range(5)]
+        indexed, failed = StreamIngestor()._bulk(None, actions)
+        assert calls == [['d0', 'd1', 'd2', 'd3', 'd4'], ['d2', 'd3', 'd4']]
+        assert (indexed, failed) == (4, 1)
+
+    def test_counts_pending_after_last_attempt(self, monkeypatch):
+        """Test that documents still pending after every retry are counted as failed"""
+        def streaming_bulk(es, actions, **kwargs):
+            raise ConnectionError('unavailable')
+            yield
+
+        monkeypatch.setattr(stream_ingest.helpers, 'streaming_bulk', streaming_bulk)
+        monkeypatch.setattr(stream_ingest, 'STREAM_BULK_BACKOFF', 0)
+        actions = [{'_index': 'iot-logs-2026.03.01', '_id': f'd{n}', '_source': {}} for n in range(3)]
+        assert StreamIngestor()._bulk(None, actions) == (0, 3)
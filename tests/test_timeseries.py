@@ -0,0 +1,80 @@
+"""
+Unit tests for sensor time series
+"""
+import math
+import pytest
+from datetime import datetime, timedelta, timezone
+from app.services.timeseries import (
+    choose_interval, parse_series_range, parse_max_points, rollup_granularity,
+    build_series_query, parse_series_response, lttb, InvalidSeriesRequest
+)
+
+
+class TestSeriesParameters:
+    """Test range, budget and interval selection"""
+
+    def test_relative_range(self):
+        """Test that range is taken back from now"""
+        now = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+        start, end = parse_series_range({'range': '7d'}, now=now)
+        assert end == now and end - start == timedelta(days=7)
+
+    def test_invalid_range(self):
+        """Test that malformed or inverted ranges are rejected"""
+        with pytest.raises(InvalidSeriesRequest):
+            parse_series_range({'range': 'forever'})
+        with pytest.raises(InvalidSeriesRequest):
+            parse_series_range({'from': '2026-03-02', 'to': '2026-03-01'})
+
+    def test_max_points_is_bounded(self):
+        """Test the points budget limits"""
+        assert parse_max_points(None) == 500
+        assert parse_max_points('100000') == 2000
+
+    def test_interval_fits_budget(self):
+        """Test that the interval keeps the bucket count within max_points"""
+        end = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        assert choose_interval(end - timedelta(hours=24), end, 500)[0] == '5m'
+        assert choose_interval(end - timedelta(days=365 * 5), end, 500)[0] == '7d'
+        assert rollup_granularity(timedelta(hours=3)) == 'hourly'
+        assert rollup_granularity(timedelta(days=7)) == 'daily'
+        assert rollup_granularity(timedelta(minutes=5)) is None
+
+
+class TestSeriesAggregation:
+    """Test histogram queries and columnar output"""
+
+    def test_rollup_query_and_average(self):
+        """Test that rollup buckets are averaged from sums and counts"""
+        start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        body = build_series_query({'sensor_id': 's1'}, start, start + timedelta(days=1), '1h', 'hourly')
+        assert {'term': {'granularity': 'hourly'}} in body['query']['bool']['filter']
+        assert body['aggs']['series']['date_histogram']['field'] == 'bucket'
+        result = {'aggregations': {'series': {'buckets': [{
+            'key': 1772323200000, 'doc_count': 2,
+            'min': {'value': 18.0}, 'max': {'value': 26.0},
+            'sum': {'value': 220.0}, 'value_count': {'value': 10.0}
+        }]}}}
+        series = parse_series_response(result)
+        assert series == {
+            'timestamps': [1772323200000], 'min': [18.0], 'max': [26.0], 'avg': [22.0], 'count': [10]
+        }
+
+
+class TestLttb:
+    """Test Largest-Triangle-Three-Buckets downsampling"""
+
+    def test_keeps_ends_and_peak(self):
+        """Test that endpoints and a spike survive downsampling"""
+        timestamps = list(range(1000))
+        values = [math.sin(t / 50) for t in timestamps]
+        values[500] = 10.0
+        sampled_t, sampled_v = lttb(timestamps, values, 50)
+        assert len(sampled_t) == 50
+        assert sampled_t[0] == 0 and sampled_t[-1] == 999
+        assert 10.0 in sampled_v
+        assert sampled_t == sorted(sampled_t)
+
+    def test_small_series_untouched(self):
+        """Test that series under the threshold are returned as is"""
+        assert lttb([1, 2, 3], [4, 5, 6], 10) == ([1, 2, 3], [4, 5, 6])
@@ -138,3 +138,49 @@ class TestSensorTypeValidation:
         ]
         invalid_type = "invalid_sensor"
         assert invalid_type not in valid_types
+
+
+class TestIngestionEnrichment:
+    """Test server-side ingestion parsing and enrichment"""
+    
+    def test_csv_records_are_streamed(self, tmp_path, sample_csv_data):
+        """Test that CSV rows are read with their header"""
+        from app.services.ingestion import iter_file_records
+        filepath = tmp_path / "sensors.csv"
+        filepath.write_text(sample_csv_data, encoding="utf-8")
+        progress = {'bytes': 0}
+        
+        records = list(iter_file_records(str(filepath), progress))
+        
+        assert len(records) == 3
+        assert records[0]["sensor_id"] == "TEMP_zone_a_001"
+        assert progress['bytes'] == filepath.stat().st_size
+    
+    def test_temperature_alert_enrichment(self):
+        """Test alert_level, alert_message and location enrichment"""
+        from app.services.ingestion import enrich_record, index_name_for
+        record = enrich_record({
+            "timestamp": "2025-12-30 11:57:12",
+            "sensor_type": "temperature",
+            "zone": "zone_a",
+            "value": "31.2"
+        })
+        
+        assert record["value"] == 31.2
+        assert record["alert_level"] == "high"
+        assert "alert_message" in record
+        assert record["location"] == {"lat": 48.8566, "lon": 2.3522}
+        assert index_name_for(record) == "iot-logs-2025.12.30"
+    
+    def test_co2_critical_enrichment(self):
+        """Test CO2 critical level"""
+        from app.services.ingestion import enrich_record
+        record = enrich_record({
+            "timestamp": "2025-12-30T11:57:12.966804",
+            "sensor_type": "co2",
+            "zone": "zone_c",
+            "value": 1200
+        })
+        
+        assert record["alert_level"] == "critical"
+        assert "location" not in record